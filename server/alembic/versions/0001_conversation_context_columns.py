@@ -0,0 +1,48 @@
+"""Add rolling summary and message count columns to chat_conversations
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _existing_columns(table: str) -> set:
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    # Tables created by the application on startup may already have these columns
+    existing = _existing_columns("chat_conversations")
+    with op.batch_alter_table("chat_conversations") as batch_op:
+        if "summary" not in existing:
+            batch_op.add_column(sa.Column("summary", sa.Text(), nullable=True))
+        if "summarized_message_count" not in existing:
+            batch_op.add_column(sa.Column(
+                "summarized_message_count", sa.Integer(), nullable=False, server_default="0"
+            ))
+        if "message_count" not in existing:
+            batch_op.add_column(sa.Column(
+                "message_count", sa.Integer(), nullable=False, server_default="0"
+            ))
+
+    # Backfill message counts for conversations created before the column existed
+    op.execute(
+        "UPDATE chat_conversations SET message_count = ("
+        "SELECT COUNT(*) FROM chat_messages "
+        "WHERE chat_messages.conversation_id = chat_conversations.conversation_id)"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("chat_conversations") as batch_op:
+        batch_op.drop_column("message_count")
+        batch_op.drop_column("summarized_message_count")
+        batch_op.drop_column("summary")
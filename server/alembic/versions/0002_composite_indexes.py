@@ -0,0 +1,34 @@
+"""Add composite indexes for history reads, appointment listing and keyset pagination
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_chat_messages_conversation_created", "chat_messages", ["conversation_id", "created_at"]),
+    ("ix_appointments_patient_status_scheduled", "appointments", ["patient_id", "status", "scheduled_time"]),
+    ("ix_medical_records_patient_id_id", "medical_records", ["patient_id", "id"]),
+    ("ix_support_tickets_patient_status_id", "support_tickets", ["patient_id", "status", "id"]),
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        existing = {index["name"] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,35 @@
+"""Add per-provider working hours used by the availability index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    sa.Column("work_days", sa.String(), nullable=True, server_default="0,1,2,3,4"),
+    sa.Column("work_start_hour", sa.Integer(), nullable=True, server_default="9"),
+    sa.Column("work_end_hour", sa.Integer(), nullable=True, server_default="17"),
+    sa.Column("slot_minutes", sa.Integer(), nullable=True, server_default="30"),
+]
+
+
+def upgrade() -> None:
+    existing = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("providers")}
+    with op.batch_alter_table("providers") as batch_op:
+        for column in COLUMNS:
+            if column.name not in existing:
+                batch_op.add_column(column)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("providers") as batch_op:
+        for column in reversed(COLUMNS):
+            batch_op.drop_column(column.name)
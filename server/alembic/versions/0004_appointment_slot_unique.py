@@ -0,0 +1,36 @@
+"""Prevent double booking with a partial unique index on active appointment slots
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = "uq_appointments_doctor_scheduled_active"
+ACTIVE = sa.text("status != 'cancelled'")
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    existing = {index["name"] for index in inspector.get_indexes("appointments")}
+    if INDEX_NAME not in existing:
+        # Fails if the table already holds double bookings; cancel the duplicates first
+        op.create_index(
+            INDEX_NAME,
+            "appointments",
+            ["doctor_name", "scheduled_time"],
+            unique=True,
+            sqlite_where=ACTIVE,
+            postgresql_where=ACTIVE,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(INDEX_NAME, table_name="appointments")
@@ -0,0 +1,33 @@
+"""Make provider names unique so concurrent workers can seed providers safely
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = "uq_providers_name"
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    existing = {index["name"] for index in inspector.get_indexes("providers")}
+    if INDEX_NAME not in existing:
+        # Workers that seeded an empty table at the same time left duplicate rows;
+        # appointments refer to doctors by name, so the extra rows can go
+        op.execute(
+            "DELETE FROM providers WHERE id NOT IN "
+            "(SELECT MIN(id) FROM providers GROUP BY name)"
+        )
+        op.create_index(INDEX_NAME, "providers", ["name"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(INDEX_NAME, table_name="providers")
@@ -1,5 +1,7 @@
 """AI Agents for intelligent task handling"""
 from app.agents.appointment_agent import AppointmentAgent
+from app.agents.intent_router import IntentRouter
+from app.agents.multilingual import MultilingualAgent
 
-__all__ = ['AppointmentAgent']
+__all__ = ['AppointmentAgent', 'IntentRouter', 'MultilingualAgent']
 
@@ -1,18 +1,51 @@
 """
 AI Agent for handling appointment scheduling through natural conversation.
-This agent extracts appointment details, suggests available slots, and completes bookings.
+This agent collects appointment details through typed tool calls, suggests available slots, and completes bookings.
 """
+import asyncio
+import logging
+from contextlib import aclosing
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Tuple
-from openai import OpenAI
-from sqlalchemy.orm import Session
-import json
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from openai import AsyncOpenAI
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import re
 
 from app.core.config import settings
+from app.core.llm import stream_chat_chunks
+from app.core.tracing import stage
+from app.db.session import after_commit
+from app.agents.appointment_tools import (
+    APPOINTMENT_TOOLS,
+    ActionCall,
+    BookAppointment,
+    CancelAppointment,
+    ShowSlots,
+    ToolCallAccumulator
+)
+from app.agents.intent_router import IntentRouter
+from app.services.availability import availability_index
+from app.services.reservations import SlotConflictError, book_appointment, slot_holds
 from app.models.appointment import Appointment
 from app.models.patient import Patient
 
+logger = logging.getLogger(__name__)
+
+# Streams still being read after their tool call was dispatched
+_draining: Set[asyncio.Task] = set()
+
+
+async def _drain(stream: AsyncIterator[Any]) -> None:
+    async with aclosing(stream):
+        try:
+            async for _ in stream:
+                pass
+        except Exception:
+            logger.warning("Failed to read the rest of an appointment stream", exc_info=True)
+
 
 class AppointmentAgent:
     """AI Agent that handles appointment scheduling requests"""
@@ -38,12 +71,13 @@ class AppointmentAgent:
         {"name": "Dr. Lisa Anderson", "specialty": "Dermatology", "id": "dr_anderson"}
     ]
     
-    def __init__(self, openai_client: OpenAI):
+    def __init__(self, openai_client: AsyncOpenAI, router: Optional[IntentRouter] = None):
         self.client = openai_client
+        self.router = router or IntentRouter()
         self.system_prompt = self._build_system_prompt()
     
     def _build_system_prompt(self) -> str:
-        """Build the system prompt for the appointment agent"""
+        """Build the static system prompt; it must not change between requests"""
         return f"""You are an intelligent appointment management agent for Carely Healthcare.
 
 Your capabilities:
@@ -68,39 +102,29 @@ Guidelines:
 - Remind users they can choose in-person or virtual appointments
 - Users can reference appointments by their ID number (e.g., "appointment #5")
 
-**For booking new appointments**, when you have enough information, respond with JSON:
-{{
-  "action": "book_appointment",
-  "appointment_details": {{
-    "appointment_type": "consultation",
-    "doctor_name": "Dr. Sarah Johnson",
-    "scheduled_time": "2024-11-10T14:00:00",
-    "reason": "Annual check-up",
-    "is_virtual": false,
-    "duration_minutes": 30
-  }}
-}}
+Use the tools to act:
+- **book_appointment** once you have the doctor, time, type and reason and the patient has confirmed
+- **show_slots** when the patient wants to see available times (doctor and specialty are optional filters)
+- **update_appointment** when the patient gives an appointment ID and what to change
+- **cancel_appointment** when the patient confirms which appointment to cancel
+Otherwise reply in plain text to ask for what is missing.
 
-**For showing available slots**:
-{{
-  "action": "show_slots",
-  "date_range": "2024-11-10 to 2024-11-15"
-}}
+Note: Listing appointments is handled directly without AI processing.
 
-**For rescheduling**, when user provides new time and appointment ID:
-{{
-  "action": "update_appointment",
-  "appointment_id": 5,
-  "updates": {{
-    "scheduled_time": "2024-11-12T15:00:00"
-  }}
-}}
-
-Note: List and cancel operations are handled directly without AI processing.
-
-Current date and time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+The current date and time are given in a system message right before the patient's latest message.
 """
     
+    def _build_context_message(self) -> Dict[str, str]:
+        """
+        Per-request facts, sent after the conversation history so the system prompt
+        and history form a byte-identical prefix that the API can cache
+        """
+        now = datetime.now()
+        return {
+            "role": "system",
+            "content": f"Current date and time: {now.strftime('%A, %Y-%m-%d %H:%M')}"
+        }
+    
     def _format_doctors_list(self) -> str:
         """Format doctors list for system prompt"""
         return '\n'.join([f"- {doc['name']} ({doc['specialty']})" for doc in self.DOCTORS])
@@ -108,116 +132,75 @@ Current date and time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
     def detect_appointment_intent(self, message: str) -> str:
         """
         Detect if the message is related to appointments and what type of operation.
-        Returns: 'create', 'list', 'view', 'update', 'cancel', or None
+        Returns: 'create', 'list', 'update', 'cancel', 'general', or None
         """
-        message_lower = message.lower()
-        
-        # Cancel/Delete keywords
-        cancel_keywords = ['cancel', 'delete', 'remove appointment', 'cancel appointment']
-        if any(keyword in message_lower for keyword in cancel_keywords):
-            return 'cancel'
-        
-        # Update/Reschedule keywords
-        update_keywords = ['reschedule', 'change', 'move', 'update', 'modify appointment']
-        if any(keyword in message_lower for keyword in update_keywords):
-            return 'update'
-        
-        # List/View all appointments
-        list_keywords = ['my appointments', 'my appointment', 'list appointments', 'list appointment',
-                        'show appointments', 'show appointment', 'show my', 'list my',
-                        'view appointments', 'view appointment', 'view my',
-                        'upcoming appointments', 'appointment history', 'see my appointments',
-                        'all appointments', 'next appointment', 'check my appointments',
-                        'display appointments', 'get my appointments', 'what appointments']
-        if any(keyword in message_lower for keyword in list_keywords):
-            return 'list'
-        
-        # Create/Book keywords
-        create_keywords = ['book', 'schedule', 'make appointment', 'need appointment',
-                          'want appointment', 'see a doctor', 'consultation', 'check-up',
-                          'available', 'time slot']
-        if any(keyword in message_lower for keyword in create_keywords):
-            return 'create'
-        
-        # Check for general appointment mention
-        if 'appointment' in message_lower:
-            return 'general'
-        
-        return None
+        return self.router.detect_operation(message)
     
-    def generate_available_slots(
-        self, 
+    async def generate_available_slots(
+        self,
+        db: AsyncSession,
         start_date: Optional[datetime] = None,
-        days_ahead: int = 7
+        days_ahead: int = 7,
+        specialty: Optional[str] = None,
+        doctor_name: Optional[str] = None,
+        limit: int = 20,
+        patient_id: Optional[int] = None
     ) -> List[Dict]:
         """
-        Generate available appointment slots.
-        In a real system, this would check actual doctor availability.
+        Return the earliest free slots from the availability index, which tracks
+        each doctor's working hours and existing appointments.
+        When patient_id is given, slots held for other patients are skipped and the
+        returned slots are held for this patient.
         """
-        if start_date is None:
-            start_date = datetime.now()
+        await availability_index.ensure_loaded(db, self.DOCTORS)
         
-        # Remove time component
-        start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        def held_by_other(name: str, slot_time: datetime) -> bool:
+            return slot_holds.is_held_by_other(patient_id, name, slot_time)
         
-        slots = []
+        exclude = held_by_other if patient_id is not None else None
         
-        # Generate slots for next N days (weekdays only, 9 AM - 5 PM)
-        for day_offset in range(days_ahead):
-            current_date = start_date + timedelta(days=day_offset)
-            
-            # Skip weekends
-            if current_date.weekday() >= 5:
-                continue
-            
-            # Generate slots for business hours (9 AM - 5 PM, every 30 mins)
-            for hour in range(9, 17):
-                for minute in [0, 30]:
-                    slot_time = current_date.replace(hour=hour, minute=minute)
-                    
-                    # Skip past times
-                    if slot_time < datetime.now():
-                        continue
-                    
-                    slots.append({
-                        "datetime": slot_time.isoformat(),
-                        "formatted": slot_time.strftime("%A, %B %d at %I:%M %p"),
-                        "available": True
-                    })
+        start = start_date or datetime.now()
+        slots = availability_index.next_free_slots(
+            specialty=specialty,
+            doctor_name=doctor_name,
+            start=start,
+            end=start + timedelta(days=days_ahead),
+            limit=limit,
+            exclude=exclude
+        )
         
-        return slots[:20]  # Return first 20 available slots
+        if patient_id is not None:
+            slot_holds.hold_many(
+                patient_id,
+                [(slot['doctor_name'], datetime.fromisoformat(slot['datetime'])) for slot in slots]
+            )
+        return slots
     
-    def extract_appointment_details(self, ai_response: str) -> Optional[Dict]:
-        """
-        Extract appointment details from AI response if present.
-        Looks for JSON data in the response.
-        """
+    def _parse_date_range(self, date_range: Optional[str]) -> Tuple[Optional[datetime], int]:
+        """Parse 'YYYY-MM-DD to YYYY-MM-DD' into (start, days_ahead); defaults to the next 7 days"""
+        if not date_range:
+            return None, 7
         try:
-            # Try to find JSON in the response
-            json_match = re.search(r'\{[\s\S]*\}', ai_response)
-            if json_match:
-                json_str = json_match.group(0)
-                data = json.loads(json_str)
-                
-                if data.get('action') in ['book_appointment', 'show_slots', 'list_appointments', 
-                                          'cancel_appointment', 'update_appointment']:
-                    return data
-        except (json.JSONDecodeError, AttributeError):
-            pass
-        
-        return None
+            parts = [part.strip() for part in date_range.split(" to ")]
+            start = datetime.fromisoformat(parts[0])
+            end = datetime.fromisoformat(parts[1]) if len(parts) > 1 else start
+            return start, max(1, (end - start).days + 1)
+        except ValueError:
+            return None, 7
     
-    def list_appointments(self, patient_id: int, db: Session, limit: int = 10) -> Tuple[str, Dict]:
+    async def list_appointments(self, patient_id: int, db: AsyncSession, limit: int = 10) -> Tuple[str, Dict]:
         """
         List appointments for a patient.
         Returns formatted message and appointment data.
         """
         try:
             # Query appointments (exclude cancelled ones)
-            appointments = db.query(Appointment).filter(
-                Appointment.patient_id == patient_id,
-                Appointment.status != 'cancelled'
-            ).order_by(Appointment.scheduled_time.desc()).limit(limit).all()
+            appointments = (await db.scalars(
+                select(Appointment).where(
+                    Appointment.patient_id == patient_id,
+                    Appointment.status != 'cancelled'
+                ).order_by(Appointment.scheduled_time.desc()).limit(limit)
+            )).all()
             
             if not appointments:
                 return "You don't have any appointments scheduled yet. Would you like to book one?", {
@@ -274,17 +257,17 @@ Current date and time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
                 "success": False
             }
     
-    def cancel_appointment(self, patient_id: int, appointment_id: int, db: Session) -> Tuple[str, Dict]:
+    async def cancel_appointment(self, patient_id: int, appointment_id: int, db: AsyncSession) -> Tuple[str, Dict]:
         """
         Cancel an appointment.
         Returns confirmation message and status.
         """
         try:
             # Find appointment
-            appointment = db.query(Appointment).filter(
+            appointment = await db.scalar(select(Appointment).where(
                 Appointment.id == appointment_id,
                 Appointment.patient_id == patient_id
-            ).first()
+            ))
             
             if not appointment:
                 return f"I couldn't find appointment #{appointment_id} for your account. Please check the appointment number.", {
@@ -304,7 +287,12 @@ Current date and time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
             old_status = appointment.status
             appointment.status = 'cancelled'
             appointment.updated_at = datetime.utcnow()
-            db.commit()
+            # Committed with the rest of the chat turn; the index follows once it is
+            await db.flush()
+            after_commit(db, partial(
+                availability_index.release,
+                appointment.doctor_name, appointment.scheduled_time, appointment.duration_minutes
+            ))
             
             response = f"""❌ **Appointment Cancelled**
 
@@ -331,19 +319,19 @@ If you'd like to book a new appointment, just let me know!"""
             }
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             return f"I'm sorry, I encountered an error cancelling the appointment: {str(e)}", {
                 "action": "cancel_appointment",
                 "success": False,
                 "error": str(e)
             }
     
-    def update_appointment(
+    async def update_appointment(
         self, 
         patient_id: int, 
         appointment_id: int,
         updates: Dict,
-        db: Session
+        db: AsyncSession
     ) -> Tuple[str, Dict]:
         """
         Update an appointment.
@@ -351,10 +339,10 @@ If you'd like to book a new appointment, just let me know!"""
         """
         try:
             # Find appointment
-            appointment = db.query(Appointment).filter(
+            appointment = await db.scalar(select(Appointment).where(
                 Appointment.id == appointment_id,
                 Appointment.patient_id == patient_id
-            ).first()
+            ))
             
             if not appointment:
                 return f"I couldn't find appointment #{appointment_id} for your account.", {
@@ -372,22 +360,31 @@ If you'd like to book a new appointment, just let me know!"""
             
             # Store old values for confirmation
             old_time = appointment.scheduled_time
+            old_duration = appointment.duration_minutes
             old_notes = appointment.notes
             
-            # Update fields
-            if 'scheduled_time' in updates:
-                appointment.scheduled_time = updates['scheduled_time']
-            if 'notes' in updates:
-                appointment.notes = updates['notes']
-            if 'duration_minutes' in updates:
-                appointment.duration_minutes = updates['duration_minutes']
-            if 'is_virtual' in updates:
-                appointment.is_virtual = int(updates['is_virtual'])
-                appointment.location = 'Virtual' if updates['is_virtual'] else 'Main Clinic'
+            # Update fields inside a savepoint so a slot conflict only rolls back this change,
+            # not the rest of the chat turn (begin_nested flushes earlier changes first)
+            async with db.begin_nested():
+                if 'scheduled_time' in updates:
+                    appointment.scheduled_time = updates['scheduled_time']
+                if 'notes' in updates:
+                    appointment.notes = updates['notes']
+                if 'duration_minutes' in updates:
+                    appointment.duration_minutes = updates['duration_minutes']
+                if 'is_virtual' in updates:
+                    appointment.is_virtual = int(updates['is_virtual'])
+                    appointment.location = 'Virtual' if updates['is_virtual'] else 'Main Clinic'
+                
+                appointment.updated_at = datetime.utcnow()
+                await db.flush()
             
-            appointment.updated_at = datetime.utcnow()
-            db.commit()
-            db.refresh(appointment)
+            if old_time != appointment.scheduled_time or old_duration != appointment.duration_minutes:
+                after_commit(db, partial(availability_index.release, appointment.doctor_name, old_time, old_duration))
+                after_commit(db, partial(
+                    availability_index.mark_booked,
+                    appointment.doctor_name, appointment.scheduled_time, appointment.duration_minutes
+                ))
             
             response = f"""✅ **Appointment Updated**
 
@@ -421,8 +418,14 @@ Appointment #{appointment.id} has been successfully updated.
                 }
             }
             
+        except IntegrityError:
+            return "I'm sorry, that time is already booked with this doctor. Would you like to see other available slots?", {
+                "action": "update_appointment",
+                "success": False,
+                "error": "Slot unavailable"
+            }
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             return f"I'm sorry, I encountered an error updating the appointment: {str(e)}", {
                 "action": "update_appointment",
                 "success": False,
@@ -434,7 +437,7 @@ Appointment #{appointment.id} has been successfully updated.
         message: str,
         conversation_history: List[Dict],
         patient_id: int,
-        db: Session,
+        db: AsyncSession,
         intent: str = None
     ) -> Tuple[str, Optional[Dict]]:
         """
@@ -443,14 +446,14 @@ Appointment #{appointment.id} has been successfully updated.
         """
         # Handle direct operations (list, cancel specific appointment)
         if intent == 'list':
-            return self.list_appointments(patient_id, db)
+            return await self.list_appointments(patient_id, db)
         
         # Check for appointment ID in message for cancel/update operations
         appointment_id_match = re.search(r'#?(\d+)', message)
         
         if intent == 'cancel' and appointment_id_match:
             appointment_id = int(appointment_id_match.group(1))
-            return self.cancel_appointment(patient_id, appointment_id, db)
+            return await self.cancel_appointment(patient_id, appointment_id, db)
         
         # Build messages for OpenAI
         messages = [
@@ -460,60 +463,140 @@ Appointment #{appointment.id} has been successfully updated.
         # Add conversation history
         messages.extend(conversation_history)
         
-        # Add current message
+        # Add dynamic facts and the current message after the cacheable prefix
+        messages.append(self._build_context_message())
         messages.append({"role": "user", "content": message})
         
         try:
-            # Call OpenAI API
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            ai_response = response.choices[0].message.content.strip()
+            with stage("appointment.model"):
+                action, ai_response = await self._run_model(messages)
+            if action is None:
+                return ai_response, None
+            # Only validated names, so a stray tool name cannot add label values
+            step = action.name if action.args is not None else "invalid_action"
+            with stage(f"appointment.{step}"):
+                return await self._dispatch_action(action, ai_response, patient_id, db)
             
-            # Extract appointment details if present
-            appointment_data = self.extract_appointment_details(ai_response)
+        except Exception as e:
+            error_message = f"I apologize, but I encountered an error while processing your appointment request: {str(e)}"
+            return error_message, {"error": str(e), "success": False}
+    
+    async def _run_model(self, messages: List[Dict]) -> Tuple[Optional[ActionCall], str]:
+        """
+        Stream the model's reply with the appointment tools available.
+        Returns the first tool call (dispatched as soon as its arguments are complete,
+        without waiting for the rest of the stream) and any text the model wrote.
+        """
+        text_parts = []
+        accumulator = ToolCallAccumulator()
+        action = None
+        
+        stream = stream_chat_chunks(
+            self.client,
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=1000,
+            tools=APPOINTMENT_TOOLS,
+            parallel_tool_calls=False
+        )
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    text_parts.append(delta.content)
+                ready = accumulator.feed(delta.tool_calls)
+                if ready:
+                    action = ready[0]
+                    break
+        except BaseException:
+            await stream.aclose()
+            raise
+        
+        if action is not None:
+            # Dispatch now, but read the rest of the stream in the background so the
+            # final usage chunk (prompt and cached tokens, cost) is still recorded
+            task = asyncio.create_task(_drain(stream))
+            _draining.add(task)
+            task.add_done_callback(_draining.discard)
+        else:
+            await stream.aclose()
+            remaining = accumulator.finish()
+            action = remaining[0] if remaining else None
+        return action, "".join(text_parts).strip()
+    
+    async def _dispatch_action(
+        self, action: ActionCall, ai_response: str, patient_id: int, db: AsyncSession
+    ) -> Tuple[str, Dict]:
+        """Carry out a validated tool call"""
+        if action.args is None:
+            return ai_response or "I'm sorry, I couldn't read those appointment details. Could you confirm them?", {
+                "action": action.name,
+                "success": False,
+                "error": action.error
+            }
+        
+        args = action.args
+        if isinstance(args, BookAppointment):
+            return await self._book_from_action(args, ai_response, patient_id, db)
+        
+        if isinstance(args, ShowSlots):
+            return await self._show_slots_from_action(args, ai_response, patient_id, db)
+        
+        if isinstance(args, CancelAppointment):
+            return await self.cancel_appointment(patient_id, args.appointment_id, db)
+        
+        # UpdateAppointment
+        updates = args.model_dump(exclude={"appointment_id"}, exclude_none=True)
+        return await self.update_appointment(patient_id, args.appointment_id, updates, db)
+    
+    async def _book_from_action(
+        self, args: BookAppointment, ai_response: str, patient_id: int, db: AsyncSession
+    ) -> Tuple[str, Dict]:
+        """Book the appointment from a book_appointment call, offering alternatives on conflict"""
+        details = args.model_dump(mode="json")
+        if details["duration_minutes"] is None:
+            details["duration_minutes"] = 30
+        appointment_data = {"action": "book_appointment", "appointment_details": details}
+        
+        try:
+            # Create appointment in database
+            appointment = await self._create_appointment(patient_id, details, args.scheduled_time, db)
+        except SlotConflictError as e:
+            # Someone else got the slot first; offer the nearest open ones instead
+            alternatives = await self.generate_available_slots(
+                db,
+                start_date=e.scheduled_time.replace(tzinfo=None),
+                days_ahead=7,
+                doctor_name=e.doctor_name,
+                limit=3,
+                patient_id=patient_id
+            )
+            appointment_data['success'] = False
+            appointment_data['error'] = "Slot unavailable"
+            appointment_data['alternatives'] = alternatives
             
-            # If booking appointment, create it in the database
-            if appointment_data and appointment_data.get('action') == 'book_appointment':
-                details = appointment_data.get('appointment_details', {})
-                
-                # Parse the scheduled time
-                scheduled_time_str = details.get('scheduled_time')
-                if scheduled_time_str:
-                    try:
-                        scheduled_time = datetime.fromisoformat(scheduled_time_str.replace('Z', '+00:00'))
-                        
-                        # Create appointment in database
-                        appointment = Appointment(
-                            patient_id=patient_id,
-                            doctor_name=details.get('doctor_name', 'Dr. Sarah Johnson'),
-                            appointment_type=details.get('appointment_type', 'consultation'),
-                            scheduled_time=scheduled_time,
-                            duration_minutes=details.get('duration_minutes', 30),
-                            reason=details.get('reason', ''),
-                            is_virtual=int(details.get('is_virtual', False)),
-                            status='scheduled',
-                            location='Main Clinic' if not details.get('is_virtual') else 'Virtual'
-                        )
-                        
-                        db.add(appointment)
-                        db.commit()
-                        db.refresh(appointment)
-                        
-                        # Add appointment ID to response data
-                        appointment_data['appointment_id'] = appointment.id
-                        appointment_data['success'] = True
-                        
-                        # Clean up the AI response to remove JSON
-                        ai_response = re.sub(r'\{[\s\S]*\}', '', ai_response).strip()
-                        
-                        # Add confirmation message if not present
-                        if not ai_response:
-                            ai_response = f"""✅ Appointment booked successfully!
+            ai_response = (
+                f"I'm sorry, {e.doctor_name} was just booked for "
+                f"{e.scheduled_time.strftime('%A, %B %d at %I:%M %p')}."
+            )
+            if alternatives:
+                ai_response += " Here are the nearest open slots I've held for you:\n"
+                for i, slot in enumerate(alternatives, 1):
+                    ai_response += f"{i}. {slot['formatted']} with {slot['doctor_name']}\n"
+            else:
+                ai_response += " Would you like to try another doctor or date?"
+            return ai_response, appointment_data
+        
+        # Add appointment ID to response data
+        appointment_data['appointment_id'] = appointment.id
+        appointment_data['success'] = True
+        
+        # Add confirmation message if the model did not write one
+        if not ai_response:
+            ai_response = f"""✅ Appointment booked successfully!
 
 📅 **Appointment Details:**
 - **Doctor:** {appointment.doctor_name}
@@ -524,31 +607,60 @@ Appointment #{appointment.id} has been successfully updated.
 - **Reason:** {appointment.reason}
 
 You'll receive a reminder 24 hours before your appointment. If you need to reschedule or cancel, just let me know!"""
-                        
-                    except (ValueError, KeyError) as e:
-                        appointment_data['success'] = False
-                        appointment_data['error'] = str(e)
-            
-            # If showing available slots
-            elif appointment_data and appointment_data.get('action') == 'show_slots':
-                slots = self.generate_available_slots()
-                appointment_data['slots'] = slots[:10]  # Return top 10 slots
-                
-                # Format slots in response
-                slots_text = "\n\n📅 **Available Appointments:**\n"
-                for i, slot in enumerate(slots[:10], 1):
-                    slots_text += f"{i}. {slot['formatted']}\n"
-                
-                ai_response = re.sub(r'\{[\s\S]*\}', '', ai_response).strip()
-                if not ai_response:
-                    ai_response = "Here are the available appointment slots:"
-                ai_response += slots_text
-            
-            return ai_response, appointment_data
-            
-        except Exception as e:
-            error_message = f"I apologize, but I encountered an error while processing your appointment request: {str(e)}"
-            return error_message, {"error": str(e), "success": False}
+        return ai_response, appointment_data
+    
+    async def _show_slots_from_action(
+        self, args: ShowSlots, ai_response: str, patient_id: int, db: AsyncSession
+    ) -> Tuple[str, Dict]:
+        """List open slots for a show_slots call"""
+        appointment_data = {"action": "show_slots", **args.model_dump()}
+        start_date, days_ahead = self._parse_date_range(args.date_range)
+        slots = await self.generate_available_slots(
+            db,
+            start_date=start_date,
+            days_ahead=days_ahead,
+            specialty=args.specialty,
+            doctor_name=args.doctor_name,
+            limit=10,
+            patient_id=patient_id
+        )
+        appointment_data['slots'] = slots  # Return top 10 slots
+        
+        # Format slots in response
+        slots_text = "\n\n📅 **Available Appointments:**\n"
+        for i, slot in enumerate(slots, 1):
+            slots_text += f"{i}. {slot['formatted']} with {slot['doctor_name']}\n"
+        
+        if not ai_response:
+            ai_response = "Here are the available appointment slots:"
+        return ai_response + slots_text, appointment_data
+    
+    async def _create_appointment(
+        self,
+        patient_id: int,
+        details: Dict,
+        scheduled_time: datetime,
+        db: AsyncSession
+    ) -> Appointment:
+        """Persist a booked appointment, raising SlotConflictError if the slot was taken"""
+        await availability_index.ensure_loaded(db, self.DOCTORS)
+        
+        appointment = Appointment(
+            patient_id=patient_id,
+            doctor_name=details.get('doctor_name', 'Dr. Sarah Johnson'),
+            appointment_type=details.get('appointment_type', 'consultation'),
+            scheduled_time=scheduled_time,
+            duration_minutes=details.get('duration_minutes', 30),
+            reason=details.get('reason', ''),
+            is_virtual=int(details.get('is_virtual', False)),
+            status='scheduled',
+            location='Main Clinic' if not details.get('is_virtual') else 'Virtual'
+        )
+        
+        # Flushed only; the chat turn commits the booking together with its messages
+        return await book_appointment(
+            db, appointment, holds=slot_holds, index=availability_index, commit=False
+        )
     
     def format_appointment_confirmation(self, appointment: Appointment) -> str:
         """Format appointment confirmation message"""
@@ -0,0 +1,129 @@
+"""
+Structured actions for the appointment agent.
+Each action is a pydantic model exposed to the model as a strict function tool, so
+arguments arrive as schema-conforming JSON instead of being scraped out of the reply.
+ToolCallAccumulator assembles streamed tool-call deltas and releases each call as
+soon as its arguments are complete.
+"""
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Literal, Optional, Type
+
+from openai import pydantic_function_tool
+from pydantic import BaseModel, Field, ValidationError
+
+AppointmentType = Literal[
+    "consultation", "follow-up", "check-up", "emergency", "vaccination",
+    "lab_test", "physical_exam", "specialist_visit"
+]
+
+
+class BookAppointment(BaseModel):
+    """Book a new appointment once the patient has confirmed doctor, time and reason"""
+    appointment_type: AppointmentType
+    doctor_name: str = Field(description="One of the available doctors, e.g. 'Dr. Sarah Johnson'")
+    scheduled_time: datetime = Field(description="Start time in ISO 8601, e.g. 2024-11-10T14:00:00")
+    reason: str
+    is_virtual: bool
+    duration_minutes: Optional[int] = Field(description="Length in minutes; null for the default 30")
+
+
+class ShowSlots(BaseModel):
+    """Show available appointment slots, optionally filtered by doctor or specialty"""
+    date_range: Optional[str] = Field(description="'YYYY-MM-DD to YYYY-MM-DD'; null for the next 7 days")
+    specialty: Optional[str]
+    doctor_name: Optional[str]
+
+
+class CancelAppointment(BaseModel):
+    """Cancel one of the patient's appointments after they have confirmed"""
+    appointment_id: int
+
+
+class UpdateAppointment(BaseModel):
+    """Reschedule or change an existing appointment; null fields are left unchanged"""
+    appointment_id: int
+    scheduled_time: Optional[datetime] = Field(description="New start time in ISO 8601")
+    duration_minutes: Optional[int]
+    notes: Optional[str]
+    is_virtual: Optional[bool]
+
+
+ACTIONS: Dict[str, Type[BaseModel]] = {
+    "book_appointment": BookAppointment,
+    "show_slots": ShowSlots,
+    "cancel_appointment": CancelAppointment,
+    "update_appointment": UpdateAppointment,
+}
+
+APPOINTMENT_TOOLS = [pydantic_function_tool(model, name=name) for name, model in ACTIONS.items()]
+
+
+@dataclass
+class ActionCall:
+    """A tool call from the model; args is None when the arguments failed validation"""
+    name: str
+    arguments: str
+    args: Optional[BaseModel] = None
+    error: Optional[str] = None
+
+
+def parse_action(name: str, arguments: str) -> ActionCall:
+    """Validate a tool call against its action model"""
+    model = ACTIONS.get(name)
+    if model is None:
+        return ActionCall(name, arguments, error=f"Unknown action '{name}'")
+    try:
+        return ActionCall(name, arguments, args=model.model_validate_json(arguments))
+    except ValidationError as e:
+        return ActionCall(name, arguments, error=str(e))
+
+
+class ToolCallAccumulator:
+    """
+    Collects streamed tool-call deltas by index. feed() returns the calls that
+    became complete with this chunk, so they can be dispatched before the stream
+    ends; finish() returns whatever is left once it has.
+    """
+
+    def __init__(self):
+        self._calls: Dict[int, Dict[str, str]] = {}
+        self._released = set()
+
+    def feed(self, tool_call_deltas) -> List[ActionCall]:
+        ready: List[ActionCall] = []
+        for delta in tool_call_deltas or ():
+            # A new index means every earlier call has been fully streamed
+            for index in sorted(self._calls):
+                if index < delta.index and index not in self._released:
+                    ready.append(self._release(index))
+
+            call = self._calls.setdefault(delta.index, {"name": "", "arguments": ""})
+            function = delta.function
+            if function is not None:
+                call["name"] += function.name or ""
+                call["arguments"] += function.arguments or ""
+
+            if delta.index not in self._released and self._is_complete(call["arguments"]):
+                ready.append(self._release(delta.index))
+        return ready
+
+    def finish(self) -> List[ActionCall]:
+        return [self._release(index) for index in sorted(self._calls) if index not in self._released]
+
+    @staticmethod
+    def _is_complete(arguments: str) -> bool:
+        # Only try to parse once the buffer could hold a whole object
+        if not arguments.rstrip().endswith("}"):
+            return False
+        try:
+            json.loads(arguments)
+        except ValueError:
+            return False
+        return True
+
+    def _release(self, index: int) -> ActionCall:
+        self._released.add(index)
+        call = self._calls[index]
+        return parse_action(call["name"], call["arguments"])
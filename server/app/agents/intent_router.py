@@ -0,0 +1,167 @@
+"""
+Compiled intent router for chat messages.
+
+Runs precompiled keyword matchers: the appointment operation patterns, which decide
+routing in the chat endpoints (classify), and the scheduling/Q&A keyword votes scored
+like the routing agent's sentence scanner (scan).
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from nltk.stem import PorterStemmer
+    _stem = PorterStemmer().stem
+except ImportError:  # nltk is optional; fall back to light suffix stripping
+    PorterStemmer = None
+    
+    def _stem(word: str) -> str:
+        for suffix in ("ations", "ation", "ings", "ing", "edly", "ies", "ed", "es", "s"):
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+        return word
+
+
+# Keyword votes for the scheduling vs Q&A decision
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "Scheduling": [
+        "schedule", "appointment", "book", "doctor", "meeting", "make", "time", "cancel", "update",
+        "reschedule", "date", "available", "availability", "department", "visit",
+        "slot", "slots", "openings", "see", "see a doctor", "follow-up", "check-in"
+    ],
+    "Q&A": [
+        "question", "query", "general", "answer", "ask", "hours", "how", "what", "which", "when",
+        "side effect", "side effects", "dosage", "dose", "instruction", "policy", "coverage",
+        "benefit", "copay", "cost", "price", "refill", "medication", "medicine", "symptom", "faq"
+    ]
+}
+
+# Appointment operations, checked in order (first match wins)
+OPERATION_KEYWORDS: List[Tuple[str, List[str]]] = [
+    ("cancel", ['cancel', 'delete', 'remove appointment', 'cancel appointment']),
+    ("update", ['reschedule', 'change', 'move', 'update', 'modify appointment']),
+    ("list", ['my appointments', 'my appointment', 'list appointments', 'list appointment',
+              'show appointments', 'show appointment', 'show my', 'list my',
+              'view appointments', 'view appointment', 'view my',
+              'upcoming appointments', 'appointment history', 'see my appointments',
+              'all appointments', 'next appointment', 'check my appointments',
+              'display appointments', 'get my appointments', 'what appointments']),
+    ("create", ['book', 'schedule', 'make appointment', 'need appointment',
+                'want appointment', 'see a doctor', 'consultation', 'check-up',
+                'available', 'time slot']),
+    ("general", ['appointment']),
+]
+
+# Messages that may describe an emergency; their LLM calls go to the urgent queue lane
+URGENT_KEYWORDS: List[str] = [
+    "emergency", "chest pain", "can't breathe", "cannot breathe", "trouble breathing",
+    "difficulty breathing", "short of breath", "severe bleeding", "bleeding heavily",
+    "unconscious", "passed out", "fainted", "stroke", "heart attack", "seizure",
+    "overdose", "suicidal", "suicide", "kill myself", "anaphylaxis", "allergic reaction",
+    "severe pain"
+]
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?|[0-9]+")
+_TASK_TO_INTENT = {"Scheduling": "scheduling", "Q&A": "qna"}
+
+
+@lru_cache(maxsize=16384)
+def stem(token: str) -> str:
+    """Memoized stemmer; each distinct token is stemmed once per process"""
+    return _stem(token)
+
+
+def _compile_substring_matcher(keywords: List[str]) -> "re.Pattern":
+    """One alternation regex equivalent to any(keyword in text for keyword in keywords)"""
+    ordered = sorted(set(keywords), key=len, reverse=True)
+    return re.compile("|".join(re.escape(keyword) for keyword in ordered))
+
+
+_URGENT_MATCHER = _compile_substring_matcher(URGENT_KEYWORDS)
+
+
+def is_urgent(message: str) -> bool:
+    """Whether the message mentions a possible emergency"""
+    return _URGENT_MATCHER.search(message.lower()) is not None
+
+
+class IntentRouter:
+    """Routes chat messages with compiled keyword matchers"""
+    
+    def __init__(
+        self,
+        intent_map: Dict[str, List[str]] = INTENT_KEYWORDS
+    ):
+        self._operation_matchers = [
+            (operation, _compile_substring_matcher(keywords))
+            for operation, keywords in OPERATION_KEYWORDS
+        ]
+        
+        # Exact words and stemmed keywords per task, resolved once per distinct token
+        self._words = {task: frozenset(words) for task, words in intent_map.items()}
+        self._stems = {task: frozenset(stem(word) for word in words) for task, words in intent_map.items()}
+        self.classify_token = lru_cache(maxsize=16384)(self._classify_token)
+    
+    def _classify_token(self, token: str) -> Optional[str]:
+        """Return the task a single token votes for (Scheduling takes precedence)"""
+        subword = stem(token)
+        for task in ("Scheduling", "Q&A"):
+            if subword in self._stems.get(task, ()) or token in self._words.get(task, ()):
+                return task
+        return None
+    
+    def detect_operation(self, message: str) -> Optional[str]:
+        """
+        Detect which appointment operation a message refers to.
+        Returns: 'cancel', 'update', 'list', 'create', 'general', or None
+        """
+        message_lower = message.lower()
+        for operation, matcher in self._operation_matchers:
+            if matcher.search(message_lower):
+                return operation
+        return None
+    
+    def scan(self, text: str) -> Dict:
+        """Keyword vote over the message, scored like the routing agent's sentence_scanner"""
+        evidence = []
+        scheduling_count = qna_count = 0
+        for index, match in enumerate(TOKEN_PATTERN.finditer(text or "")):
+            token = match.group(0).lower()
+            task = self.classify_token(token)
+            if task is None:
+                continue
+            evidence.append({"index": index, "keyword": token, "specific_task": task, "match": True})
+            if task == "Scheduling":
+                scheduling_count += 1
+            else:
+                qna_count += 1
+        
+        total = max(1, scheduling_count + qna_count)
+        confidence = 0.5 + 0.5 * (abs(scheduling_count - qna_count) / total)
+        
+        if scheduling_count > qna_count:
+            intent, rationale = "scheduling", "keyword votes favor scheduling"
+        elif scheduling_count < qna_count:
+            intent, rationale = "qna", "keyword votes favor qna"
+        else:
+            intent, rationale = "user_decision", "keyword votes equal (>=0) or unusual text, favor user's decision"
+        
+        return {
+            "schema_version": "1.0",
+            "intent": intent,
+            "confidence": confidence,
+            "rationale": rationale,
+            "counts": {"scheduling": scheduling_count, "qna": qna_count},
+            "evidence": evidence,
+            "source": "stemming rule",
+            "raw_text": text
+        }
+    
+    def classify(self, message: str) -> Optional[str]:
+        """
+        Resolve the appointment intent for the chat endpoints: only explicit operation
+        keywords (or "appointment") go to the appointment agent. Keyword votes are not
+        used here, since words like "doctor" or "visit" are common in medical questions.
+        Returns None for Q&A.
+        """
+        return self.detect_operation(message)
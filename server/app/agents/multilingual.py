@@ -0,0 +1,688 @@
+"""
+Multilingual agent: language detection and translation for chat messages and
+support tickets.
+
+Detection is statistical first and works on whole batches with NumPy. Unicode
+script ranges decide the languages that have a script of their own (Japanese,
+Korean, Thai, Hindi, ...); Latin and Cyrillic texts are scored against hashed
+character 1-3-gram profiles built from a small seed corpus at import time. Only
+texts whose confidence is below MULTILINGUAL_CONFIDENCE_THRESHOLD go to the LLM,
+all of them in one prompt per MULTILINGUAL_LLM_BATCH_SIZE texts. Translation
+likewise sends one prompt per batch.
+"""
+import asyncio
+import json
+import logging
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Collection, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.llm import chat_completion, get_openai_client
+from app.services.response_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+LANGUAGE_NAMES = {
+    'af': 'Afrikaans', 'ar': 'Arabic', 'bg': 'Bulgarian', 'bn': 'Bengali',
+    'ca': 'Catalan', 'cs': 'Czech', 'cy': 'Welsh', 'da': 'Danish',
+    'de': 'German', 'el': 'Greek', 'en': 'English', 'es': 'Spanish',
+    'et': 'Estonian', 'fa': 'Persian', 'fi': 'Finnish', 'fr': 'French',
+    'gu': 'Gujarati', 'he': 'Hebrew', 'hi': 'Hindi', 'hr': 'Croatian',
+    'hu': 'Hungarian', 'id': 'Indonesian', 'it': 'Italian', 'ja': 'Japanese',
+    'kn': 'Kannada', 'ko': 'Korean', 'lt': 'Lithuanian', 'lv': 'Latvian',
+    'mk': 'Macedonian', 'ml': 'Malayalam', 'mr': 'Marathi', 'ne': 'Nepali',
+    'nl': 'Dutch', 'no': 'Norwegian', 'pa': 'Punjabi', 'pl': 'Polish',
+    'pt': 'Portuguese', 'ro': 'Romanian', 'ru': 'Russian', 'sk': 'Slovak',
+    'sl': 'Slovenian', 'so': 'Somali', 'sq': 'Albanian', 'sv': 'Swedish',
+    'sw': 'Swahili', 'ta': 'Tamil', 'te': 'Telugu', 'th': 'Thai',
+    'tl': 'Tagalog', 'tr': 'Turkish', 'uk': 'Ukrainian', 'ur': 'Urdu',
+    'vi': 'Vietnamese', 'zh-cn': 'Chinese (Simplified)', 'zh-tw': 'Chinese (Traditional)'
+}
+
+# Seed text for the n-gram profiles of languages sharing the Latin or Cyrillic script
+PROFILE_TEXTS: Dict[str, str] = {
+    "en": "Hello, how are you today? I need to book an appointment with my doctor next week. "
+          "My head hurts and I have had a fever since yesterday. Can you tell me when the clinic "
+          "is open and how much the visit will cost? Thank you very much for your help with my "
+          "prescription. I would like to cancel my appointment and talk to the nurse about my "
+          "medication, the side effects and my insurance.",
+    "es": "Hola, ¿cómo estás hoy? Necesito hacer una cita con mi médico la próxima semana. "
+          "Me duele la cabeza y tengo fiebre desde ayer. ¿Puede decirme cuándo está abierta la "
+          "clínica y cuánto cuesta la consulta? Muchas gracias por su ayuda con mi receta. Quiero "
+          "cancelar mi cita y hablar con la enfermera sobre mis medicamentos y mi seguro. Mañana "
+          "quiero ver a un doctor porque mi niño tiene tos y dolor de garganta.",
+    "fr": "Bonjour, comment allez-vous aujourd'hui ? J'ai besoin de prendre rendez-vous avec mon "
+          "médecin la semaine prochaine. J'ai mal à la tête et j'ai de la fièvre depuis hier. "
+          "Pouvez-vous me dire quand la clinique est ouverte et combien coûte la consultation ? "
+          "Merci beaucoup pour votre aide avec mon ordonnance. Je voudrais annuler mon rendez-vous "
+          "et parler à l'infirmière de mes médicaments et de mon assurance.",
+    "de": "Guten Tag, wie geht es Ihnen heute? Ich brauche nächste Woche einen Termin bei meinem "
+          "Arzt. Ich habe Kopfschmerzen und seit gestern Fieber. Können Sie mir sagen, wann die "
+          "Praxis geöffnet ist und was die Untersuchung kostet? Vielen Dank für Ihre Hilfe mit "
+          "meinem Rezept. Ich möchte meinen Termin absagen und mit der Krankenschwester über meine "
+          "Medikamente und meine Versicherung sprechen.",
+    "it": "Ciao, come stai oggi? Ho bisogno di prenotare una visita con il mio medico la prossima "
+          "settimana. Mi fa male la testa e ho la febbre da ieri. Può dirmi quando è aperta la "
+          "clinica e quanto costa la visita? Grazie mille per il suo aiuto con la mia ricetta. "
+          "Vorrei annullare il mio appuntamento e parlare con l'infermiera dei miei farmaci e "
+          "della mia assicurazione.",
+    "pt": "Olá, como você está hoje? Preciso marcar uma consulta com o meu médico na próxima "
+          "semana. Estou com dor de cabeça e tenho febre desde ontem. Você pode me dizer quando a "
+          "clínica está aberta e quanto custa a consulta? Muito obrigado pela sua ajuda com a minha "
+          "receita. Quero cancelar a minha consulta e falar com a enfermeira sobre os meus "
+          "remédios e o meu seguro. Amanhã eu quero ver um médico porque o meu filho está com "
+          "tosse e dor de garganta.",
+    "nl": "Hallo, hoe gaat het met je vandaag? Ik moet volgende week een afspraak maken met mijn "
+          "huisarts. Ik heb hoofdpijn en sinds gisteren koorts. Kunt u mij vertellen wanneer de "
+          "kliniek open is en wat het consult kost? Hartelijk dank voor uw hulp met mijn recept. "
+          "Ik wil mijn afspraak annuleren en met de verpleegkundige praten over mijn medicijnen "
+          "en mijn verzekering.",
+    "sv": "Hej, hur mår du idag? Jag behöver boka en tid hos min läkare nästa vecka. Jag har ont "
+          "i huvudet och har haft feber sedan igår. Kan du berätta när kliniken är öppen och vad "
+          "besöket kostar? Tack så mycket för din hjälp med mitt recept. Jag vill avboka min tid "
+          "och prata med sjuksköterskan om mina mediciner och min försäkring.",
+    "da": "Hej, hvordan har du det i dag? Jeg har brug for at bestille en tid hos min læge i "
+          "næste uge. Jeg har ondt i hovedet og har haft feber siden i går. Kan du fortælle mig, "
+          "hvornår klinikken er åben, og hvad besøget koster? Mange tak for din hjælp med min "
+          "recept. Jeg vil gerne aflyse min tid og tale med sygeplejersken om min medicin og min "
+          "forsikring.",
+    "no": "Hei, hvordan har du det i dag? Jeg trenger å bestille time hos fastlegen min neste uke. "
+          "Jeg har vondt i hodet og har hatt feber siden i går. Kan du fortelle meg når klinikken "
+          "er åpen og hva konsultasjonen koster? Tusen takk for hjelpen med resepten min. Jeg vil "
+          "avbestille timen min og snakke med sykepleieren om medisinene mine og forsikringen min.",
+    "fi": "Hei, mitä kuuluu tänään? Minun täytyy varata aika lääkärille ensi viikolla. Päätäni "
+          "särkee ja minulla on ollut kuumetta eilisestä asti. Voitteko kertoa, milloin klinikka "
+          "on auki ja paljonko käynti maksaa? Kiitos paljon avusta reseptini kanssa. Haluan "
+          "perua aikani ja puhua sairaanhoitajan kanssa lääkkeistäni ja vakuutuksestani.",
+    "pl": "Cześć, jak się masz dzisiaj? Muszę umówić się na wizytę u lekarza w przyszłym "
+          "tygodniu. Boli mnie głowa i od wczoraj mam gorączkę. Czy może mi pan powiedzieć, kiedy "
+          "przychodnia jest otwarta i ile kosztuje wizyta? Bardzo dziękuję za pomoc z moją "
+          "receptą. Chcę odwołać wizytę i porozmawiać z pielęgniarką o moich lekach i "
+          "ubezpieczeniu.",
+    "cs": "Dobrý den, jak se dnes máte? Potřebuji se příští týden objednat k lékaři. Bolí mě "
+          "hlava a od včerejška mám horečku. Můžete mi říct, kdy je ordinace otevřená a kolik "
+          "stojí vyšetření? Děkuji mnohokrát za pomoc s mým receptem. Chci zrušit svou návštěvu a "
+          "promluvit si se sestrou o svých lécích a pojištění.",
+    "ro": "Bună ziua, ce mai faceți astăzi? Am nevoie să fac o programare la medicul meu "
+          "săptămâna viitoare. Mă doare capul și am febră de ieri. Îmi puteți spune când este "
+          "deschisă clinica și cât costă consultația? Vă mulțumesc mult pentru ajutorul cu rețeta "
+          "mea. Vreau să anulez programarea și să vorbesc cu asistenta despre medicamentele mele.",
+    "hu": "Jó napot, hogy van ma? Jövő hétre időpontot szeretnék foglalni az orvosomhoz. Fáj a "
+          "fejem és tegnap óta lázas vagyok. Meg tudná mondani, mikor van nyitva a rendelő és "
+          "mennyibe kerül a vizsgálat? Köszönöm szépen a segítséget a receptemmel. Szeretném "
+          "lemondani az időpontomat és beszélni a nővérrel a gyógyszereimről.",
+    "tr": "Merhaba, bugün nasılsınız? Gelecek hafta doktorumdan randevu almam gerekiyor. Başım "
+          "ağrıyor ve dünden beri ateşim var. Kliniğin ne zaman açık olduğunu ve muayenenin ne "
+          "kadar tuttuğunu söyleyebilir misiniz? Reçetem konusundaki yardımınız için çok teşekkür "
+          "ederim. Randevumu iptal etmek ve hemşireyle ilaçlarım hakkında konuşmak istiyorum.",
+    "id": "Halo, apa kabar hari ini? Saya perlu membuat janji dengan dokter saya minggu depan. "
+          "Kepala saya sakit dan saya demam sejak kemarin. Bisakah Anda memberi tahu saya kapan "
+          "klinik buka dan berapa biaya pemeriksaannya? Terima kasih banyak atas bantuan Anda "
+          "dengan resep saya. Saya ingin membatalkan janji dan berbicara dengan perawat tentang "
+          "obat saya.",
+    "vi": "Xin chào, hôm nay bạn khỏe không? Tôi cần đặt lịch hẹn với bác sĩ vào tuần tới. Tôi "
+          "bị đau đầu và bị sốt từ hôm qua. Bạn có thể cho tôi biết khi nào phòng khám mở cửa và "
+          "khám bệnh hết bao nhiêu tiền không? Cảm ơn bạn rất nhiều vì đã giúp tôi với đơn thuốc. "
+          "Tôi muốn hủy lịch hẹn và nói chuyện với y tá về thuốc của tôi.",
+    "tl": "Kumusta, kumusta ka ngayong araw? Kailangan kong magpatingin sa aking doktor sa "
+          "susunod na linggo. Masakit ang ulo ko at may lagnat ako mula kahapon. Maaari mo bang "
+          "sabihin sa akin kung kailan bukas ang klinika at magkano ang bayad sa konsulta? "
+          "Maraming salamat sa iyong tulong sa aking reseta. Gusto kong kanselahin ang aking "
+          "appointment at makausap ang nars tungkol sa aking gamot.",
+    "sw": "Habari, hujambo leo? Ninahitaji kupanga miadi na daktari wangu wiki ijayo. Ninaumwa "
+          "na kichwa na nimekuwa na homa tangu jana. Unaweza kuniambia kliniki inafunguliwa lini "
+          "na ziara inagharimu kiasi gani? Asante sana kwa msaada wako na dawa yangu. Ninataka "
+          "kughairi miadi yangu na kuzungumza na muuguzi kuhusu dawa zangu.",
+    "ca": "Hola, com estàs avui? Necessito demanar hora amb el meu metge la setmana que ve. Em fa "
+          "mal el cap i tinc febre des d'ahir. Em pot dir quan està oberta la clínica i quant "
+          "costa la visita? Moltes gràcies per la vostra ajuda amb la meva recepta. Vull anul·lar "
+          "la meva cita i parlar amb la infermera sobre els meus medicaments.",
+    "hr": "Bok, kako si danas? Trebam naručiti pregled kod svog liječnika sljedeći tjedan. Boli "
+          "me glava i imam temperaturu od jučer. Možete li mi reći kada je ambulanta otvorena i "
+          "koliko košta pregled? Hvala vam puno na pomoći s mojim receptom. Želim otkazati svoj "
+          "termin i razgovarati s medicinskom sestrom o svojim lijekovima.",
+    "ru": "Привет, как дела сегодня? Мне нужно записаться к врачу на следующей неделе. У меня "
+          "болит голова и со вчерашнего дня температура. Скажите, пожалуйста, когда работает "
+          "клиника и сколько стоит приём? Большое спасибо за помощь с моим рецептом. Я хочу "
+          "отменить запись и поговорить с медсестрой о моих лекарствах.",
+    "uk": "Привіт, як справи сьогодні? Мені потрібно записатися до лікаря наступного тижня. У "
+          "мене болить голова і з учорашнього дня температура. Скажіть, будь ласка, коли працює "
+          "клініка і скільки коштує прийом? Щиро дякую за допомогу з моїм рецептом. Я хочу "
+          "скасувати запис і поговорити з медсестрою про мої ліки.",
+    "bg": "Здравейте, как сте днес? Трябва да си запиша час при моя лекар следващата седмица. "
+          "Боли ме главата и имам температура от вчера. Можете ли да ми кажете кога е отворена "
+          "клиниката и колко струва прегледът? Много благодаря за помощта с моята рецепта. Искам "
+          "да отменя часа си и да говоря със сестрата за моите лекарства.",
+}
+
+# Scripts, as (first code point, last code point, script) ranges
+LATIN, CYRILLIC, OTHER = "latin", "cyrillic", "other"
+SCRIPT_RANGES: List[Tuple[int, int, str]] = [
+    (0x0041, 0x005A, LATIN), (0x0061, 0x007A, LATIN), (0x00C0, 0x024F, LATIN),
+    (0x0370, 0x03FF, "greek"), (0x0400, 0x04FF, CYRILLIC), (0x0590, 0x05FF, "hebrew"),
+    (0x0600, 0x06FF, "arabic"), (0x0750, 0x077F, "arabic"), (0x0900, 0x097F, "devanagari"),
+    (0x0980, 0x09FF, "bengali"), (0x0A00, 0x0A7F, "gurmukhi"), (0x0A80, 0x0AFF, "gujarati"),
+    (0x0B80, 0x0BFF, "tamil"), (0x0C00, 0x0C7F, "telugu"), (0x0C80, 0x0CFF, "kannada"),
+    (0x0D00, 0x0D7F, "malayalam"), (0x0E00, 0x0E7F, "thai"), (0x1100, 0x11FF, "hangul"),
+    (0x1E00, 0x1EFF, LATIN), (0x3040, 0x30FF, "kana"), (0x3130, 0x318F, "hangul"),
+    (0x3400, 0x4DBF, "han"), (0x4E00, 0x9FFF, "han"), (0xAC00, 0xD7AF, "hangul"),
+    (0xF900, 0xFAFF, "han"), (0xFB50, 0xFDFF, "arabic"), (0xFE70, 0xFEFF, "arabic"),
+]
+
+# Language of each script that is not scored with n-gram profiles
+SCRIPT_LANGUAGES = {
+    "greek": "el", "hebrew": "he", "arabic": "ar", "devanagari": "hi", "bengali": "bn",
+    "gurmukhi": "pa", "gujarati": "gu", "tamil": "ta", "telugu": "te", "kannada": "kn",
+    "malayalam": "ml", "thai": "th", "hangul": "ko", "kana": "ja", "han": "zh-cn",
+}
+
+# Letters that tell Persian and Urdu apart from Arabic
+_PERSIAN_LETTERS = [ord(c) for c in "پچژگ"]
+_URDU_LETTERS = [ord(c) for c in "ٹڈڑںے"]
+
+NGRAM_ORDERS = (1, 2, 3)
+HASH_BUCKETS = 1 << 15
+_HASH_MODULUS = 2_147_483_647
+_HASH_MULTIPLIER = 1_000_003
+MAX_DETECTION_CHARS = 1000
+# Only short texts are cached; long ones rarely repeat
+MAX_CACHED_TEXT_CHARS = 200
+
+_NON_LETTER = re.compile(r"[^\w\x00]+|[\d_]+")
+_SPACES = re.compile(r" {2,}")
+
+DETECTION_SYSTEM_PROMPT = """You identify the language of short texts.
+Return ONLY a JSON object of the form
+{"languages": [{"index": 0, "code": "es", "confidence": 0.95}]}
+with one entry per input text. "code" is the ISO 639-1 code in lowercase
+("zh-cn" or "zh-tw" for Chinese, "unknown" if the text has no language)."""
+
+TRANSLATION_SYSTEM_PROMPT = """You are a professional medical translator.
+Translate each input text into {target}, keeping names, dates and numbers unchanged.
+Return ONLY a JSON object of the form
+{{"translations": [{{"index": 0, "text": "..."}}]}}
+with one entry per input text."""
+
+
+@dataclass
+class LanguageDetection:
+    """Detected language of one text"""
+    code: str
+    name: str
+    confidence: float
+    method: str  # script, ngram, llm or none
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {"code": self.code, "name": self.name, "confidence": self.confidence, "method": self.method}
+
+
+def _detection(code: str, confidence: float, method: str) -> LanguageDetection:
+    return LanguageDetection(code, LANGUAGE_NAMES.get(code, code.upper()), round(float(confidence), 3), method)
+
+
+def _encode(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Normalize a batch into one array of code points: lowercase letters, single
+    spaces around words and a 0 separator between texts. Also returns the index of
+    the text each position belongs to.
+    """
+    joined = "\x00".join(text[:MAX_DETECTION_CHARS].replace("\x00", " ") for text in texts).lower()
+    joined = _NON_LETTER.sub(" ", joined)
+    joined = _SPACES.sub(" ", " " + joined.replace("\x00", " \x00 ") + " ")
+    codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    rows = np.cumsum(codes == 0)
+    return codes, rows
+
+
+def _ngram_hashes(codes: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct hashed character n-grams of every order in each text, with the text index"""
+    hashes, owners = [], []
+    length = len(codes)
+    for n in NGRAM_ORDERS:
+        if length < n:
+            continue
+        span = length - n + 1
+        h = codes[:span].copy()
+        valid = codes[:span] != 0
+        for k in range(1, n):
+            h = (h * _HASH_MULTIPLIER + codes[k:span + k]) % _HASH_MODULUS
+            valid &= codes[k:span + k] != 0
+        if n == 1:
+            valid &= codes[:span] != 32
+        hashes.append((h[valid] * 31 + n) % HASH_BUCKETS)
+        owners.append(rows[:span][valid])
+    if not hashes:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    # Each n-gram counts once per text, so repeated words and names do not inflate confidence
+    distinct = np.unique(np.concatenate(owners) * HASH_BUCKETS + np.concatenate(hashes))
+    return distinct % HASH_BUCKETS, distinct // HASH_BUCKETS
+
+
+class LanguageDetector:
+    """Vectorized script and character n-gram language detector"""
+    
+    def __init__(self, profile_texts: Dict[str, str] = PROFILE_TEXTS, smoothing: float = 0.5):
+        self.languages = list(profile_texts)
+        self._language_scripts = np.array([
+            CYRILLIC if any(0x0400 <= ord(c) <= 0x04FF for c in text) else LATIN
+            for text in profile_texts.values()
+        ])
+        
+        # Log-probability of each hashed n-gram per language
+        self._log_probs = np.empty((len(self.languages), HASH_BUCKETS), dtype=np.float32)
+        for i, text in enumerate(profile_texts.values()):
+            hashes, _ = _ngram_hashes(*_encode([text]))
+            counts = np.bincount(hashes, minlength=HASH_BUCKETS).astype(np.float64)
+            self._log_probs[i] = np.log((counts + smoothing) / (counts.sum() + smoothing * HASH_BUCKETS))
+        
+        starts = sorted(SCRIPT_RANGES)
+        self._range_starts = np.array([start for start, _, _ in starts])
+        self._range_ends = np.array([end for _, end, _ in starts])
+        self.scripts = [LATIN, CYRILLIC] + sorted({s for _, _, s in SCRIPT_RANGES} - {LATIN, CYRILLIC}) + [OTHER]
+        script_index = {script: i for i, script in enumerate(self.scripts)}
+        self._range_scripts = np.array([script_index[script] for _, _, script in starts])
+        self._other = script_index[OTHER]
+    
+    def _script_counts(self, codes: np.ndarray, rows: np.ndarray, count: int) -> np.ndarray:
+        """Letters per script for each text (texts x scripts)"""
+        index = np.searchsorted(self._range_starts, codes, side="right") - 1
+        inside = (index >= 0) & (codes <= self._range_ends[np.maximum(index, 0)])
+        scripts = np.where(inside, self._range_scripts[np.maximum(index, 0)], self._other)
+        letters = (codes > 32) & (scripts != self._other)
+        flat = np.bincount(rows[letters] * len(self.scripts) + scripts[letters], minlength=count * len(self.scripts))
+        return flat.reshape(count, len(self.scripts))
+    
+    def _marker_counts(self, codes: np.ndarray, rows: np.ndarray, markers: List[int], count: int) -> np.ndarray:
+        found = np.isin(codes, markers)
+        return np.bincount(rows[found], minlength=count)
+    
+    def detect(self, texts: Sequence[str]) -> List[LanguageDetection]:
+        """Detect the language of every text in one pass"""
+        count = len(texts)
+        if count == 0:
+            return []
+        codes, rows = _encode(texts)
+        script_counts = self._script_counts(codes, rows, count)
+        letters = script_counts.sum(axis=1)
+        dominant = script_counts.argmax(axis=1)
+        share = script_counts.max(axis=1) / np.maximum(letters, 1)
+        
+        # Naive Bayes over hashed n-grams; each character takes part in one n-gram per
+        # order, so the summed log-likelihood is divided by the number of orders
+        hashes, owners = _ngram_hashes(codes, rows)
+        scores = np.zeros((count, len(self.languages)))
+        gathered = self._log_probs[:, hashes]
+        for i in range(len(self.languages)):
+            scores[:, i] = np.bincount(owners, weights=gathered[i], minlength=count)
+        scores /= len(NGRAM_ORDERS)
+        
+        cyrillic = self.scripts.index(CYRILLIC)
+        in_script = np.where(
+            (dominant == cyrillic)[:, None],
+            self._language_scripts[None, :] == CYRILLIC,
+            self._language_scripts[None, :] == LATIN
+        )
+        scores = np.where(in_script, scores, -np.inf)
+        scores -= scores.max(axis=1, keepdims=True)
+        posterior = np.exp(scores)
+        posterior /= posterior.sum(axis=1, keepdims=True)
+        best = posterior.argmax(axis=1)
+        best_probability = posterior[np.arange(count), best]
+        
+        persian = self._marker_counts(codes, rows, _PERSIAN_LETTERS, count)
+        urdu = self._marker_counts(codes, rows, _URDU_LETTERS, count)
+        kana = script_counts[:, self.scripts.index("kana")]
+        han = self.scripts.index("han")
+        
+        results = []
+        for i in range(count):
+            script = self.scripts[dominant[i]]
+            if letters[i] == 0:
+                results.append(_detection("unknown", 0.0, "none"))
+            elif script in (LATIN, CYRILLIC):
+                results.append(_detection(self.languages[best[i]], best_probability[i] * share[i], "ngram"))
+            else:
+                code = SCRIPT_LANGUAGES[script]
+                if script == "han" and kana[i]:
+                    code = "ja"
+                if code == "ja":
+                    share[i] = (kana[i] + script_counts[i, han]) / letters[i]
+                elif script == "arabic":
+                    code = "ur" if urdu[i] else "fa" if persian[i] else "ar"
+                results.append(_detection(code, share[i], "script"))
+        return results
+
+
+default_detector = LanguageDetector()
+
+
+class DetectionHistory:
+    """
+    The most recent detections in a fixed-size ring buffer, plus lifetime totals and
+    counters for the buffered window, all updated as detections are added so that
+    reading statistics never walks the history.
+    """
+    
+    def __init__(self, capacity: int = settings.MULTILINGUAL_HISTORY_SIZE):
+        self.capacity = max(0, capacity)
+        self._entries: Deque[Dict[str, Any]] = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+        self.total = 0
+        self.successful = 0
+        self.mean_confidence = 0.0
+        self.by_method: Dict[str, int] = {}
+        self.by_language: Dict[str, int] = {}
+        self._window_successful = 0
+        self._window_confidence = 0.0
+        self._window_languages: Dict[str, int] = {}
+    
+    def add(
+        self, texts: Sequence[str], detections: Sequence[LanguageDetection], cached: Collection[int] = ()
+    ) -> None:
+        """Record a batch; detections at the `cached` indices are counted as cache hits"""
+        timestamp = datetime.now().isoformat()
+        with self._lock:
+            for i, (text, detection) in enumerate(zip(texts, detections)):
+                self.total += 1
+                method = "cache" if i in cached else detection.method
+                self.by_method[method] = self.by_method.get(method, 0) + 1
+                if detection.method != "none":
+                    self.successful += 1
+                    self.mean_confidence += (detection.confidence - self.mean_confidence) / self.successful
+                    self.by_language[detection.name] = self.by_language.get(detection.name, 0) + 1
+                if not self.capacity:
+                    continue
+                if len(self._entries) == self.capacity:
+                    self._count_window(self._entries[0]["detection"], -1)
+                self._entries.append({
+                    "text": text[:200] + "..." if len(text) > 200 else text,
+                    "detection": detection,
+                    "timestamp": timestamp
+                })
+                self._count_window(detection, 1)
+    
+    def _count_window(self, detection: LanguageDetection, sign: int) -> None:
+        if detection.method == "none":
+            return
+        self._window_successful += sign
+        self._window_confidence += sign * detection.confidence
+        count = self._window_languages.get(detection.name, 0) + sign
+        if count:
+            self._window_languages[detection.name] = count
+        else:
+            del self._window_languages[detection.name]
+    
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Buffered detections, oldest first (the last `limit` when given)"""
+        with self._lock:
+            entries = list(self._entries)
+        if limit is not None:
+            entries = entries[-limit:] if limit > 0 else []
+        return [{**entry, "detection": entry["detection"].as_dict()} for entry in entries]
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            window_mean = self._window_confidence / self._window_successful if self._window_successful else 0.0
+            return {
+                "total_detections": self.total,
+                "successful_detections": self.successful,
+                "llm_detections": self.by_method.get("llm", 0),
+                "cached_detections": self.by_method.get("cache", 0),
+                "by_method": dict(self.by_method),
+                "languages_detected": len(self.by_language),
+                "language_breakdown": dict(self.by_language),
+                "average_confidence": round(self.mean_confidence, 3),
+                "recent": {
+                    "size": len(self._entries),
+                    "capacity": self.capacity,
+                    "successful_detections": self._window_successful,
+                    "language_breakdown": dict(self._window_languages),
+                    "average_confidence": round(window_mean, 3)
+                }
+            }
+
+
+def _batches(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[i:i + size] for i in range(0, len(items), max(1, size))]
+
+
+class MultilingualAgent:
+    """Detects and translates patient text; LLM calls are batched and only made when needed"""
+    
+    LANGUAGE_NAMES = LANGUAGE_NAMES
+    
+    def __init__(
+        self,
+        llm_client: Optional[AsyncOpenAI] = None,
+        model: str = "gpt-4o-mini",
+        confidence_threshold: float = settings.MULTILINGUAL_CONFIDENCE_THRESHOLD,
+        llm_batch_size: int = settings.MULTILINGUAL_LLM_BATCH_SIZE,
+        detector: Optional[LanguageDetector] = None,
+        history_size: int = settings.MULTILINGUAL_HISTORY_SIZE,
+        prior_min_chars: int = settings.MULTILINGUAL_PRIOR_MIN_CHARS
+    ):
+        self.llm_client = llm_client
+        self.model = model
+        self.confidence_threshold = confidence_threshold
+        self.llm_batch_size = llm_batch_size
+        self.detector = detector or default_detector
+        self.history = DetectionHistory(history_size)
+        self.prior_min_chars = prior_min_chars
+        # Normalized text -> detection, and patient id -> language code
+        self.cache = TTLCache(settings.MULTILINGUAL_CACHE_MAX_ENTRIES, settings.MULTILINGUAL_CACHE_TTL_SECONDS)
+        self.priors = TTLCache(settings.MULTILINGUAL_PRIOR_MAX_PATIENTS, settings.MULTILINGUAL_CACHE_TTL_SECONDS)
+    
+    def detect_statistical(self, texts: Sequence[str]) -> List[LanguageDetection]:
+        """Script and n-gram detection only; never calls the LLM"""
+        return self.detector.detect(texts)
+    
+    async def detect_batch(
+        self,
+        texts: Sequence[str],
+        use_llm: bool = True,
+        patient_ids: Optional[Sequence[Optional[int]]] = None
+    ) -> List[LanguageDetection]:
+        """
+        Detect the language of every text. Short texts seen before are answered from
+        the cache. A long text from a patient whose language is known keeps that
+        language unless the statistical detector is confident of another one. The
+        remaining texts below the confidence threshold are sent to the LLM together,
+        one prompt per llm_batch_size texts.
+        """
+        results: List[Optional[LanguageDetection]] = [None] * len(texts)
+        keys = [normalize_question(text) if len(text) <= MAX_CACHED_TEXT_CHARS else None for text in texts]
+        misses = []
+        for i, key in enumerate(keys):
+            cached = self.cache.get(key) if key else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                misses.append(i)
+        
+        uncertain = []
+        # Repeats of an uncertain text within the batch share its LLM answer
+        first_by_text: Dict[str, int] = {}
+        repeats: Dict[int, List[int]] = {}
+        for i, detection in zip(misses, self.detect_statistical([texts[i] for i in misses])):
+            results[i] = detection
+            if detection.method == "none" or detection.confidence >= self.confidence_threshold:
+                continue
+            prior = self._prior(patient_ids[i] if patient_ids else None, texts[i])
+            if prior is not None:
+                # Reported at the threshold: trusted over the LLM, not over a confident detection
+                results[i] = _detection(prior, self.confidence_threshold, "prior")
+                continue
+            first = first_by_text.setdefault(keys[i] or texts[i], i)
+            if first == i:
+                uncertain.append(i)
+            else:
+                repeats.setdefault(first, []).append(i)
+        
+        if uncertain and use_llm and settings.MULTILINGUAL_LLM_FALLBACK and self.llm_client:
+            batches = _batches(uncertain, self.llm_batch_size)
+            answers = await asyncio.gather(*(self._detect_llm([texts[i] for i in batch]) for batch in batches))
+            for batch, detections in zip(batches, answers):
+                for i, detection in zip(batch, detections):
+                    if detection is not None:
+                        results[i] = detection
+            for first, others in repeats.items():
+                for i in others:
+                    results[i] = results[first]
+        
+        for i in misses:
+            result = results[i]
+            # Prior-based answers depend on the patient; uncertain ones (LLM skipped or
+            # failed) are left uncached so the next lookup can still ask the LLM
+            confident = result.method == "llm" or (
+                result.method != "prior" and result.confidence >= self.confidence_threshold
+            )
+            if not confident:
+                continue
+            if keys[i]:
+                self.cache.set(keys[i], result)
+            if patient_ids and patient_ids[i] is not None:
+                self.priors.set(patient_ids[i], result.code)
+        
+        self.history.add(texts, results, cached=set(range(len(texts))).difference(misses))
+        return results
+    
+    def _prior(self, patient_id: Optional[int], text: str) -> Optional[str]:
+        if patient_id is None or len(text) < self.prior_min_chars:
+            return None
+        return self.priors.get(patient_id)
+    
+    def seed_prior(self, patient_id: int, language: Optional[str]) -> None:
+        """Use the patient's preferred language until their messages are detected"""
+        if language and patient_id not in self.priors:
+            self.priors.set(patient_id, language.lower())
+    
+    def forget_patient(self, patient_id: int) -> None:
+        """Drop the patient's language prior, e.g. after their preferred language changed"""
+        self.priors.pop(patient_id)
+    
+    async def detect_for_patient(
+        self, text: str, patient_id: int, preferred_language: Optional[str] = None, use_llm: bool = True
+    ) -> LanguageDetection:
+        """Detect the language of a patient's text, using their known language as a prior"""
+        self.seed_prior(patient_id, preferred_language)
+        return (await self.detect_batch([text], use_llm=use_llm, patient_ids=[patient_id]))[0]
+    
+    async def detect_language_hybrid(self, text: str, use_llm: bool = True) -> LanguageDetection:
+        """Statistical detection, confirmed by the LLM when it is not confident"""
+        return (await self.detect_batch([text], use_llm=use_llm))[0]
+    
+    async def _detect_llm(self, texts: List[str]) -> List[Optional[LanguageDetection]]:
+        """One LLM call for a batch of texts; None for texts it did not answer"""
+        payload = [{"index": i, "text": text[:300]} for i, text in enumerate(texts)]
+        try:
+            response = await chat_completion(
+                self.llm_client,
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": DETECTION_SYSTEM_PROMPT},
+                    {"role": "user", "content": json.dumps(payload, ensure_ascii=False)}
+                ],
+                temperature=0,
+                response_format={"type": "json_object"}
+            )
+            answers = json.loads(response.choices[0].message.content).get("languages", [])
+        except Exception:
+            logger.warning("LLM language detection failed for %d texts", len(texts), exc_info=True)
+            return [None] * len(texts)
+        
+        results: List[Optional[LanguageDetection]] = [None] * len(texts)
+        for answer in answers:
+            try:
+                index = int(answer["index"])
+                code = str(answer["code"]).strip().lower()
+                confidence = min(1.0, max(0.0, float(answer.get("confidence", 0.9))))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if 0 <= index < len(texts) and code:
+                results[index] = _detection(code, confidence, "llm")
+        return results
+    
+    async def translate_batch(self, texts: Sequence[str], target_language: str = "English") -> List[str]:
+        """
+        Translate texts into the target language. Texts already in that language are
+        returned unchanged; the rest are translated in one prompt per llm_batch_size texts.
+        Texts that could not be translated are returned as they are.
+        """
+        translations = list(texts)
+        if not self.llm_client:
+            return translations
+        detections = await self.detect_batch(texts)
+        target = target_language.lower()
+        pending = [
+            i for i, detection in enumerate(detections)
+            if detection.method != "none" and target not in (detection.code, detection.name.lower())
+        ]
+        batches = _batches(pending, self.llm_batch_size)
+        answers = await asyncio.gather(
+            *(self._translate_llm([texts[i] for i in batch], target_language) for batch in batches)
+        )
+        for batch, translated in zip(batches, answers):
+            for i, text in zip(batch, translated):
+                if text is not None:
+                    translations[i] = text
+        return translations
+    
+    async def translate_suggestion(self, text: str, target_language: str = "English") -> str:
+        """Translate one text into the target language"""
+        return (await self.translate_batch([text], target_language))[0]
+    
+    async def _translate_llm(self, texts: List[str], target_language: str) -> List[Optional[str]]:
+        payload = [{"index": i, "text": text} for i, text in enumerate(texts)]
+        try:
+            response = await chat_completion(
+                self.llm_client,
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": TRANSLATION_SYSTEM_PROMPT.format(target=target_language)},
+                    {"role": "user", "content": json.dumps(payload, ensure_ascii=False)}
+                ],
+                temperature=0.3,
+                response_format={"type": "json_object"}
+            )
+            answers = json.loads(response.choices[0].message.content).get("translations", [])
+        except Exception:
+            logger.warning("LLM translation failed for %d texts", len(texts), exc_info=True)
+            return [None] * len(texts)
+        
+        results: List[Optional[str]] = [None] * len(texts)
+        for answer in answers:
+            try:
+                index = int(answer["index"])
+                translated = str(answer["text"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if 0 <= index < len(texts):
+                results[index] = translated
+        return results
+    
+    @property
+    def detection_history(self) -> List[Dict[str, Any]]:
+        """The most recent detections (at most history_size)"""
+        return self.history.recent()
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Lifetime detection counts per language and method, the recent window and cache hit rates"""
+        return {
+            **self.history.stats(),
+            "cache": self.cache.stats(),
+            "priors": {"patients": len(self.priors), "used": self.history.by_method.get("prior", 0)}
+        }
+
+
+multilingual_agent = MultilingualAgent(get_openai_client())
@@ -1,15 +1,16 @@
 """Authentication endpoints"""
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
 from app.core.config import settings
 from app.core.security import (
-    verify_password,
-    get_password_hash,
     create_access_token,
-    get_current_user
+    get_current_patient,
+    login_metrics,
+    password_hasher
 )
 from app.db.session import get_db
 from app.models.patient import Patient
@@ -20,20 +21,24 @@ router = APIRouter()
 
 
 @router.post("/register", response_model=PatientResponse, status_code=status.HTTP_201_CREATED)
-async def register(patient: PatientCreate, db: Session = Depends(get_db)):
+async def register(patient: PatientCreate, db: AsyncSession = Depends(get_db)):
     """Register a new patient"""
     # Check if patient already exists
-    existing_patient = db.query(Patient).filter(Patient.email == patient.email).first()
+    existing_patient = await db.scalar(select(Patient).where(Patient.email == patient.email))
     if existing_patient:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
+    # Return the connection to the pool while bcrypt runs
+    await db.close()
+    hashed_password = await password_hasher.hash(patient.password)
+    
     # Create new patient
     db_patient = Patient(
         email=patient.email,
-        hashed_password=get_password_hash(patient.password),
+        hashed_password=hashed_password,
         first_name=patient.first_name,
         last_name=patient.last_name,
         date_of_birth=patient.date_of_birth,
@@ -51,8 +56,8 @@ async def register(patient: PatientCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_patient)
-    db.commit()
-    db.refresh(db_patient)
+    await db.commit()
+    await db.refresh(db_patient)
     
     return db_patient
 
@@ -60,12 +65,15 @@ async def register(patient: PatientCreate, db: Session = Depends(get_db)):
 @router.post("/login", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Login and get access token"""
     # Authenticate patient
-    patient = db.query(Patient).filter(Patient.email == form_data.username).first()
-    if not patient or not verify_password(form_data.password, patient.hashed_password):
+    patient = await db.scalar(select(Patient).where(Patient.email == form_data.username))
+    # Return the connection to the pool while bcrypt runs; loaded attributes stay readable
+    await db.close()
+    if not patient or not await password_hasher.verify(form_data.password, patient.hashed_password):
+        login_metrics.record(success=False)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -79,21 +87,13 @@ async def login(
         expires_delta=access_token_expires
     )
     
+    login_metrics.record(success=True)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.get("/me", response_model=PatientResponse)
-async def get_current_user_info(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
+async def get_current_user_info(current_patient: PatientResponse = Depends(get_current_patient)):
     """Get current authenticated user information"""
-    patient = db.query(Patient).filter(Patient.id == int(current_user["id"])).first()
-    if not patient:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Patient not found"
-        )
-    return patient
+    return current_patient
 
 
@@ -1,18 +1,33 @@
 from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from openai import OpenAI
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import logging
+import time
 import uuid
 import json
 
 from app.core.config import settings
+from app.core.llm import get_openai_client, chat_completion, stream_chat_completion
+from app.core.llm_queue import set_llm_lane
+from app.core.metrics import metrics
+from app.core.tracing import current_trace_id, stage
 from app.core.security import get_current_user
 from app.schemas.chat import ChatMessageRequest, ChatMessageResponse
-from app.db.session import get_db
+from app.db.session import get_db, AsyncSessionLocal
 from app.models.chat_conversation import ChatConversation
 from app.models.chat_message import ChatMessage
 from app.models.appointment import Appointment
 from app.agents.appointment_agent import AppointmentAgent
+from app.agents.intent_router import is_urgent
+from app.services.chat_writer import chat_writer
+from app.services.conversation_context import ConversationContextManager
+from app.services.history_cache import history_cache
+from app.services.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -39,18 +54,152 @@ When users want to schedule appointments:
 Remember: You are an assistant that provides information and guidance, but not medical diagnoses or treatment prescriptions."""
 
 # Initialize OpenAI client and Appointment Agent
-openai_client = None
-appointment_agent = None
-if settings.OPENAI_API_KEY:
-    openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-    appointment_agent = AppointmentAgent(openai_client)
+openai_client = get_openai_client()
+appointment_agent = AppointmentAgent(openai_client) if openai_client else None
+context_manager = ConversationContextManager(openai_client) if openai_client else None
+
+
+async def _get_or_create_conversation(
+    db: AsyncSession,
+    conversation_id: Optional[str],
+    patient_id: int
+) -> Optional[ChatConversation]:
+    """
+    Look up the patient's conversation, or start a new one when no ID is given.
+    A new conversation is not added to the session here; _save_turn inserts it
+    together with its first messages.
+    """
+    if conversation_id:
+        return await db.scalar(select(ChatConversation).where(
+            ChatConversation.conversation_id == conversation_id,
+            ChatConversation.patient_id == patient_id
+        ))
+    
+    return ChatConversation(
+        conversation_id=str(uuid.uuid4()),
+        patient_id=patient_id,
+        message_count=0,
+        summarized_message_count=0
+    )
+
+
+async def _delete_conversation(db: AsyncSession, conversation_id: str, patient_id: int) -> bool:
+    """Delete a patient's conversation and its messages. Returns False if not found."""
+    conversation = await db.scalar(select(ChatConversation).where(
+        ChatConversation.conversation_id == conversation_id,
+        ChatConversation.patient_id == patient_id
+    ))
+    if not conversation:
+        return False
+    
+    await db.execute(
+        delete(ChatMessage).where(ChatMessage.conversation_id == conversation_id),
+        execution_options={"synchronize_session": False}
+    )
+    await db.delete(conversation)
+    await db.commit()
+    chat_writer.discard(conversation_id)
+    return True
+
+
+def _general_messages(
+    conversation_history: List[Dict[str, str]],
+    user_message: str
+) -> List[Dict[str, str]]:
+    """Build the prompt for the general medical assistant"""
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    messages.extend(conversation_history)
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+def _llm_lane(user_message: str) -> str:
+    """Queue lane for this turn's LLM calls; possible emergencies go first"""
+    if is_urgent(user_message):
+        return "urgent"
+    return "interactive"
+
+
+def _general_lane(lane: str, cacheable: bool) -> str:
+    """Standalone FAQs wait behind conversational and urgent turns"""
+    return "faq" if cacheable and lane == "interactive" else lane
+
+
+def _sse_event(event: str, data: Dict) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _save_turn(
+    db: AsyncSession,
+    conversation: ChatConversation,
+    user_message: str,
+    ai_response: str
+) -> str:
+    """
+    Store the user message and assistant response. Returns the assistant message ID.
+    This is the turn's only commit: it also writes a new conversation, a refreshed
+    summary and any appointment change the agent flushed earlier in the turn.
+    """
+    conversation_id = conversation.conversation_id
+    now = datetime.utcnow()
+    # Generate message IDs for tracking
+    user_message_id = str(uuid.uuid4())
+    assistant_message_id = str(uuid.uuid4())
+    messages = [
+        {
+            "conversation_id": conversation_id,
+            "role": "user",
+            "content": user_message,
+            "message_id": user_message_id,
+            "created_at": now
+        },
+        {
+            "conversation_id": conversation_id,
+            "role": "assistant",
+            "content": ai_response,
+            "message_id": assistant_message_id,
+            "created_at": now
+        }
+    ]
+    
+    is_new = conversation.id is None
+    if is_new:
+        conversation.message_count = 0 if chat_writer.enabled else len(messages)
+        db.add(conversation)
+        # The models have no relationships, so flush the parent row before its messages
+        await db.flush()
+    
+    if chat_writer.enabled:
+        # Messages and the message count are written by the next batch
+        with stage("chat.commit"):
+            await db.commit()
+        await chat_writer.enqueue(messages)
+        return assistant_message_id
+    
+    db.add_all([ChatMessage(**message) for message in messages])
+    if not is_new:
+        # Update conversation timestamp and message count
+        await db.execute(
+            update(ChatConversation).where(
+                ChatConversation.conversation_id == conversation_id
+            ).values({
+                ChatConversation.updated_at: now,
+                ChatConversation.message_count: ChatConversation.message_count + len(messages)
+            }),
+            execution_options={"synchronize_session": False}
+        )
+    
+    with stage("chat.commit"):
+        await db.commit()
+    return assistant_message_id
 
 
 @router.post("/", response_model=ChatMessageResponse, status_code=status.HTTP_200_OK)
 async def chat(
     request: ChatMessageRequest,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Process user message and return AI assistant response with conversation history.
@@ -76,109 +225,78 @@ async def chat(
             detail="Message cannot be empty"
         )
     
+    started = time.perf_counter()
+    lane = _llm_lane(user_message)
+    set_llm_lane(lane)
+    
     try:
         patient_id = int(current_user["id"])
         
         # Get or create conversation
-        conversation = None
-        if request.conversation_id:
-            # Try to find existing conversation
-            conversation = db.query(ChatConversation).filter(
-                ChatConversation.conversation_id == request.conversation_id,
-                ChatConversation.patient_id == patient_id
-            ).first()
-            
-            if not conversation:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Conversation not found or access denied"
-                )
-        else:
-            # Create new conversation
-            conversation = ChatConversation(
-                conversation_id=str(uuid.uuid4()),
-                patient_id=patient_id
+        conversation = await _get_or_create_conversation(db, request.conversation_id, patient_id)
+        if not conversation:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Conversation not found or access denied"
             )
-            db.add(conversation)
-            db.commit()
-            db.refresh(conversation)
-        
-        # Retrieve conversation history (ordered by creation time)
-        history_messages = db.query(ChatMessage).filter(
-            ChatMessage.conversation_id == conversation.conversation_id
-        ).order_by(ChatMessage.created_at.asc()).all()
         
-        # Build conversation history for agent
-        conversation_history = []
-        for msg in history_messages:
-            conversation_history.append({
-                "role": msg.role,
-                "content": msg.content
-            })
+        # Retrieve bounded conversation history (rolling summary + recent turns)
+        with stage("chat.history"):
+            conversation_history = await context_manager.build_history(db, conversation)
         
         # Check if this is an appointment-related request
-        appointment_intent = appointment_agent.detect_appointment_intent(user_message) if appointment_agent else None
+        with stage("chat.intent"):
+            appointment_intent = appointment_agent.router.classify(user_message) if appointment_agent else None
         
         ai_response = ""
         appointment_data = None
         
         if appointment_intent:
             # Use appointment agent to handle the request
-            ai_response, appointment_data = await appointment_agent.process_appointment_request(
-                message=user_message,
-                conversation_history=conversation_history,
-                patient_id=patient_id,
-                db=db,
-                intent=appointment_intent
-            )
+            route = "appointment"
+            with stage("chat.appointment_agent"):
+                ai_response, appointment_data = await appointment_agent.process_appointment_request(
+                    message=user_message,
+                    conversation_history=conversation_history,
+                    patient_id=patient_id,
+                    db=db,
+                    intent=appointment_intent
+                )
         else:
-            # Use general medical assistant
-            messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-            messages.extend(conversation_history)
-            messages.append({"role": "user", "content": user_message})
-            
-            # Call OpenAI API
-            response = openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            ai_response = response.choices[0].message.content.strip()
-        
-        # Generate message IDs for tracking
-        user_message_id = str(uuid.uuid4())
-        assistant_message_id = str(uuid.uuid4())
-        
-        # Store user message in database
-        db_user_message = ChatMessage(
-            conversation_id=conversation.conversation_id,
-            role="user",
-            content=user_message,
-            message_id=user_message_id
-        )
-        db.add(db_user_message)
-        
-        # Store assistant response in database
-        db_assistant_message = ChatMessage(
-            conversation_id=conversation.conversation_id,
-            role="assistant",
-            content=ai_response,
-            message_id=assistant_message_id
-        )
-        db.add(db_assistant_message)
+            # Use general medical assistant; standalone FAQs may be served from cache
+            cacheable = response_cache.is_cacheable(user_message, conversation_history)
+            cached_response = response_cache.get(user_message) if cacheable else None
+            if cached_response is not None:
+                route = "cached"
+                ai_response = cached_response
+            else:
+                route = "general"
+                with stage("chat.llm"):
+                    response = await chat_completion(
+                        openai_client,
+                        model="gpt-4o-mini",
+                        messages=_general_messages(conversation_history, user_message),
+                        temperature=0.7,
+                        max_tokens=1000,
+                        lane=_general_lane(lane, cacheable)
+                    )
+                
+                ai_response = response.choices[0].message.content.strip()
+                if cacheable:
+                    response_cache.put(user_message, ai_response)
         
-        # Update conversation timestamp
-        conversation.updated_at = datetime.utcnow()
-        
-        db.commit()
+        with stage("chat.persist"):
+            assistant_message_id = await _save_turn(db, conversation, user_message, ai_response)
+        await context_manager.record_turn(conversation.conversation_id, user_message, ai_response)
+        metrics.count_chat("chat", route)
+        metrics.observe_stage("chat.total", time.perf_counter() - started)
         
         # Build response
         response_data = ChatMessageResponse(
             response=ai_response,
             message_id=assistant_message_id,
-            conversation_id=conversation.conversation_id
+            conversation_id=conversation.conversation_id,
+            trace_id=current_trace_id()
         )
         
         # Add appointment data if present
@@ -190,9 +308,157 @@ async def chat(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        logger.exception("Chat turn failed (trace %s)", current_trace_id())
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing message: {str(e)}"
         )
 
+
+
+@router.post("/stream", status_code=status.HTTP_200_OK)
+async def chat_stream(
+    request: ChatMessageRequest,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Streaming variant of the chat endpoint using server-sent events.
+    
+    Emits the following events:
+    - **start**: `{"conversation_id": ...}` as soon as the conversation is resolved
+    - **token**: `{"delta": ...}` for each chunk of the assistant response
+    - **done**: the full `ChatMessageResponse` (including `appointment_data`) once the
+      messages have been stored
+    - **error**: `{"detail": ...}` if processing fails mid-stream
+    """
+    # Check if OpenAI is configured
+    if not openai_client:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="OpenAI API is not configured. Please set OPENAI_API_KEY in environment variables."
+        )
+    
+    user_message = request.message.strip()
+    if not user_message:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Message cannot be empty"
+        )
+    
+    started = time.perf_counter()
+    patient_id = int(current_user["id"])
+    lane = _llm_lane(user_message)
+    set_llm_lane(lane)
+    
+    # Resolve the conversation before streaming so lookup errors are regular HTTP errors
+    conversation = await _get_or_create_conversation(db, request.conversation_id, patient_id)
+    if not conversation:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found or access denied"
+        )
+    conversation_id = conversation.conversation_id
+    with stage("chat.history"):
+        conversation_history = await context_manager.build_history(db, conversation)
+    with stage("chat.intent"):
+        appointment_intent = appointment_agent.router.classify(user_message) if appointment_agent else None
+    if db.dirty:
+        # A refreshed summary lives in the request session, which closes before streaming
+        await db.commit()
+    
+    async def event_stream():
+        # The request-scoped session is closed once this handler returns,
+        # so the stream uses its own session for the agent and persistence.
+        stream_db = AsyncSessionLocal()
+        try:
+            yield _sse_event("start", {"conversation_id": conversation_id})
+            
+            appointment_data = None
+            if appointment_intent:
+                route = "appointment"
+                with stage("chat.appointment_agent"):
+                    ai_response, appointment_data = await appointment_agent.process_appointment_request(
+                        message=user_message,
+                        conversation_history=conversation_history,
+                        patient_id=patient_id,
+                        db=stream_db,
+                        intent=appointment_intent
+                    )
+                yield _sse_event("token", {"delta": ai_response})
+            else:
+                cacheable = response_cache.is_cacheable(user_message, conversation_history)
+                cached_response = response_cache.get(user_message) if cacheable else None
+                if cached_response is not None:
+                    route = "cached"
+                    ai_response = cached_response
+                    yield _sse_event("token", {"delta": ai_response})
+                else:
+                    route = "general"
+                    chunks = []
+                    llm_started = time.perf_counter()
+                    async for delta in stream_chat_completion(
+                        openai_client,
+                        model="gpt-4o-mini",
+                        messages=_general_messages(conversation_history, user_message),
+                        temperature=0.7,
+                        max_tokens=1000,
+                        lane=_general_lane(lane, cacheable)
+                    ):
+                        if not chunks:
+                            metrics.observe_stage("chat.first_token", time.perf_counter() - started)
+                        chunks.append(delta)
+                        yield _sse_event("token", {"delta": delta})
+                    metrics.observe_stage("chat.llm", time.perf_counter() - llm_started)
+                    ai_response = "".join(chunks).strip()
+                    if cacheable:
+                        response_cache.put(user_message, ai_response)
+            
+            with stage("chat.persist"):
+                assistant_message_id = await _save_turn(
+                    stream_db, conversation, user_message, ai_response
+                )
+            await context_manager.record_turn(conversation_id, user_message, ai_response)
+            metrics.count_chat("stream", route)
+            metrics.observe_stage("chat.total", time.perf_counter() - started)
+            
+            response_data = ChatMessageResponse(
+                response=ai_response,
+                message_id=assistant_message_id,
+                conversation_id=conversation_id,
+                appointment_data=appointment_data or None,
+                trace_id=current_trace_id()
+            )
+            yield _sse_event("done", response_data.model_dump(mode="json"))
+        
+        except Exception as e:
+            logger.exception("Streamed chat turn failed (trace %s)", current_trace_id())
+            await stream_db.rollback()
+            yield _sse_event("error", {"detail": f"Error processing message: {str(e)}", "trace_id": current_trace_id()})
+        finally:
+            await stream_db.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.delete("/{conversation_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_conversation(
+    conversation_id: str,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Delete a conversation and all of its messages"""
+    deleted = await _delete_conversation(db, conversation_id, int(current_user["id"]))
+    if not deleted:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found or access denied"
+        )
+    
+    await history_cache.invalidate(conversation_id)
+    return None
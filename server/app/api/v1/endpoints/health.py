@@ -1,8 +1,23 @@
 """Health check endpoints"""
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
 from datetime import datetime
 
+from app.agents.multilingual import multilingual_agent
+from app.core.llm import prompt_usage
+from app.core.llm_queue import llm_queue
+from app.core.metrics import metrics
+from app.core.rate_limit import chat_rate_limiter
+from app.core.security import login_metrics, password_hasher, token_cache
+from app.db.session import async_engine
+from app.services.chat_writer import chat_writer
+from app.services.history_cache import history_cache
+from app.services.principals import principal_cache
+from app.services.response_cache import response_cache
+
 router = APIRouter()
+# Mounted at the application root (/metrics) when METRICS_ENABLED is set
+metrics_router = APIRouter()
 
 
 @router.get("/")
@@ -16,3 +31,85 @@ async def health_check():
     }
 
 
+@router.get("/auth")
+async def auth_stats():
+    """Login rate and bcrypt pool usage"""
+    return {
+        "logins": login_metrics.stats(),
+        "password_hasher": password_hasher.stats()
+    }
+
+
+@router.get("/llm")
+async def llm_stats():
+    """LLM queue depth, per-lane wait times, coalesced calls and prompt cache usage per model"""
+    return {**llm_queue.stats(), "usage": prompt_usage.stats()}
+
+
+@router.get("/language")
+async def language_stats():
+    """Language detection counts per language and method, lifetime and recent"""
+    return multilingual_agent.get_statistics()
+
+
+@router.get("/rate-limit")
+async def rate_limit_stats():
+    """Admitted, rate-limited and shed chat requests"""
+    return chat_rate_limiter.stats()
+
+
+def _cache_stats():
+    return {
+        "history": history_cache.stats(),
+        "responses": response_cache.stats(),
+        "tokens": token_cache.stats(),
+        "principals": principal_cache.stats(),
+        "languages": multilingual_agent.cache.stats()
+    }
+
+
+@router.get("/cache")
+async def cache_stats():
+    """Cache hit/miss counters for tuning"""
+    return _cache_stats()
+
+
+@router.get("/db")
+async def db_stats():
+    """Connection pool and chat write-behind queue"""
+    return {
+        "pool": async_engine.pool.status(),
+        "chat_writer": chat_writer.stats()
+    }
+
+
+def _runtime_families():
+    """Cache, prompt cache, queue and rate limit figures read at scrape time"""
+    caches = {name: stats for name, stats in _cache_stats().items() if "hit_ratio" in stats}
+    lookups = {}
+    for name, stats in caches.items():
+        lookups[(name, "hit")] = stats["hits"]
+        lookups[(name, "miss")] = stats["misses"]
+    yield ("carely_cache_hit_ratio", "gauge", "Hit ratio of each in-process cache",
+           {(name,): stats["hit_ratio"] for name, stats in caches.items()}, ("cache",))
+    yield ("carely_cache_lookups_total", "counter", "Cache lookups by result", lookups, ("cache", "result"))
+    yield ("carely_llm_prompt_cache_ratio", "gauge", "Share of prompt tokens served from the upstream prompt cache",
+           {(model,): usage["cache_ratio"] for model, usage in prompt_usage.stats().items()}, ("model",))
+    queue = llm_queue.stats()
+    yield ("carely_llm_queue_depth", "gauge", "LLM calls waiting for a queue worker", {(): queue["queued"]}, ())
+    yield ("carely_llm_queue_busy", "gauge", "Queue workers running an LLM call", {(): queue["busy"]}, ())
+    limits = chat_rate_limiter.stats()
+    yield ("carely_chat_admission_total", "counter", "Chat requests admitted, rate-limited or shed",
+           {(outcome,): limits[outcome] for outcome in ("allowed", "limited", "shed")}, ("outcome",))
+    writer = chat_writer.stats()
+    yield ("carely_chat_writer_pending", "gauge", "Chat messages waiting in the write-behind queue",
+           {(): writer["pending"]}, ())
+
+
+metrics.register_collector(_runtime_families)
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,8 +1,10 @@
 """Medical Record endpoints"""
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
+from app.core.pagination import paginate
 from app.core.security import get_current_user
 from app.db.session import get_db
 from app.models.medical_record import MedicalRecord
@@ -14,7 +16,7 @@ router = APIRouter()
 @router.post("/", response_model=MedicalRecordResponse, status_code=status.HTTP_201_CREATED)
 async def create_medical_record(
     record: MedicalRecordCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Create a new medical record"""
@@ -28,21 +30,23 @@ async def create_medical_record(
     
     db_record = MedicalRecord(**record.model_dump())
     db.add(db_record)
-    db.commit()
-    db.refresh(db_record)
+    await db.commit()
+    await db.refresh(db_record)
     
     return db_record
 
 
 @router.get("/", response_model=List[MedicalRecordResponse])
 async def get_medical_records(
+    response: Response,
     patient_id: int = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get medical records"""
+    """Get medical records. Pass the X-Next-Cursor header value as `cursor` for the next page."""
     # If patient_id is provided, ensure it's the current user
     if patient_id and int(current_user["id"]) != patient_id:
         raise HTTPException(
@@ -53,11 +57,8 @@ async def get_medical_records(
     # Default to current user's records
     filter_patient_id = patient_id if patient_id else int(current_user["id"])
     
-    records = db.query(MedicalRecord)\
-        .filter(MedicalRecord.patient_id == filter_patient_id)\
-        .offset(skip)\
-        .limit(limit)\
-        .all()
+    query = select(MedicalRecord).where(MedicalRecord.patient_id == filter_patient_id)
+    records = await paginate(db, query, MedicalRecord.id, response, cursor, skip, limit)
     
     return records
 
@@ -65,11 +66,11 @@ async def get_medical_records(
 @router.get("/{record_id}", response_model=MedicalRecordResponse)
 async def get_medical_record(
     record_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Get a specific medical record"""
-    record = db.query(MedicalRecord).filter(MedicalRecord.id == record_id).first()
+    record = await db.scalar(select(MedicalRecord).where(MedicalRecord.id == record_id))
     if not record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -90,11 +91,11 @@ async def get_medical_record(
 async def update_medical_record(
     record_id: int,
     record_update: MedicalRecordUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Update a medical record"""
-    record = db.query(MedicalRecord).filter(MedicalRecord.id == record_id).first()
+    record = await db.scalar(select(MedicalRecord).where(MedicalRecord.id == record_id))
     if not record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -113,8 +114,8 @@ async def update_medical_record(
     for field, value in update_data.items():
         setattr(record, field, value)
     
-    db.commit()
-    db.refresh(record)
+    await db.commit()
+    await db.refresh(record)
     
     return record
 
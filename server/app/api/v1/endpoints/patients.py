@@ -1,36 +1,42 @@
 """Patient endpoints"""
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
+from app.agents.multilingual import multilingual_agent
+from app.core.pagination import paginate
 from app.core.security import get_current_user
 from app.db.session import get_db
 from app.models.patient import Patient
 from app.schemas.patient import PatientResponse, PatientUpdate
+from app.services.principals import principal_cache
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[PatientResponse])
 async def get_patients(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all patients (admin only)"""
-    patients = db.query(Patient).offset(skip).limit(limit).all()
+    """Get all patients (admin only). Pass the X-Next-Cursor header value as `cursor` for the next page."""
+    patients = await paginate(db, select(Patient), Patient.id, response, cursor, skip, limit)
     return patients
 
 
 @router.get("/{patient_id}", response_model=PatientResponse)
 async def get_patient(
     patient_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Get a specific patient"""
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
+    patient = await db.scalar(select(Patient).where(Patient.id == patient_id))
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -51,7 +57,7 @@ async def get_patient(
 async def update_patient(
     patient_id: int,
     patient_update: PatientUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Update patient information"""
@@ -62,7 +68,7 @@ async def update_patient(
             detail="Not authorized to update this patient's data"
         )
     
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
+    patient = await db.scalar(select(Patient).where(Patient.id == patient_id))
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -74,8 +80,11 @@ async def update_patient(
     for field, value in update_data.items():
         setattr(patient, field, value)
     
-    db.commit()
-    db.refresh(patient)
+    await db.commit()
+    await db.refresh(patient)
+    principal_cache.invalidate(patient_id)
+    if "preferred_language" in update_data:
+        multilingual_agent.forget_patient(patient_id)
     
     return patient
 
@@ -83,7 +92,7 @@ async def update_patient(
 @router.delete("/{patient_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def deactivate_patient(
     patient_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Deactivate a patient account"""
@@ -94,7 +103,7 @@ async def deactivate_patient(
             detail="Not authorized to deactivate this patient's account"
         )
     
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
+    patient = await db.scalar(select(Patient).where(Patient.id == patient_id))
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -102,7 +111,8 @@ async def deactivate_patient(
         )
     
     patient.is_active = 0
-    db.commit()
+    await db.commit()
+    principal_cache.invalidate(patient_id)
     
     return None
 
@@ -1,13 +1,17 @@
 """Support Ticket endpoints"""
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 import uuid
 
+from app.agents.multilingual import multilingual_agent
+from app.core.pagination import paginate
 from app.core.security import get_current_user
 from app.db.session import get_db
 from app.models.support_ticket import SupportTicket
 from app.schemas.support_ticket import SupportTicketCreate, SupportTicketUpdate, SupportTicketResponse
+from app.services.principals import principal_cache
 
 router = APIRouter()
 
@@ -20,7 +24,7 @@ def generate_ticket_number() -> str:
 @router.post("/", response_model=SupportTicketResponse, status_code=status.HTTP_201_CREATED)
 async def create_support_ticket(
     ticket: SupportTicketCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Create a new support ticket"""
@@ -38,27 +42,42 @@ async def create_support_ticket(
     if not ticket.patient_id:
         ticket.patient_id = int(current_user["id"])
     
+    # Tag the ticket's language unless the client set it; statistical detection and the
+    # patient's known language only, so creating a ticket never waits on an LLM call
+    if "language" not in ticket.model_fields_set:
+        principal = principal_cache.get(ticket.patient_id) or await principal_cache.load(ticket.patient_id)
+        detection = await multilingual_agent.detect_for_patient(
+            f"{ticket.subject}\n{ticket.description}",
+            ticket.patient_id,
+            principal.preferred_language if principal else None,
+            use_llm=False
+        )
+        if detection.code != "unknown":
+            ticket.language = detection.code
+    
     db_ticket = SupportTicket(
         **ticket.model_dump(),
         ticket_number=ticket_number
     )
     db.add(db_ticket)
-    db.commit()
-    db.refresh(db_ticket)
+    await db.commit()
+    await db.refresh(db_ticket)
     
     return db_ticket
 
 
 @router.get("/", response_model=List[SupportTicketResponse])
 async def get_support_tickets(
+    response: Response,
     patient_id: int = None,
     status_filter: str = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get support tickets"""
+    """Get support tickets. Pass the X-Next-Cursor header value as `cursor` for the next page."""
     # If patient_id is provided, ensure it's the current user
     if patient_id and int(current_user["id"]) != patient_id:
         raise HTTPException(
@@ -69,12 +88,12 @@ async def get_support_tickets(
     # Default to current user's tickets
     filter_patient_id = patient_id if patient_id else int(current_user["id"])
     
-    query = db.query(SupportTicket).filter(SupportTicket.patient_id == filter_patient_id)
+    query = select(SupportTicket).where(SupportTicket.patient_id == filter_patient_id)
     
     if status_filter:
-        query = query.filter(SupportTicket.status == status_filter)
+        query = query.where(SupportTicket.status == status_filter)
     
-    tickets = query.offset(skip).limit(limit).all()
+    tickets = await paginate(db, query, SupportTicket.id, response, cursor, skip, limit)
     
     return tickets
 
@@ -82,11 +101,11 @@ async def get_support_tickets(
 @router.get("/{ticket_id}", response_model=SupportTicketResponse)
 async def get_support_ticket(
     ticket_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Get a specific support ticket"""
-    ticket = db.query(SupportTicket).filter(SupportTicket.id == ticket_id).first()
+    ticket = await db.scalar(select(SupportTicket).where(SupportTicket.id == ticket_id))
     if not ticket:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -106,11 +125,11 @@ async def get_support_ticket(
 @router.get("/number/{ticket_number}", response_model=SupportTicketResponse)
 async def get_support_ticket_by_number(
     ticket_number: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Get a support ticket by ticket number"""
-    ticket = db.query(SupportTicket).filter(SupportTicket.ticket_number == ticket_number).first()
+    ticket = await db.scalar(select(SupportTicket).where(SupportTicket.ticket_number == ticket_number))
     if not ticket:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -131,11 +150,11 @@ async def get_support_ticket_by_number(
 async def update_support_ticket(
     ticket_id: int,
     ticket_update: SupportTicketUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Update a support ticket"""
-    ticket = db.query(SupportTicket).filter(SupportTicket.id == ticket_id).first()
+    ticket = await db.scalar(select(SupportTicket).where(SupportTicket.id == ticket_id))
     if not ticket:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -154,8 +173,8 @@ async def update_support_ticket(
     for field, value in update_data.items():
         setattr(ticket, field, value)
     
-    db.commit()
-    db.refresh(ticket)
+    await db.commit()
+    await db.refresh(ticket)
     
     return ticket
 
@@ -20,12 +20,49 @@ class Settings(BaseSettings):
     )
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
     ALGORITHM: str = "HS256"
+    TOKEN_CACHE_MAX_ENTRIES: int = Field(
+        default=10000,
+        description="Verified JWTs kept in memory; each entry expires with its token"
+    )
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    BCRYPT_ROUNDS: int = Field(
+        default=12,
+        description="bcrypt cost factor for new password hashes (each +1 doubles the work)"
+    )
+    PASSWORD_HASH_WORKERS: int = Field(
+        default=4,
+        description="Threads dedicated to bcrypt hashing and verification"
+    )
+    PRINCIPAL_CACHE_TTL_SECONDS: int = Field(
+        default=300,
+        description="How long a resolved patient principal is reused before re-reading the database"
+    )
     
     # Database
     DATABASE_URL: str = Field(
         default="sqlite:///./carely.db",
         description="Database connection URL"
     )
+    ASYNC_DATABASE_URL: Optional[str] = Field(
+        default=None,
+        description="Async driver URL for request handlers; derived from DATABASE_URL when unset"
+    )
+    DB_POOL_SIZE: int = Field(default=10, description="Connections kept open per worker process")
+    DB_MAX_OVERFLOW: int = Field(default=20, description="Extra connections allowed under burst load")
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = Field(
+        default=1800,
+        description="Replace pooled connections older than this (avoids server-side idle timeouts)"
+    )
+    DB_POOL_PRE_PING: bool = Field(default=True, description="Test connections before handing them out")
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_ASYNC_POOL_SIZE: int = Field(
+        default=2,
+        description="Connection cap for the async engine on SQLite; extra writers only busy-wait"
+    )
     
     # CORS
     BACKEND_CORS_ORIGINS: list[str] = Field(
@@ -36,9 +73,181 @@ class Settings(BaseSettings):
     # AI/ML Models
     OPENAI_API_KEY: Optional[str] = Field(default=None)
     ANTHROPIC_API_KEY: Optional[str] = Field(default=None)
+    LLM_MAX_CONCURRENCY: int = Field(
+        default=256,
+        description="LLM queue workers, i.e. maximum in-flight LLM requests per worker process"
+    )
+    LLM_QUEUE_MAX_SIZE: int = Field(
+        default=1024,
+        description="LLM calls allowed to wait for a queue worker before callers block"
+    )
+    LLM_COALESCE_ENABLED: bool = Field(
+        default=True,
+        description="Serve identical in-flight LLM requests with a single upstream call"
+    )
+    LLM_BROKER: str = Field(
+        default="memory",
+        description="Where in-flight requests are coalesced: memory (per process) or redis (all workers)"
+    )
+    LLM_COALESCE_TTL_SECONDS: float = Field(
+        default=60.0,
+        description="Longest a worker waits on another worker's identical request (redis broker)"
+    )
+    
+    # Chat rate limiting (token buckets in requests and estimated LLM tokens)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = Field(
+        default="memory",
+        description="Bucket store: memory (per process) or redis (shared by all workers)"
+    )
+    RATE_LIMIT_PATIENT_REQUESTS_PER_MINUTE: float = 20
+    RATE_LIMIT_PATIENT_BURST: int = Field(
+        default=5,
+        description="Chat requests a patient may send back to back before the per-minute rate applies"
+    )
+    RATE_LIMIT_PATIENT_TOKENS_PER_MINUTE: float = 40000
+    RATE_LIMIT_GLOBAL_REQUESTS_PER_SECOND: float = 50
+    RATE_LIMIT_GLOBAL_TOKENS_PER_MINUTE: float = Field(
+        default=1000000,
+        description="Estimated LLM tokens per minute for all patients; keep below the upstream quota"
+    )
+    RATE_LIMIT_CHAT_TOKEN_OVERHEAD: int = Field(
+        default=2500,
+        description="Estimated tokens a chat turn adds on top of the message (system prompt, history, max_tokens)"
+    )
+    LLM_SHED_QUEUE_DEPTH: int = Field(
+        default=512,
+        description="Reject non-urgent chat requests with 503 while this many LLM calls are queued"
+    )
+    OPENAI_BASE_URL: Optional[str] = Field(
+        default=None,
+        description="Override the OpenAI API base URL (e.g. a local OpenAI-compatible fake server)"
+    )
+    OPENAI_MAX_CONNECTIONS: int = 256
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 64
+    OPENAI_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    OPENAI_TIMEOUT_SECONDS: float = 60.0
+    OPENAI_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    OPENAI_MAX_RETRIES: int = 2
+    
+    # Metrics (Prometheus text format at /metrics)
+    METRICS_ENABLED: bool = Field(
+        default=True,
+        description="Record stage latencies, LLM tokens and costs; when off nothing is recorded and /metrics is not served"
+    )
+    LLM_PRICES_PER_MILLION: dict[str, dict[str, float]] = Field(
+        default={
+            "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+            "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+        },
+        description="USD per million input, cached input and output tokens, by model name prefix"
+    )
+    
+    # Request tracing
+    TRACING_ENABLED: bool = Field(
+        default=False,
+        description="Trace each request with spans for history load, intent routing, SQL, LLM calls and commits"
+    )
+    TRACING_BACKEND: str = Field(
+        default="builtin",
+        description="builtin (JSON lines) or opentelemetry (requires opentelemetry-sdk)"
+    )
+    TRACING_EXPORTER: str = Field(default="stdout", description="Where spans are written: stdout or file")
+    TRACING_FILE: str = "traces.jsonl"
+    
+    # Multilingual agent (language detection and translation)
+    MULTILINGUAL_CONFIDENCE_THRESHOLD: float = Field(
+        default=0.8,
+        description="Statistical language detection confidence below which the LLM is asked"
+    )
+    MULTILINGUAL_LLM_FALLBACK: bool = Field(
+        default=True,
+        description="Send low-confidence texts to the LLM (one batched call per request)"
+    )
+    MULTILINGUAL_LLM_BATCH_SIZE: int = Field(
+        default=50,
+        description="Texts per batched LLM language detection or translation prompt"
+    )
+    MULTILINGUAL_HISTORY_SIZE: int = Field(
+        default=1000,
+        description="Recent language detections kept in memory; totals are counted regardless"
+    )
+    MULTILINGUAL_CACHE_MAX_ENTRIES: int = Field(
+        default=10000,
+        description="Short texts whose detected language is cached (normalized text, LRU)"
+    )
+    MULTILINGUAL_CACHE_TTL_SECONDS: int = 3600
+    MULTILINGUAL_PRIOR_MAX_PATIENTS: int = 10000
+    MULTILINGUAL_PRIOR_MIN_CHARS: int = Field(
+        default=40,
+        description="Texts at least this long keep the patient's known language unless detection is confident"
+    )
+    
+    # Chat context window
+    CHAT_HISTORY_WINDOW_TURNS: int = Field(
+        default=6,
+        description="Number of most recent user/assistant turns sent to the model verbatim"
+    )
+    CHAT_SUMMARY_INTERVAL_TURNS: int = Field(
+        default=4,
+        description="Refresh the rolling summary once this many turns have left the window"
+    )
+    CHAT_HISTORY_TOKEN_BUDGET: int = Field(
+        default=3000,
+        description="Approximate token budget for the verbatim history window"
+    )
+    CHAT_SUMMARY_MAX_TOKENS: int = Field(
+        default=300,
+        description="Maximum tokens for the rolling conversation summary"
+    )
+    
+    # Chat message write-behind (opt-in)
+    CHAT_WRITE_BEHIND_ENABLED: bool = Field(
+        default=False,
+        description="Queue chat messages and insert them in batches instead of once per turn"
+    )
+    CHAT_WRITE_BEHIND_FLUSH_MS: int = Field(
+        default=200,
+        description="Longest a queued message waits before it is written; bounds what a crash can lose"
+    )
+    CHAT_WRITE_BEHIND_MAX_BATCH: int = 500
+    CHAT_WRITE_BEHIND_MAX_PENDING: int = Field(
+        default=5000,
+        description="Requests wait for a flush once this many messages are queued, and fail if it fails"
+    )
+    
+    # Conversation history cache
+    HISTORY_CACHE_BACKEND: str = Field(
+        default="memory",
+        description="History cache backend: memory, redis or none"
+    )
+    HISTORY_CACHE_MAX_CONVERSATIONS: int = 2048
+    HISTORY_CACHE_TTL_SECONDS: int = 900
+    REDIS_URL: str = Field(
+        default="redis://localhost:6379/0",
+        description="Local Redis-compatible server used by optional shared backends"
+    )
+    
+    # General-assistant response cache (opt-in, non-personalized questions only)
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_MAX_ENTRIES: int = 512
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
     
     # Healthcare specific
     MAX_APPOINTMENT_DAYS_AHEAD: int = 90
+    AVAILABILITY_REFRESH_SECONDS: int = Field(
+        default=60,
+        description="Reload the availability index from the database at most this often"
+    )
+    SLOT_HOLD_SECONDS: int = Field(
+        default=300,
+        description="How long slots shown to a patient are held for them"
+    )
+    BOOKING_MAX_RETRIES: int = Field(
+        default=3,
+        description="Retries when a booking commit hits a locked or busy database"
+    )
+    BOOKING_RETRY_BACKOFF_SECONDS: float = 0.05
     SUPPORT_EMAIL: str = "support@carely-ai.com"
     
     class Config:
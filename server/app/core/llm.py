@@ -0,0 +1,218 @@
+"""Shared OpenAI client and LLM concurrency controls"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.core.llm_queue import llm_lane, llm_queue
+from app.core.metrics import llm_cost, metrics
+from app.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[AsyncOpenAI] = None
+
+
+def _http_limits() -> httpx.Limits:
+    """Connection pool sizing for the shared client"""
+    return httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY_SECONDS
+    )
+
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        settings.OPENAI_TIMEOUT_SECONDS,
+        connect=settings.OPENAI_CONNECT_TIMEOUT_SECONDS
+    )
+
+
+def get_openai_client() -> Optional[AsyncOpenAI]:
+    """
+    Return the process-wide async OpenAI client, or None if no API key is configured.
+    Created lazily with a pooled keep-alive HTTP client so every agent reuses connections.
+    """
+    global _client
+    if _client is None and settings.OPENAI_API_KEY:
+        _client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            max_retries=settings.OPENAI_MAX_RETRIES,
+            http_client=httpx.AsyncClient(limits=_http_limits(), timeout=_http_timeout())
+        )
+    return _client
+
+
+async def close_openai_clients() -> None:
+    """Close pooled connections on application shutdown"""
+    global _client
+    if _client is not None:
+        await _client.close()
+    _client = None
+
+
+class PromptUsage:
+    """
+    Token usage per model as reported by the API, including the prompt tokens
+    served from the upstream prefix cache (usage.prompt_tokens_details.cached_tokens)
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"calls": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+        )
+    
+    def record(self, model: Optional[str], usage: Any) -> None:
+        if usage is None:
+            return
+        prompt_tokens = usage.prompt_tokens or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+        completion_tokens = usage.completion_tokens or 0
+        with self._lock:
+            totals = self._models[model or "unknown"]
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["cached_prompt_tokens"] += cached_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cost_usd"] += llm_cost(model or "unknown", prompt_tokens, cached_tokens, completion_tokens)
+        metrics.record_llm_usage(model, prompt_tokens, cached_tokens, completion_tokens)
+        logger.debug(
+            "LLM usage model=%s prompt=%d cached=%d uncached=%d completion=%d",
+            model, prompt_tokens, cached_tokens, prompt_tokens - cached_tokens, completion_tokens
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                model: {
+                    **totals,
+                    "cost_usd": round(totals["cost_usd"], 6),
+                    "uncached_prompt_tokens": totals["prompt_tokens"] - totals["cached_prompt_tokens"],
+                    "cache_ratio": round(totals["cached_prompt_tokens"] / totals["prompt_tokens"], 3)
+                    if totals["prompt_tokens"] else 0.0
+                }
+                for model, totals in self._models.items()
+            }
+
+
+prompt_usage = PromptUsage()
+
+
+def _request_key(client: AsyncOpenAI, kwargs: Dict[str, Any]) -> str:
+    """Identity of a completion request, used to coalesce identical in-flight calls"""
+    payload = json.dumps(kwargs, sort_keys=True, default=str)
+    base_url = getattr(client, "base_url", "")
+    return hashlib.sha256(f"{base_url}|{payload}".encode()).hexdigest()
+
+
+def _trace_usage(span, usage: Any) -> None:
+    if span is None or usage is None:
+        return
+    span.set_attribute("llm.prompt_tokens", usage.prompt_tokens or 0)
+    span.set_attribute("llm.completion_tokens", usage.completion_tokens or 0)
+    details = getattr(usage, "prompt_tokens_details", None)
+    span.set_attribute("llm.cached_prompt_tokens", (getattr(details, "cached_tokens", None) or 0) if details else 0)
+
+
+async def chat_completion(client: AsyncOpenAI, lane: Optional[str] = None, **kwargs):
+    """
+    Create a chat completion on the LLM job queue.
+    Waits for a queue worker in the given priority lane (default: the request's lane);
+    identical requests already in flight share that call's response.
+    """
+    with tracer.span("llm.chat_completion", **{
+        "llm.model": kwargs.get("model"), "llm.lane": lane or llm_lane.get()
+    }) as span:
+        async def run():
+            # Runs on a queue worker task, so the parent span is passed explicitly
+            upstream = tracer.start_span("llm.upstream", parent=span)
+            started = time.perf_counter()
+            try:
+                response = await client.chat.completions.create(**kwargs)
+            except Exception as e:
+                if upstream is not None:
+                    upstream.record_error(e)
+                raise
+            finally:
+                if upstream is not None:
+                    upstream.end()
+            metrics.observe_llm_call(kwargs.get("model"), time.perf_counter() - started)
+            prompt_usage.record(kwargs.get("model"), getattr(response, "usage", None))
+            _trace_usage(span, getattr(response, "usage", None))
+            return response
+        
+        return await llm_queue.call(
+            run,
+            lane=lane,
+            key=_request_key(client, kwargs)
+        )
+
+
+async def stream_chat_chunks(
+    client: AsyncOpenAI, lane: Optional[str] = None, **kwargs
+) -> AsyncIterator[Any]:
+    """
+    Stream a chat completion, yielding the raw chunks (text and tool-call deltas).
+    The queue worker is held until the stream is exhausted or closed.
+    """
+    # Usage arrives in a final chunk without choices
+    kwargs.setdefault("stream_options", {"include_usage": True})
+    # Not made current: a generator may be finalized outside the request's context
+    span = tracer.start_span("llm.stream", **{
+        "llm.model": kwargs.get("model"), "llm.lane": lane or llm_lane.get()
+    })
+    
+    async def open_stream():
+        upstream = tracer.start_span("llm.upstream", parent=span)
+        started = time.perf_counter()
+        first_chunk = True
+        try:
+            stream = await client.chat.completions.create(stream=True, **kwargs)
+            async for chunk in stream:
+                if first_chunk and upstream is not None:
+                    upstream.set_attribute("llm.first_chunk_ms", round((time.perf_counter() - started) * 1000, 2))
+                first_chunk = False
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    prompt_usage.record(kwargs.get("model"), usage)
+                    _trace_usage(span, usage)
+                yield chunk
+        except Exception as e:
+            if upstream is not None:
+                upstream.record_error(e)
+            raise
+        finally:
+            if upstream is not None:
+                upstream.end()
+            metrics.observe_llm_call(kwargs.get("model"), time.perf_counter() - started, stream=True)
+    
+    try:
+        async for chunk in llm_queue.stream(open_stream, lane=lane):
+            yield chunk
+    except Exception as e:
+        if span is not None:
+            span.record_error(e)
+        raise
+    finally:
+        if span is not None:
+            span.end()
+
+
+async def stream_chat_completion(
+    client: AsyncOpenAI, lane: Optional[str] = None, **kwargs
+) -> AsyncIterator[str]:
+    """Stream a chat completion, yielding text deltas as the model produces them"""
+    async for chunk in stream_chat_chunks(client, lane=lane, **kwargs):
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
@@ -0,0 +1,321 @@
+"""
+Priority job queue for LLM calls.
+
+Every upstream call runs on one of LLM_MAX_CONCURRENCY worker tasks, taken from
+priority lanes so urgent messages are not stuck behind FAQ or background traffic.
+Identical in-flight requests are coalesced by a broker: the memory broker shares
+one call per process, the redis broker shares it across worker processes.
+"""
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Lower value is served first
+LANES: Dict[str, int] = {
+    "urgent": 0,
+    "interactive": 1,
+    "faq": 2,
+    "background": 3,
+}
+DEFAULT_LANE = "interactive"
+
+# Lane of the current request; chat handlers raise it to "urgent" for emergencies
+llm_lane: contextvars.ContextVar[str] = contextvars.ContextVar("llm_lane", default=DEFAULT_LANE)
+
+_END = object()
+
+
+def set_llm_lane(lane: str) -> None:
+    """Set the default lane for LLM calls made by the current request"""
+    llm_lane.set(lane if lane in LANES else DEFAULT_LANE)
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    lane: str = field(compare=False)
+    run: Callable[[], Awaitable[Any]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+class MemoryBroker:
+    """Coalesces identical requests within this process"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def coalesce(self, key: str, run: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # A task, so one caller going away does not cancel the call for the others
+            task = asyncio.ensure_future(run())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def reset(self) -> None:
+        self._inflight.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"broker": self.name, "inflight": len(self._inflight), "coalesced": self.coalesced}
+
+
+class RedisBroker:
+    """
+    Coalesces identical requests across worker processes through a local Redis.
+    The first worker takes a lock and makes the call; the others poll for its
+    result and fall back to their own call if the lock holder goes away.
+    """
+
+    name = "redis"
+    KEY_PREFIX = "carely:llm:"
+    RESULT_TTL_MS = 5000
+    POLL_SECONDS = 0.05
+
+    def __init__(self, url: str, ttl_seconds: float):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError(
+                "LLM_BROKER=redis requires the 'redis' package (pip install redis)"
+            ) from e
+        self._redis = redis.Redis.from_url(url)
+        self._ttl_ms = int(ttl_seconds * 1000)
+        self._local = MemoryBroker()
+        self.coalesced_remote = 0
+
+    async def coalesce(self, key: str, run: Callable[[], Awaitable[Any]]) -> Any:
+        # Waiters in this process share one remote lookup
+        return await self._local.coalesce(key, lambda: self._coalesce_remote(key, run))
+
+    async def _coalesce_remote(self, key: str, run: Callable[[], Awaitable[Any]]) -> Any:
+        lock_key = f"{self.KEY_PREFIX}lock:{key}"
+        result_key = f"{self.KEY_PREFIX}result:{key}"
+
+        if await self._redis.set(lock_key, "1", nx=True, px=self._ttl_ms):
+            try:
+                result = await run()
+                payload = _encode(result)
+                if payload is not None:
+                    await self._redis.set(result_key, payload, px=self.RESULT_TTL_MS)
+                return result
+            finally:
+                await self._redis.delete(lock_key)
+
+        deadline = time.monotonic() + self._ttl_ms / 1000
+        while time.monotonic() < deadline:
+            payload = await self._redis.get(result_key)
+            if payload is not None:
+                self.coalesced_remote += 1
+                return _decode(payload)
+            if not await self._redis.exists(lock_key):
+                break
+            await asyncio.sleep(self.POLL_SECONDS)
+        return await run()
+
+    def reset(self) -> None:
+        self._local.reset()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._local.stats(), "broker": self.name, "coalesced_remote": self.coalesced_remote}
+
+
+def _encode(result: Any) -> Optional[str]:
+    """Serialize an OpenAI response for other workers; other results are not shared"""
+    dump = getattr(result, "model_dump_json", None)
+    return dump() if dump is not None else None
+
+
+def _decode(payload: bytes) -> Any:
+    from openai.types.chat import ChatCompletion
+    return ChatCompletion.model_validate_json(payload)
+
+
+class LLMJobQueue:
+    """Bounded pool of worker tasks serving LLM calls from priority lanes"""
+
+    def __init__(
+        self,
+        workers: int = settings.LLM_MAX_CONCURRENCY,
+        max_size: int = settings.LLM_QUEUE_MAX_SIZE,
+        broker=None,
+        coalesce: bool = settings.LLM_COALESCE_ENABLED
+    ):
+        self.workers = workers
+        self.max_size = max_size
+        self.broker = broker or MemoryBroker()
+        self.coalesce_enabled = coalesce
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._seq = itertools.count()
+        self._busy = 0
+        self.completed: Dict[str, int] = defaultdict(int)
+        self.failed = 0
+        self._wait_ms_total: Dict[str, float] = defaultdict(float)
+        self.max_wait_ms = 0.0
+
+    def _ensure_started(self) -> asyncio.PriorityQueue:
+        """Start the workers lazily inside the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new event loop (e.g. tests); state from the old loop is unusable
+            self._loop = loop
+            self._queue = asyncio.PriorityQueue(self.max_size)
+            self._busy = 0
+            self.broker.reset()
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        return self._queue
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            if job.future.cancelled():
+                continue
+            wait_ms = (time.perf_counter() - job.enqueued_at) * 1000
+            self._wait_ms_total[job.lane] += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            metrics.observe_stage(f"llm_queue_wait.{job.lane}", wait_ms / 1000)
+            self._busy += 1
+            try:
+                result = await job.run()
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not job.future.cancelled():
+                    job.future.set_exception(e)
+            else:
+                self.completed[job.lane] += 1
+                if not job.future.cancelled():
+                    job.future.set_result(result)
+            finally:
+                self._busy -= 1
+
+    async def _enqueue(self, run: Callable[[], Awaitable[Any]], lane: str) -> asyncio.Future:
+        queue = self._ensure_started()
+        future = self._loop.create_future()
+        await queue.put(_Job(
+            priority=LANES.get(lane, LANES[DEFAULT_LANE]),
+            seq=next(self._seq),
+            lane=lane,
+            run=run,
+            future=future,
+            enqueued_at=time.perf_counter()
+        ))
+        return future
+
+    async def submit(self, run: Callable[[], Awaitable[Any]], lane: Optional[str] = None) -> Any:
+        """Run a coroutine factory on a queue worker and return its result"""
+        future = await self._enqueue(run, lane or llm_lane.get())
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # Drop the job if no worker has picked it up yet
+            future.cancel()
+            raise
+
+    async def call(
+        self,
+        run: Callable[[], Awaitable[Any]],
+        lane: Optional[str] = None,
+        key: Optional[str] = None
+    ) -> Any:
+        """Like submit, but callers passing the same key while it is in flight share one call"""
+        lane = lane or llm_lane.get()
+        if key is None or not self.coalesce_enabled:
+            return await self.submit(run, lane)
+        self._ensure_started()
+        return await self.broker.coalesce(key, lambda: self.submit(run, lane))
+
+    async def stream(
+        self,
+        open_stream: Callable[[], AsyncIterator[str]],
+        lane: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Run a streaming call on a queue worker and yield its deltas as they arrive.
+        The worker stays busy until the stream ends or the consumer goes away.
+        """
+        deltas: asyncio.Queue = asyncio.Queue()
+        closed = False
+
+        async def pump():
+            try:
+                async for delta in open_stream():
+                    if closed:
+                        break
+                    deltas.put_nowait(delta)
+            finally:
+                deltas.put_nowait(_END)
+
+        future = await self._enqueue(pump, lane or llm_lane.get())
+        try:
+            while True:
+                delta = await deltas.get()
+                if delta is _END:
+                    break
+                yield delta
+            await future
+        finally:
+            closed = True
+            if not future.done():
+                future.cancel()
+
+    def depth(self) -> int:
+        """Calls waiting for a worker"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def stop(self) -> None:
+        """Cancel the workers (called from the app lifespan)"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+        self._queue = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "busy": self._busy,
+            "queued": self.depth(),
+            "completed": dict(self.completed),
+            "failed": self.failed,
+            "avg_wait_ms": {
+                lane: round(self._wait_ms_total[lane] / count, 2)
+                for lane, count in self.completed.items() if count
+            },
+            "max_wait_ms": round(self.max_wait_ms, 2),
+            **self.broker.stats()
+        }
+
+
+def create_llm_queue() -> LLMJobQueue:
+    """Build the LLM queue with the broker configured in settings"""
+    if settings.LLM_BROKER.lower() == "redis":
+        broker = RedisBroker(settings.REDIS_URL, settings.LLM_COALESCE_TTL_SECONDS)
+    else:
+        broker = MemoryBroker()
+    return LLMJobQueue(broker=broker)
+
+
+llm_queue = create_llm_queue()
@@ -0,0 +1,226 @@
+"""
+In-process metrics rendered in the Prometheus text format at /metrics.
+
+Request handlers time their stages (history load, intent routing, LLM call,
+persistence) into one histogram; LLM responses add token and estimated cost
+counters; caches and queues are read when /metrics is scraped. With
+METRICS_ENABLED off every recording call returns immediately.
+"""
+import math
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+# Seconds; spans cache hits (sub-millisecond) to slow completions
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+# Scrape-time samples: (metric name, type, help, {label values: value}, label names)
+Family = Tuple[str, str, str, Dict[LabelValues, float], Sequence[str]]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), series):
+                    cumulative += count
+                    le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                label_text = _format_labels(self.labelnames, labels)
+                lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+                lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class _StageTimer:
+    """Times a block into the stage histogram"""
+
+    __slots__ = ("_histogram", "_stage", "_started")
+
+    def __init__(self, histogram: Histogram, stage: str):
+        self._histogram = histogram
+        self._stage = stage
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._started, self._stage)
+        return False
+
+
+_NOOP = nullcontext()
+
+
+def llm_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost of one call from LLM_PRICES_PER_MILLION; 0 for unknown models"""
+    prices = settings.LLM_PRICES_PER_MILLION
+    # Longest matching prefix, so "gpt-4o-mini-2024-07-18" is priced as gpt-4o-mini, not gpt-4o
+    matches = [name for name in prices if model.startswith(name)]
+    if not matches:
+        return 0.0
+    price = prices[max(matches, key=len)]
+    uncached = prompt_tokens - cached_tokens
+    return (
+        uncached * price.get("input", 0.0)
+        + cached_tokens * price.get("cached_input", price.get("input", 0.0))
+        + completion_tokens * price.get("output", 0.0)
+    ) / 1_000_000
+
+
+class Metrics:
+    """The application's metrics and scrape-time collectors"""
+
+    def __init__(self, enabled: bool = settings.METRICS_ENABLED):
+        self.enabled = enabled
+        self.stage_seconds = Histogram(
+            "carely_stage_seconds",
+            "Time spent in each stage of handling a chat request",
+            ("stage",)
+        )
+        self.chat_requests = Counter(
+            "carely_chat_requests_total",
+            "Chat turns by endpoint and how they were answered",
+            ("endpoint", "route")
+        )
+        self.llm_seconds = Histogram(
+            "carely_llm_request_seconds",
+            "Upstream LLM call latency, excluding time waiting in the job queue",
+            ("model", "stream")
+        )
+        self.llm_tokens = Counter(
+            "carely_llm_tokens_total",
+            "LLM tokens reported by the API (kind: prompt, cached_prompt or completion)",
+            ("model", "kind")
+        )
+        self.llm_cost = Counter(
+            "carely_llm_cost_usd_total",
+            "Estimated LLM spend from LLM_PRICES_PER_MILLION",
+            ("model",)
+        )
+        self._metrics = [self.stage_seconds, self.chat_requests, self.llm_seconds, self.llm_tokens, self.llm_cost]
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def stage(self, name: str):
+        """Context manager timing a block as one stage; a shared no-op when disabled"""
+        if not self.enabled:
+            return _NOOP
+        return _StageTimer(self.stage_seconds, name)
+
+    def observe_stage(self, name: str, seconds: float) -> None:
+        if self.enabled:
+            self.stage_seconds.observe(seconds, name)
+
+    def count_chat(self, endpoint: str, route: str) -> None:
+        if self.enabled:
+            self.chat_requests.inc(1, endpoint, route)
+
+    def observe_llm_call(self, model: Optional[str], seconds: float, stream: bool = False) -> None:
+        if self.enabled:
+            self.llm_seconds.observe(seconds, model or "unknown", "true" if stream else "false")
+
+    def record_llm_usage(
+        self, model: Optional[str], prompt_tokens: int, cached_tokens: int, completion_tokens: int
+    ) -> None:
+        if not self.enabled:
+            return
+        model = model or "unknown"
+        self.llm_tokens.inc(prompt_tokens, model, "prompt")
+        self.llm_tokens.inc(cached_tokens, model, "cached_prompt")
+        self.llm_tokens.inc(completion_tokens, model, "completion")
+        self.llm_cost.inc(llm_cost(model, prompt_tokens, cached_tokens, completion_tokens), model)
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        """Add a callable returning gauge or counter families read at scrape time"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, help, samples, labelnames in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(samples.items()):
+                    lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
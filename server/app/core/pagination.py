@@ -0,0 +1,54 @@
+"""Cursor (keyset) pagination helpers for list endpoints"""
+import base64
+from typing import List, Optional
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    """Encode the last row ID of a page as an opaque cursor"""
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+
+async def paginate(
+    db: AsyncSession,
+    statement: Select,
+    id_column,
+    response: Response,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> List:
+    """
+    Return one page of rows ordered by ID.
+    With a cursor the query seeks past the last seen ID instead of scanning skipped rows;
+    skip/offset is still honoured when no cursor is given. When more rows exist, the
+    cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    statement = statement.order_by(id_column.asc())
+    if cursor:
+        statement = statement.where(id_column > decode_cursor(cursor))
+    elif skip:
+        statement = statement.offset(skip)
+    
+    rows = list((await db.scalars(statement.limit(limit + 1))).all())
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
+    return rows
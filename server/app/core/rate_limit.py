@@ -0,0 +1,295 @@
+"""
+Admission control for the chat endpoints.
+
+Each chat request takes from token buckets per patient and for the whole service,
+counted both in requests and in estimated LLM tokens. A request that would
+overdraw any bucket is rejected with 429 and Retry-After. While the LLM queue is
+backed up past LLM_SHED_QUEUE_DEPTH, non-urgent chat requests are shed with 503
+before they take a bucket or a database connection.
+"""
+import json
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from app.agents.intent_router import is_urgent
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.llm_queue import llm_queue
+from app.core.security import decode_access_token
+
+
+@dataclass(frozen=True)
+class Bucket:
+    """Refill rate (units per second) and burst capacity of one token bucket"""
+    name: str
+    rate: float
+    capacity: float
+
+
+# (key, bucket, cost) triples taken together by a store
+Take = Tuple[str, Bucket, float]
+
+
+class MemoryBucketStore:
+    """Buckets in the worker process; limits apply per process"""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = 100000, clock=time.monotonic):
+        # Idle buckets expire once they would be full again, which bounds memory
+        self._buckets = TTLCache(max_keys, ttl_seconds=3600, clock=clock)
+        self._clock = clock
+
+    async def take(self, takes: List[Take]) -> float:
+        """Take from every bucket or from none. Returns 0 if allowed, else seconds to wait."""
+        now = self._clock()
+        levels = []
+        retry_after = 0.0
+        for key, bucket, cost in takes:
+            tokens, updated_at = self._buckets.peek(key) or (bucket.capacity, now)
+            tokens = min(bucket.capacity, tokens + (now - updated_at) * bucket.rate)
+            levels.append(tokens)
+            if tokens < cost:
+                retry_after = max(retry_after, (cost - tokens) / bucket.rate)
+        if retry_after > 0:
+            return retry_after
+
+        for (key, bucket, cost), tokens in zip(takes, levels):
+            self._buckets.set(key, (tokens - cost, now), ttl_seconds=bucket.capacity / bucket.rate)
+        return 0.0
+
+
+# Same check-all-then-take-all logic as MemoryBucketStore.take, atomic in Redis.
+# ARGV: now, then rate, capacity, cost for each key.
+_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local retry = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local capacity = tonumber(ARGV[i * 3])
+    local cost = tonumber(ARGV[i * 3 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < cost then
+        retry = math.max(retry, (cost - tokens) / rate)
+    end
+end
+if retry > 0 then
+    return tostring(retry)
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local capacity = tonumber(ARGV[i * 3])
+    local cost = tonumber(ARGV[i * 3 + 1])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000))
+end
+return '0'
+"""
+
+
+class RedisBucketStore:
+    """Buckets in a local Redis-compatible server, shared by all workers"""
+
+    name = "redis"
+    KEY_PREFIX = "carely:ratelimit:"
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError(
+                "RATE_LIMIT_BACKEND=redis requires the 'redis' package (pip install redis)"
+            ) from e
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(_TAKE_SCRIPT)
+
+    async def take(self, takes: List[Take]) -> float:
+        keys = [f"{self.KEY_PREFIX}{key}" for key, _, _ in takes]
+        args: List[Any] = [time.time()]
+        for _, bucket, cost in takes:
+            args.extend([bucket.rate, bucket.capacity, cost])
+        return float(await self._script(keys=keys, args=args))
+
+
+@dataclass
+class Rejection:
+    status_code: int
+    detail: str
+    retry_after: float
+
+
+class ChatRateLimiter:
+    """Per-patient and global buckets for chat requests, plus queue-depth load shedding"""
+
+    def __init__(self, store=None, enabled: bool = settings.RATE_LIMIT_ENABLED):
+        self.store = store or MemoryBucketStore()
+        self.enabled = enabled
+        self.shed_queue_depth = settings.LLM_SHED_QUEUE_DEPTH
+        self.token_overhead = settings.RATE_LIMIT_CHAT_TOKEN_OVERHEAD
+        self.patient_requests = Bucket(
+            "patient_requests",
+            settings.RATE_LIMIT_PATIENT_REQUESTS_PER_MINUTE / 60,
+            settings.RATE_LIMIT_PATIENT_BURST
+        )
+        self.patient_tokens = Bucket(
+            "patient_tokens",
+            settings.RATE_LIMIT_PATIENT_TOKENS_PER_MINUTE / 60,
+            settings.RATE_LIMIT_PATIENT_TOKENS_PER_MINUTE
+        )
+        self.global_requests = Bucket(
+            "global_requests",
+            settings.RATE_LIMIT_GLOBAL_REQUESTS_PER_SECOND,
+            settings.RATE_LIMIT_GLOBAL_REQUESTS_PER_SECOND
+        )
+        # Possible emergencies draw from their own per-patient reserve, so a patient
+        # who used up the normal buckets can still reach the assistant
+        self.patient_urgent = Bucket(
+            "patient_urgent",
+            settings.RATE_LIMIT_PATIENT_REQUESTS_PER_MINUTE / 60,
+            settings.RATE_LIMIT_PATIENT_BURST
+        )
+        self.global_tokens = Bucket(
+            "global_tokens",
+            settings.RATE_LIMIT_GLOBAL_TOKENS_PER_MINUTE / 60,
+            settings.RATE_LIMIT_GLOBAL_TOKENS_PER_MINUTE
+        )
+        self.allowed = 0
+        self.limited = 0
+        self.shed = 0
+
+    def estimate_tokens(self, message: str) -> int:
+        """Same ~4 characters per token estimate as the context manager, plus the turn overhead"""
+        return len(message) // 4 + self.token_overhead
+
+    async def check(self, client_key: str, message: str) -> Optional[Rejection]:
+        """Admit or reject one chat request"""
+        urgent = is_urgent(message)
+        if self.shed_queue_depth and not urgent and llm_queue.depth() >= self.shed_queue_depth:
+            self.shed += 1
+            return Rejection(503, "The assistant is busy right now. Please try again shortly.", 1)
+
+        if not self.enabled:
+            return None
+
+        tokens = self.estimate_tokens(message)
+        if urgent:
+            takes = [(f"{client_key}:urgent", self.patient_urgent, 1)]
+        else:
+            takes = [
+                (f"{client_key}:requests", self.patient_requests, 1),
+                (f"{client_key}:tokens", self.patient_tokens, min(tokens, self.patient_tokens.capacity)),
+            ]
+        # Urgent messages still count against the service-wide quota
+        takes += [
+            ("global:requests", self.global_requests, 1),
+            ("global:tokens", self.global_tokens, min(tokens, self.global_tokens.capacity)),
+        ]
+        retry_after = await self.store.take(takes)
+        if retry_after > 0:
+            self.limited += 1
+            return Rejection(429, "Too many chat requests. Please wait before sending another message.", retry_after)
+        self.allowed += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "backend": self.store.name,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "shed": self.shed,
+            "llm_queue_depth": llm_queue.depth(),
+            "shed_queue_depth": self.shed_queue_depth
+        }
+
+
+def _client_key(scope) -> str:
+    """Patient id from a valid bearer token, otherwise the client address"""
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    subject = decode_access_token(token).get("sub")
+                except HTTPException:
+                    break
+                if subject is not None:
+                    return f"patient:{subject}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying ChatRateLimiter to POST requests under the chat prefix"""
+
+    def __init__(self, app, limiter: Optional[ChatRateLimiter] = None, path_prefix: Optional[str] = None):
+        self.app = app
+        self.limiter = limiter or chat_rate_limiter
+        self.path_prefix = path_prefix or f"{settings.API_V1_PREFIX}/chat"
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(self.path_prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        # Buffer the (small) JSON body to size the request, then replay it to the app
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        try:
+            text = str(json.loads(body).get("message", ""))
+        except (ValueError, AttributeError):
+            text = ""
+
+        rejection = await self.limiter.check(_client_key(scope), text)
+        if rejection is not None:
+            response = JSONResponse(
+                status_code=rejection.status_code,
+                content={"detail": rejection.detail},
+                headers={"Retry-After": str(max(1, math.ceil(rejection.retry_after)))}
+            )
+            await response(scope, receive, send)
+            return
+
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay, send)
+
+
+def create_rate_limiter() -> ChatRateLimiter:
+    """Build the limiter with the bucket store configured in settings"""
+    if settings.RATE_LIMIT_BACKEND.lower() == "redis":
+        return ChatRateLimiter(RedisBucketStore(settings.REDIS_URL))
+    return ChatRateLimiter(MemoryBucketStore())
+
+
+chat_rate_limiter = create_rate_limiter()
@@ -1,19 +1,32 @@
 """Security utilities for authentication and authorization"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Dict, Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
 
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.db.session import get_db
+from app.schemas.patient import PatientResponse
+from app.services.principals import principal_cache
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_PREFIX}/auth/login")
 
+# Verified token payloads keyed by sha256(token); each entry expires with its token
+token_cache = TTLCache(
+    maxsize=settings.TOKEN_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash"""
@@ -25,6 +38,102 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool so the 100-300 ms of CPU per call
+    never blocks the event loop (bcrypt releases the GIL while hashing).
+    The pool size bounds how many hashes run at once; extra calls queue.
+    """
+    
+    def __init__(self, max_workers: int = settings.PASSWORD_HASH_WORKERS):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+    
+    def _timed(self, fn: Callable[..., Any], *args: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.calls += 1
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+    
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._timed, fn, *args)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+    
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+    
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+    
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "in_flight": self.in_flight,
+                "calls": self.calls,
+                "avg_ms": round(self.total_seconds / self.calls * 1000, 1) if self.calls else 0.0,
+                "max_ms": round(self.max_seconds * 1000, 1),
+            }
+
+
+class LoginMetrics:
+    """Login outcome counters plus a sliding one-minute login rate"""
+    
+    def __init__(self, window_seconds: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._recent: deque = deque()
+        self._lock = threading.Lock()
+        self.succeeded = 0
+        self.failed = 0
+    
+    def record(self, success: bool) -> None:
+        now = self._clock()
+        with self._lock:
+            if success:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            self._recent.append(now)
+            self._trim(now)
+    
+    def _trim(self, now: float) -> None:
+        while self._recent and self._recent[0] <= now - self.window_seconds:
+            self._recent.popleft()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._trim(self._clock())
+            return {
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "last_minute": len(self._recent),
+            }
+
+
+password_hasher = PasswordHasher()
+login_metrics = LoginMetrics()
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
@@ -39,23 +148,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 
 def decode_access_token(token: str) -> dict:
-    """Decode JWT access token"""
+    """Decode JWT access token, reusing the verified payload for repeat tokens"""
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return dict(payload)
+    
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    
+    # Never cache a payload beyond its own expiry
+    exp = payload.get("exp")
+    ttl = token_cache.ttl_seconds if exp is None else min(token_cache.ttl_seconds, exp - time.time())
+    if ttl > 0:
+        token_cache.set(key, dict(payload), ttl_seconds=ttl)
+    return payload
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-):
-    """Get current authenticated user"""
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """Get current authenticated user from the token alone (no database session)"""
     payload = decode_access_token(token)
     user_id: str = payload.get("sub")
     if user_id is None:
@@ -64,8 +181,20 @@ async def get_current_user(
             detail="Could not validate credentials",
         )
     
-    # Here you would fetch the user from the database
-    # For now, returning a simple dict
     return {"id": user_id, "email": payload.get("email")}
 
 
+async def get_current_patient(current_user: dict = Depends(get_current_user)) -> PatientResponse:
+    """Get the authenticated patient's profile, served from the principal cache when warm"""
+    patient_id = int(current_user["id"])
+    principal = principal_cache.get(patient_id)
+    if principal is None:
+        principal = await principal_cache.load(patient_id)
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Patient not found"
+        )
+    return principal
+
+
@@ -0,0 +1,371 @@
+"""
+Request tracing.
+
+TracingMiddleware starts a trace per HTTP request (continuing a W3C traceparent
+header when one is sent) and handlers open child spans for the stages of a chat
+turn; SQL statements and LLM calls are traced as well. Span and trace IDs follow
+the OpenTelemetry format. With TRACING_BACKEND=opentelemetry spans are created
+through the OpenTelemetry SDK; the built-in backend writes each finished span as
+one JSON line to stdout or TRACING_FILE.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, TextIO
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# Longest SQL text kept on a span; statements carry bound parameters, never values
+_MAX_STATEMENT_LENGTH = 300
+
+
+class Span:
+    """A span of the built-in backend"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error", "_tracer")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self._tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def update_name(self, name: str) -> None:
+        self.name = name
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self._tracer._export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": "ERROR" if self.error else "OK",
+            **({"error": self.error} if self.error else {})
+        }
+
+
+class _RemoteParent:
+    """Parent span from an incoming traceparent header"""
+
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+
+class OtelSpan:
+    """Wraps an OpenTelemetry span behind the same interface as Span"""
+
+    __slots__ = ("_span", "trace_id", "span_id")
+
+    def __init__(self, span):
+        self._span = span
+        context = span.get_span_context()
+        self.trace_id = format(context.trace_id, "032x")
+        self.span_id = format(context.span_id, "016x")
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self._span.set_attribute(key, value)
+
+    def update_name(self, name: str) -> None:
+        self._span.update_name(name)
+
+    def record_error(self, error: BaseException) -> None:
+        from opentelemetry.trace import Status, StatusCode
+        self._span.record_exception(error)
+        self._span.set_status(Status(StatusCode.ERROR, f"{type(error).__name__}: {error}"))
+
+    def end(self) -> None:
+        self._span.end()
+
+
+# Innermost active span of the current request
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Creates spans with the configured backend; a disabled tracer creates none"""
+
+    def __init__(
+        self,
+        enabled: bool = settings.TRACING_ENABLED,
+        backend: str = settings.TRACING_BACKEND,
+        exporter: str = settings.TRACING_EXPORTER,
+        path: str = settings.TRACING_FILE
+    ):
+        self.enabled = enabled
+        self.backend = backend.lower()
+        self._out: Optional[TextIO] = None
+        self._owns_out = False
+        self._lock = threading.Lock()
+        self._otel = None
+        self._otel_provider = None
+        if not enabled:
+            return
+        if self.backend == "opentelemetry":
+            self._setup_otel(exporter, path)
+        elif exporter.lower() == "file":
+            # Line buffered, so a crash loses at most the span being written
+            self._out = open(path, "a", buffering=1, encoding="utf-8")
+            self._owns_out = True
+        else:
+            self._out = sys.stdout
+
+    def _setup_otel(self, exporter: str, path: str) -> None:
+        try:
+            from opentelemetry import trace
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+        except ImportError as e:
+            raise RuntimeError(
+                "TRACING_BACKEND=opentelemetry requires the OpenTelemetry SDK "
+                "(pip install opentelemetry-sdk)"
+            ) from e
+        provider = trace.get_tracer_provider()
+        if not isinstance(provider, TracerProvider):
+            # No SDK provider configured by the deployment; export to a file or stdout
+            out = open(path, "a", encoding="utf-8") if exporter.lower() == "file" else sys.stdout
+            self._owns_out = out is not sys.stdout
+            self._out = out
+            provider = TracerProvider()
+            provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter(
+                out=out,
+                formatter=lambda span: span.to_json(indent=None) + "\n"
+            )))
+            trace.set_tracer_provider(provider)
+            self._otel_provider = provider
+        self._otel = trace.get_tracer("carely")
+
+    def start_span(self, name: str, parent=None, **attributes: Any):
+        """
+        Start a span under the given parent (default: the current span) without
+        making it current. Returns None when tracing is disabled.
+        """
+        if not self.enabled:
+            return None
+        parent = parent if parent is not None else _current_span.get()
+        if self._otel is not None:
+            return OtelSpan(self._otel.start_span(name, context=self._otel_context(parent), attributes=attributes))
+        if parent is None:
+            return Span(self, name, os.urandom(16).hex(), None, attributes)
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    def _otel_context(self, parent):
+        from opentelemetry import trace
+        if parent is None:
+            return None
+        if isinstance(parent, OtelSpan):
+            return trace.set_span_in_context(parent._span)
+        span_context = trace.SpanContext(
+            trace_id=int(parent.trace_id, 16),
+            span_id=int(parent.span_id, 16),
+            is_remote=True,
+            trace_flags=trace.TraceFlags(trace.TraceFlags.SAMPLED if parent.sampled else trace.TraceFlags.DEFAULT)
+        )
+        return trace.set_span_in_context(trace.NonRecordingSpan(span_context))
+
+    def span(self, name: str, **attributes: Any) -> "_ActiveSpan":
+        """Context manager running a block as the current span"""
+        return _ActiveSpan(self, name, attributes)
+
+    def _export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            try:
+                self._out.write(line + "\n")
+            except (OSError, ValueError):
+                logger.warning("Could not write span %s", span.name)
+
+    def shutdown(self) -> None:
+        """Flush and close the exporter (called from the app lifespan)"""
+        if self._otel_provider is not None:
+            self._otel_provider.shutdown()
+        if self._out is not None:
+            if self._owns_out:
+                self._out.close()
+            else:
+                self._out.flush()
+            self._out = None
+        self.enabled = False
+
+
+class _ActiveSpan:
+    """Makes a span current for the duration of a with block and records errors"""
+
+    __slots__ = ("_tracer", "_name", "_attributes", "_span", "_token")
+
+    def __init__(self, tracer: Tracer, name: str, attributes: Dict[str, Any]):
+        self._tracer = tracer
+        self._name = name
+        self._attributes = attributes
+
+    def __enter__(self):
+        self._span = self._tracer.start_span(self._name, **self._attributes)
+        self._token = _current_span.set(self._span) if self._span is not None else None
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._span is not None:
+            if exc is not None:
+                self._span.record_error(exc)
+            self._span.end()
+            _current_span.reset(self._token)
+        return False
+
+
+class _Stage:
+    """Times a block into the stage histogram and traces it as a span"""
+
+    __slots__ = ("_name", "_active", "_started")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self._name = name
+        self._active = _ActiveSpan(tracer, name, attributes)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self._active.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        metrics.observe_stage(self._name, time.perf_counter() - self._started)
+        return self._active.__exit__(exc_type, exc, tb)
+
+
+def stage(name: str, **attributes: Any):
+    """Time a stage of request handling; also a span when tracing is enabled"""
+    if not tracer.enabled:
+        return metrics.stage(name)
+    return _Stage(name, attributes)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    """Trace ID of the current request, or None when it is not traced"""
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+def parse_traceparent(value: str) -> Optional[_RemoteParent]:
+    match = _TRACEPARENT.match(value.strip().lower())
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return _RemoteParent(match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1)
+
+
+def instrument_engine(sync_engine) -> None:
+    """Trace SQL statements run while a request span is active"""
+    from sqlalchemy import event
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current_span.get() is None:
+            return
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+        span = tracer.start_span(
+            f"db.{operation.lower()}",
+            **{"db.system": sync_engine.dialect.name, "db.statement": statement[:_MAX_STATEMENT_LENGTH]}
+        )
+        conn.info.setdefault("carely_spans", []).append(span)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("carely_spans")
+        if spans:
+            spans.pop().end()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("carely_spans") if conn is not None else None
+        if spans:
+            span = spans.pop()
+            span.record_error(exception_context.original_exception)
+            span.end()
+
+
+class TracingMiddleware:
+    """ASGI middleware running each HTTP request in a root span"""
+
+    def __init__(self, app, tracer_: Optional[Tracer] = None):
+        self.app = app
+        self.tracer = tracer_ or tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        for name, value in scope.get("headers", ()):
+            if name == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+
+        span = self.tracer.start_span(
+            f"HTTP {scope['method']} {scope['path']}",
+            parent=parent,
+            **{"http.method": scope["method"], "http.target": scope["path"]}
+        )
+        token = _current_span.set(span)
+        traceparent = f"00-{span.trace_id}-{span.span_id}-01".encode()
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"traceparent", traceparent),
+                    (b"x-trace-id", span.trace_id.encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except Exception as e:
+            span.record_error(e)
+            raise
+        finally:
+            # Name the span by route template rather than by path, which may hold IDs
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                span.update_name(f"HTTP {scope['method']} {route.path}")
+                span.set_attribute("http.route", route.path)
+            span.end()
+            _current_span.reset(token)
+
+
+tracer = Tracer()
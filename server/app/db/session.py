@@ -1,24 +1,161 @@
-"""Database session management"""
-from sqlalchemy import create_engine
+"""
+Database session management.
+Request handlers use AsyncSession (get_db); the synchronous engine and SessionLocal
+remain for startup table creation, Alembic and standalone scripts.
+"""
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from typing import Any, AsyncGenerator, Callable, Dict, Optional
 
 from app.core.config import settings
+from app.core.tracing import instrument_engine, tracer
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+# Async drivers used when DATABASE_URL names a sync one
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    # psycopg 3 drives both sync and async engines
+    "postgresql": "postgresql+psycopg",
+    "postgresql+psycopg2": "postgresql+psycopg",
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+}
+
+
+def _is_sqlite(database_url: str) -> bool:
+    return database_url.startswith("sqlite")
+
+
+def _is_sqlite_memory(database_url: str) -> bool:
+    return _is_sqlite(database_url) and (":memory:" in database_url or database_url.rstrip("/") == "sqlite:")
+
+
+def engine_options(database_url: str) -> Dict[str, Any]:
+    """Pool and driver options for the configured database"""
+    if _is_sqlite_memory(database_url):
+        # In-memory SQLite is a single connection; pool sizing does not apply
+        return {"connect_args": {"check_same_thread": False}}
+
+    options: Dict[str, Any] = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if _is_sqlite(database_url):
+        options["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+    return options
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """
+    WAL lets readers run alongside the single writer, busy_timeout makes writers
+    wait for the lock instead of failing with "database is locked", and
+    synchronous=NORMAL is durable under WAL while skipping an fsync per commit.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.close()
+
+
+def _begin_before_savepoint(conn, name) -> None:
+    """
+    pysqlite only opens a transaction before DML, so a SAVEPOINT issued after plain
+    SELECTs would start the outermost transaction and its RELEASE would commit.
+    Open the transaction first so the savepoint nests inside the session's commit.
+    """
+    dbapi_connection = conn.connection.dbapi_connection
+    driver_connection = getattr(dbapi_connection, "driver_connection", dbapi_connection)
+    if not driver_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN")
+
+
+def create_db_engine(database_url: str = settings.DATABASE_URL) -> Engine:
+    """Create an engine with the configured pool, plus connection pragmas on SQLite"""
+    db_engine = create_engine(database_url, **engine_options(database_url))
+    if _is_sqlite(database_url) and not _is_sqlite_memory(database_url):
+        event.listen(db_engine, "connect", _apply_sqlite_pragmas)
+    if _is_sqlite(database_url):
+        event.listen(db_engine, "savepoint", _begin_before_savepoint)
+    return db_engine
+
+
+def async_database_url(database_url: str, override: Optional[str] = None) -> str:
+    """Async-driver equivalent of a database URL (psycopg 3 and asyncpg URLs pass through)"""
+    if override:
+        return override
+    url = make_url(database_url)
+    driver = ASYNC_DRIVERS.get(url.drivername)
+    return url.set(drivername=driver).render_as_string(hide_password=False) if driver else database_url
+
+
+def create_async_db_engine(database_url: str = settings.DATABASE_URL) -> AsyncEngine:
+    """Async counterpart of create_db_engine with the same pool settings and pragmas"""
+    async_url = async_database_url(database_url, settings.ASYNC_DATABASE_URL)
+    options = engine_options(database_url)
+    if "pool_size" in options:
+        # aiosqlite defaults to NullPool; keep connections (and their pragmas) pooled
+        options["poolclass"] = AsyncAdaptedQueuePool
+    if _is_sqlite(database_url) and "pool_size" in options:
+        # SQLite allows one writer at a time; with many aiosqlite connections the
+        # writers spend their time in busy_timeout back-off instead of committing
+        options["pool_size"] = min(settings.DB_POOL_SIZE, settings.SQLITE_ASYNC_POOL_SIZE)
+        options["max_overflow"] = 0
+    db_engine = create_async_engine(async_url, **options)
+    if _is_sqlite(database_url) and not _is_sqlite_memory(database_url):
+        event.listen(db_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    if _is_sqlite(database_url):
+        event.listen(db_engine.sync_engine, "savepoint", _begin_before_savepoint)
+    return db_engine
+
+
+engine = create_db_engine()
+async_engine = create_async_db_engine()
+if tracer.enabled:
+    instrument_engine(async_engine.sync_engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay readable after commit; async sessions cannot lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+_AFTER_COMMIT = "after_commit_callbacks"
 
 
-def get_db() -> Generator[Session, None, None]:
+def after_commit(db: AsyncSession, callback: Callable[[], None]) -> None:
+    """
+    Run callback once the session's transaction commits, e.g. to update in-process
+    indexes only for changes that were actually stored. Dropped if it rolls back.
+    """
+    db.sync_session.info.setdefault(_AFTER_COMMIT, []).append(callback)
+
+
+# Both events also fire when a savepoint is released or rolled back; the callbacks
+# wait for the outermost transaction
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session: Session) -> None:
+    if not session.in_nested_transaction():
+        for callback in session.info.pop(_AFTER_COMMIT, ()):
+            callback()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_commit(session: Session, previous_transaction) -> None:
+    if previous_transaction.parent is None:
+        session.info.pop(_AFTER_COMMIT, None)
+
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """Dependency for getting database session"""
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
-
 
@@ -1,19 +1,44 @@
 """Main FastAPI application"""
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from app.core.config import settings
 from app.api.v1.api import api_router
+from app.api.v1.endpoints import health
 from app.db.base import Base
 from app.db import base_all
-from app.db.session import engine
+from app.db.session import async_engine, engine
+from app.core.llm import close_openai_clients
+from app.core.llm_queue import llm_queue
+from app.core.rate_limit import RateLimitMiddleware
+from app.core.security import password_hasher
+from app.core.tracing import TracingMiddleware, tracer
+from app.services.chat_writer import chat_writer
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown"""
+    chat_writer.start()
+    yield
+    # Write queued chat messages before the pool goes away
+    await chat_writer.stop()
+    await llm_queue.stop()
+    await close_openai_clients()
+    password_hasher.shutdown()
+    await async_engine.dispose()
+    tracer.shutdown()
+
+
 # Initialize FastAPI application
 app = FastAPI(
+    lifespan=lifespan,
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     description="A comprehensive healthcare assistant API with multilingual support ticket routing",
@@ -22,6 +47,12 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_PREFIX}/openapi.json"
 )
 
+# Chat rate limits and load shedding; added before CORS so rejections carry CORS headers
+app.add_middleware(RateLimitMiddleware)
+
+# Request tracing; wraps rate limiting so rejected requests are traced too
+app.add_middleware(TracingMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -29,11 +60,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After", "X-Trace-Id", "traceparent"],
 )
 
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 
+# Prometheus scrape endpoint at /metrics
+if settings.METRICS_ENABLED:
+    app.include_router(health.metrics_router)
+
 
 @app.get("/")
 async def root():
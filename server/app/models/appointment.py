@@ -1,5 +1,5 @@
 """Appointment database model"""
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index, text
 from datetime import datetime
 from app.db.base import Base
 
@@ -7,6 +7,19 @@ from app.db.base import Base
 class Appointment(Base):
     """Appointment model"""
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Appointment listing filters by patient and status, ordered by time
+        Index("ix_appointments_patient_status_scheduled", "patient_id", "status", "scheduled_time"),
+        # A doctor can hold at most one active appointment per start time
+        Index(
+            "uq_appointments_doctor_scheduled_active",
+            "doctor_name",
+            "scheduled_time",
+            unique=True,
+            sqlite_where=text("status != 'cancelled'"),
+            postgresql_where=text("status != 'cancelled'"),
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False, index=True)
@@ -1,5 +1,5 @@
 """Chat conversation database model"""
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
 from datetime import datetime
 from app.db.base import Base
 import uuid
@@ -18,6 +18,9 @@ class ChatConversation(Base):
     conversation_id = Column(String, unique=True, index=True, nullable=False, default=generate_conversation_id)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False, index=True)
     title = Column(String, nullable=True)  # Optional title/summary of conversation
+    summary = Column(Text, nullable=True)  # Rolling summary of messages older than the history window
+    summarized_message_count = Column(Integer, default=0, nullable=False)  # Messages folded into summary
+    message_count = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
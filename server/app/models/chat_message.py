@@ -1,5 +1,5 @@
 """Chat message database model"""
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from datetime import datetime
 from app.db.base import Base
 
@@ -7,6 +7,10 @@ from app.db.base import Base
 class ChatMessage(Base):
     """Chat message model - stores individual messages in a conversation"""
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # History is always read per conversation in creation order
+        Index("ix_chat_messages_conversation_created", "conversation_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(String, ForeignKey("chat_conversations.conversation_id"), nullable=False, index=True)
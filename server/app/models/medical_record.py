@@ -1,5 +1,5 @@
 """Medical Record database model"""
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Float, Index
 from datetime import datetime
 from app.db.base import Base
 
@@ -7,6 +7,10 @@ from app.db.base import Base
 class MedicalRecord(Base):
     """Medical Record model"""
     __tablename__ = "medical_records"
+    __table_args__ = (
+        # Keyset pagination of a patient's records
+        Index("ix_medical_records_patient_id_id", "patient_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False, index=True)
@@ -1,5 +1,5 @@
 """Provider database model"""
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
 from datetime import datetime
 from app.db.base import Base
 
@@ -7,6 +7,10 @@ from app.db.base import Base
 class Provider(Base):
     """Provider model"""
     __tablename__ = "providers"
+    __table_args__ = (
+        # The availability index and appointments refer to doctors by name
+        Index("uq_providers_name", "name", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -14,6 +18,10 @@ class Provider(Base):
     phone_number = Column(String)
     specialty = Column(String)
     address = Column(Text)
+    work_days = Column(String, default="0,1,2,3,4")  # Comma-separated weekdays (0 = Monday)
+    work_start_hour = Column(Integer, default=9)
+    work_end_hour = Column(Integer, default=17)
+    slot_minutes = Column(Integer, default=30)
     is_active = Column(Integer, default=1)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,5 +1,5 @@
 """Support Ticket database model"""
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index
 from datetime import datetime
 from app.db.base import Base
 
@@ -7,6 +7,10 @@ from app.db.base import Base
 class SupportTicket(Base):
     """Support Ticket model for multilingual support routing"""
     __tablename__ = "support_tickets"
+    __table_args__ = (
+        # Keyset pagination of a patient's tickets, optionally filtered by status
+        Index("ix_support_tickets_patient_status_id", "patient_id", "status", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=True, index=True)
@@ -15,4 +15,5 @@ class ChatMessageResponse(BaseModel):
     message_id: str | None = Field(None, description="Optional message ID for tracking")
     conversation_id: str = Field(..., description="Conversation ID for this message")
     appointment_data: Optional[Dict[str, Any]] = Field(None, description="Appointment booking data if applicable")
+    trace_id: Optional[str] = Field(None, description="Trace ID of this request when tracing is enabled")
 
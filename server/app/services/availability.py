@@ -0,0 +1,252 @@
+"""
+Availability index for appointment scheduling.
+Keeps one bitmask of booked slots per doctor per day, built from the Provider and
+Appointment tables and updated incrementally on book/cancel/update, so queries such as
+"next 10 free cardiology slots this week" never generate or scan a calendar.
+"""
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert as sa_insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.appointment import Appointment
+from app.models.provider import Provider
+
+
+def _insert_providers(dialect: str):
+    """INSERT into providers that skips names already present"""
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return sa_insert(Provider)
+    return insert(Provider).on_conflict_do_nothing(index_elements=["name"])
+
+
+@dataclass
+class DoctorSchedule:
+    """Working hours and booked-slot bitmaps for one doctor"""
+    name: str
+    specialty: str
+    work_days: FrozenSet[int]
+    start_minute: int
+    end_minute: int
+    slot_minutes: int
+    booked: Dict[date, int] = field(default_factory=dict)
+
+    @property
+    def slots_per_day(self) -> int:
+        return max(0, (self.end_minute - self.start_minute) // self.slot_minutes)
+
+    @property
+    def working_mask(self) -> int:
+        return (1 << self.slots_per_day) - 1
+
+    def slot_mask(self, start: datetime, duration_minutes: int) -> Tuple[date, int]:
+        """Bitmask of the day's slots overlapped by [start, start + duration)"""
+        offset = start.hour * 60 + start.minute - self.start_minute
+        first = max(0, offset // self.slot_minutes)
+        last = min(self.slots_per_day, -(-(offset + duration_minutes) // self.slot_minutes))
+        if last <= first:
+            return start.date(), 0
+        return start.date(), ((1 << (last - first)) - 1) << first
+
+    def slot_time(self, day: date, index: int) -> datetime:
+        minutes = self.start_minute + index * self.slot_minutes
+        return datetime(day.year, day.month, day.day, minutes // 60, minutes % 60)
+
+
+def _parse_work_days(value: Optional[str]) -> FrozenSet[int]:
+    if not value:
+        return frozenset(range(5))
+    return frozenset(int(day) for day in value.split(",") if day.strip().isdigit())
+
+
+class AvailabilityIndex:
+    """Per-process availability index shared by all chat requests"""
+
+    def __init__(
+        self,
+        horizon_days: int = settings.MAX_APPOINTMENT_DAYS_AHEAD,
+        refresh_seconds: int = settings.AVAILABILITY_REFRESH_SECONDS
+    ):
+        self.horizon_days = horizon_days
+        self.refresh_seconds = refresh_seconds
+        self._doctors: Dict[str, DoctorSchedule] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.RLock()
+        self._load_lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds
+
+    async def ensure_loaded(self, db: AsyncSession, default_doctors: Iterable[Dict] = ()) -> None:
+        """
+        Build the index on first use and reload it periodically so bookings made by
+        other worker processes are picked up. Concurrent callers share one reload;
+        once built, callers keep using the stale index while a reload is running
+        instead of waiting for it with their own connection checked out.
+        """
+        if self._is_fresh():
+            return
+        if self._loaded_at is not None and self._load_lock.locked():
+            return
+        async with self._load_lock:
+            if not self._is_fresh():
+                await self.load(db, default_doctors)
+
+    async def load(self, db: AsyncSession, default_doctors: Iterable[Dict] = ()) -> None:
+        """(Re)build the index from the Provider and Appointment tables"""
+        active_providers = select(Provider).where(Provider.is_active == 1)
+        providers = (await db.scalars(active_providers)).all()
+        if not providers and default_doctors:
+            # Seed the provider table from the agent's built-in doctor list. Another worker
+            # may be seeding at the same time, so rows that already exist are skipped.
+            # Not committed here, so the caller's unit of work keeps its connection and commits the rows
+            await db.execute(_insert_providers(db.get_bind().dialect.name), [
+                {"name": doctor["name"], "specialty": doctor["specialty"]}
+                for doctor in default_doctors
+            ])
+            providers = (await db.scalars(active_providers)).all()
+
+        doctors = {
+            provider.name: DoctorSchedule(
+                name=provider.name,
+                specialty=provider.specialty or "",
+                work_days=_parse_work_days(provider.work_days),
+                start_minute=(provider.work_start_hour if provider.work_start_hour is not None else 9) * 60,
+                end_minute=(provider.work_end_hour if provider.work_end_hour is not None else 17) * 60,
+                slot_minutes=provider.slot_minutes or 30
+            )
+            for provider in providers
+        }
+
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        appointments = (await db.execute(
+            select(
+                Appointment.doctor_name, Appointment.scheduled_time, Appointment.duration_minutes
+            ).where(
+                Appointment.status != 'cancelled',
+                Appointment.scheduled_time >= today,
+                Appointment.scheduled_time < today + timedelta(days=self.horizon_days + 1)
+            )
+        )).all()
+
+        for doctor_name, scheduled_time, duration in appointments:
+            schedule = doctors.get(doctor_name)
+            if schedule:
+                day, mask = schedule.slot_mask(scheduled_time, duration or 30)
+                schedule.booked[day] = schedule.booked.get(day, 0) | mask
+
+        with self._lock:
+            self._doctors = doctors
+            self._loaded_at = time.monotonic()
+
+    def mark_booked(self, doctor_name: str, scheduled_time: datetime, duration_minutes: int = 30) -> None:
+        """Record a new or moved appointment"""
+        with self._lock:
+            schedule = self._doctors.get(doctor_name)
+            if schedule:
+                day, mask = schedule.slot_mask(scheduled_time, duration_minutes or 30)
+                schedule.booked[day] = schedule.booked.get(day, 0) | mask
+
+    def release(self, doctor_name: str, scheduled_time: datetime, duration_minutes: int = 30) -> None:
+        """Free the slots of a cancelled or moved appointment"""
+        with self._lock:
+            schedule = self._doctors.get(doctor_name)
+            if schedule:
+                day, mask = schedule.slot_mask(scheduled_time, duration_minutes or 30)
+                remaining = schedule.booked.get(day, 0) & ~mask
+                if remaining:
+                    schedule.booked[day] = remaining
+                else:
+                    schedule.booked.pop(day, None)
+
+    def is_free(self, doctor_name: str, scheduled_time: datetime, duration_minutes: int = 30) -> bool:
+        """True if the doctor works and has no booking during the requested time"""
+        with self._lock:
+            schedule = self._doctors.get(doctor_name)
+            if not schedule or scheduled_time.weekday() not in schedule.work_days:
+                return False
+            day, mask = schedule.slot_mask(scheduled_time, duration_minutes or 30)
+            return bool(mask) and not (schedule.booked.get(day, 0) & mask)
+
+    def is_booked(self, doctor_name: str, scheduled_time: datetime, duration_minutes: int = 30) -> bool:
+        """True if the index knows the doctor and already has a booking overlapping the time"""
+        with self._lock:
+            schedule = self._doctors.get(doctor_name)
+            if not schedule:
+                return False
+            day, mask = schedule.slot_mask(scheduled_time, duration_minutes or 30)
+            return bool(schedule.booked.get(day, 0) & mask)
+
+    def next_free_slots(
+        self,
+        specialty: Optional[str] = None,
+        doctor_name: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: int = 10,
+        exclude: Optional[Callable[[str, datetime], bool]] = None
+    ) -> List[Dict]:
+        """
+        Earliest free slots, optionally filtered by specialty or doctor, within [start, end).
+        Each day costs one AND/NOT per matching doctor plus one step per returned slot.
+        exclude(doctor_name, slot_time) can veto slots, e.g. ones held for other patients.
+        """
+        now = datetime.now()
+        start = max(start or now, now)
+        end = end or (start + timedelta(days=self.horizon_days))
+
+        with self._lock:
+            doctors = [
+                schedule for schedule in self._doctors.values()
+                if (not doctor_name or schedule.name.lower() == doctor_name.lower())
+                and (not specialty or specialty.lower() in schedule.specialty.lower())
+            ]
+
+            results: List[Dict] = []
+            day = start.date()
+            while day < end.date() + timedelta(days=1) and len(results) < limit:
+                day_slots = []
+                for schedule in doctors:
+                    if day.weekday() not in schedule.work_days:
+                        continue
+                    free = schedule.working_mask & ~schedule.booked.get(day, 0)
+                    if day == start.date():
+                        # Drop slots that start before the window opens
+                        offset = start.hour * 60 + start.minute - schedule.start_minute
+                        first_open = max(0, -(-offset // schedule.slot_minutes))
+                        free &= ~((1 << first_open) - 1)
+                    while free:
+                        lowest = free & -free
+                        slot_time = schedule.slot_time(day, lowest.bit_length() - 1)
+                        free ^= lowest
+                        if slot_time >= end:
+                            break
+                        if exclude and exclude(schedule.name, slot_time):
+                            continue
+                        day_slots.append((slot_time, schedule))
+
+                day_slots.sort(key=lambda item: item[0])
+                for slot_time, schedule in day_slots[:limit - len(results)]:
+                    results.append({
+                        "datetime": slot_time.isoformat(),
+                        "formatted": slot_time.strftime("%A, %B %d at %I:%M %p"),
+                        "available": True,
+                        "doctor_name": schedule.name,
+                        "specialty": schedule.specialty
+                    })
+                day += timedelta(days=1)
+
+        return results
+
+
+availability_index = AvailabilityIndex()
@@ -0,0 +1,170 @@
+"""
+Optional write-behind queue for chat messages.
+When CHAT_WRITE_BEHIND_ENABLED is set, turns are queued in memory and a background
+task inserts them in batches (one executemany and one commit per batch) at most
+CHAT_WRITE_BEHIND_FLUSH_MS after they were queued. The queue is flushed on shutdown;
+a crash can lose at most the messages queued since the last flush. While flushes fail,
+at most CHAT_WRITE_BEHIND_MAX_PENDING messages are kept and further turns are refused.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Collection, Dict, List, Optional
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.chat_conversation import ChatConversation
+from app.models.chat_message import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+_conversations = ChatConversation.__table__
+_update_conversation = update(_conversations).where(
+    _conversations.c.conversation_id == bindparam("b_conversation_id")
+).values(
+    message_count=_conversations.c.message_count + bindparam("b_added"),
+    updated_at=bindparam("b_updated_at")
+)
+
+
+class ChatQueueFullError(Exception):
+    """The write-behind queue is full and flushing it failed"""
+
+    def __init__(self, pending: int):
+        super().__init__(f"{pending} chat messages are queued and the last flush failed")
+        self.pending = pending
+
+
+class ChatWriteBehind:
+    """Batches chat message inserts and conversation counters across requests"""
+
+    def __init__(
+        self,
+        enabled: bool = settings.CHAT_WRITE_BEHIND_ENABLED,
+        flush_interval_ms: int = settings.CHAT_WRITE_BEHIND_FLUSH_MS,
+        max_batch: int = settings.CHAT_WRITE_BEHIND_MAX_BATCH,
+        max_pending: int = settings.CHAT_WRITE_BEHIND_MAX_PENDING,
+        session_factory: async_sessionmaker = AsyncSessionLocal
+    ):
+        self.enabled = enabled
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._session_factory = session_factory
+        self._pending: List[Dict[str, Any]] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.messages_written = 0
+        self.failures = 0
+        self.rejected = 0
+        self.last_flush_ms = 0.0
+
+    def start(self) -> None:
+        """Start the background flusher (called from the app lifespan)"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flusher and write everything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._pending:
+            if not await self.flush():
+                logger.error("Dropping %d queued chat messages after a failed flush", len(self._pending))
+                break
+
+    async def enqueue(self, messages: List[Dict[str, Any]]) -> None:
+        """Queue ChatMessage rows; waits for a flush if the queue is full"""
+        if len(self._pending) >= self.max_pending and not await self.flush():
+            # Failed batches stay queued, so refuse new rows rather than grow without bound
+            self.rejected += len(messages)
+            raise ChatQueueFullError(len(self._pending))
+        self._pending.extend(messages)
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    def pending_for(self, conversation_id: str, exclude: Collection[str] = ()) -> List[Dict[str, str]]:
+        """Queued messages of a conversation, including a batch being written, oldest first"""
+        return [
+            {"role": row["role"], "content": row["content"]}
+            for row in self._pending
+            if row["conversation_id"] == conversation_id and row["message_id"] not in exclude
+        ]
+
+    def discard(self, conversation_id: str) -> None:
+        """Drop queued messages of a deleted conversation"""
+        self._pending = [row for row in self._pending if row["conversation_id"] != conversation_id]
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._pending:
+                await self.flush()
+
+    async def flush(self) -> bool:
+        """Write queued messages in batches. Returns False if a batch failed and was requeued."""
+        async with self._flush_lock:
+            while self._pending:
+                # The batch stays queued until it is committed, so pending_for still sees it
+                batch = self._pending[:self.max_batch]
+                started = time.perf_counter()
+                try:
+                    async with self._session_factory() as db:
+                        await self._write(db, batch)
+                        # Dequeued as soon as the rows are readable from the database
+                        written = {id(row) for row in batch}
+                        self._pending = [row for row in self._pending if id(row) not in written]
+                except Exception:
+                    # Keep the batch at the head of the queue and retry on the next tick
+                    self.failures += 1
+                    logger.exception("Failed to write %d chat messages", len(batch))
+                    return False
+                self.batches += 1
+                self.messages_written += len(batch)
+                self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+        return True
+
+    async def _write(self, db: AsyncSession, batch: List[Dict[str, Any]]) -> None:
+        added: Dict[str, int] = defaultdict(int)
+        updated_at: Dict[str, datetime] = {}
+        for row in batch:
+            added[row["conversation_id"]] += 1
+            updated_at[row["conversation_id"]] = row["created_at"]
+
+        await db.execute(insert(ChatMessage), batch)
+        await db.execute(_update_conversation, [
+            {"b_conversation_id": conversation_id, "b_added": count, "b_updated_at": updated_at[conversation_id]}
+            for conversation_id, count in added.items()
+        ])
+        await db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "messages_written": self.messages_written,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "last_flush_ms": self.last_flush_ms,
+            "flush_interval_ms": int(self.flush_interval * 1000)
+        }
+
+
+chat_writer = ChatWriteBehind()
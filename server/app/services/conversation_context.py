@@ -0,0 +1,170 @@
+"""
+Bounded conversation context for the chat endpoints.
+Keeps the most recent turns verbatim and folds older messages into a rolling
+summary stored on ChatConversation, so per-turn prompt size stays flat.
+"""
+import logging
+from typing import Dict, List, Optional
+
+from openai import AsyncOpenAI
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.llm import chat_completion
+from app.models.chat_conversation import ChatConversation
+from app.models.chat_message import ChatMessage
+from app.services.chat_writer import chat_writer
+from app.services.history_cache import HistoryCache, history_cache as default_history_cache
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a patient and the Carely medical assistant.
+Update the existing summary with the new messages. Keep facts the assistant needs later:
+symptoms, concerns, preferences, appointment details and anything the patient asked to remember.
+Be concise and factual. Do not add advice or information that is not in the conversation."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token plus per-message overhead)"""
+    return len(text) // 4 + 4
+
+
+class ConversationContextManager:
+    """Builds the history sent to the model: rolling summary + last N turns"""
+    
+    def __init__(
+        self,
+        openai_client: AsyncOpenAI,
+        window_turns: int = settings.CHAT_HISTORY_WINDOW_TURNS,
+        summary_interval_turns: int = settings.CHAT_SUMMARY_INTERVAL_TURNS,
+        history_token_budget: int = settings.CHAT_HISTORY_TOKEN_BUDGET,
+        summary_max_tokens: int = settings.CHAT_SUMMARY_MAX_TOKENS,
+        history_cache: HistoryCache = default_history_cache
+    ):
+        self.client = openai_client
+        self.history_cache = history_cache
+        self.window_messages = window_turns * 2
+        self.summary_interval_messages = summary_interval_turns * 2
+        self.history_token_budget = history_token_budget
+        self.summary_max_tokens = summary_max_tokens
+    
+    async def load_window(self, db: AsyncSession, conversation_id: str, limit: int) -> List[ChatMessage]:
+        """Load the most recent messages of the conversation, oldest first"""
+        recent = (await db.scalars(
+            select(ChatMessage).where(
+                ChatMessage.conversation_id == conversation_id
+            ).order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit)
+        )).all()
+        return list(reversed(recent))
+    
+    def _pending_summary_messages(self, conversation: ChatConversation) -> int:
+        """Number of messages that have left the window but are not summarized yet"""
+        total = conversation.message_count or 0
+        summarized = conversation.summarized_message_count or 0
+        return max(0, total - self.window_messages - summarized)
+    
+    def _unsummarized_messages(self, conversation: ChatConversation, queued: int = 0) -> int:
+        """Messages the model must see verbatim: the window plus any not folded into the summary yet"""
+        total = (conversation.message_count or 0) + queued
+        summarized = conversation.summarized_message_count or 0
+        return max(self.window_messages, total - summarized)
+    
+    async def _load_range(
+        self, db: AsyncSession, conversation_id: str, offset: int, limit: int
+    ) -> List[ChatMessage]:
+        """Load a slice of the conversation in chronological order"""
+        return list((await db.scalars(
+            select(ChatMessage).where(
+                ChatMessage.conversation_id == conversation_id
+            ).order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc()).offset(offset).limit(limit)
+        )).all())
+    
+    def _store_summary(
+        self, conversation: ChatConversation, summary: str, summarized: int
+    ) -> None:
+        """Record the refreshed summary; it is written with the turn's commit"""
+        conversation.summary = summary
+        conversation.summarized_message_count = summarized
+    
+    async def refresh_summary(self, db: AsyncSession, conversation: ChatConversation) -> None:
+        """
+        Fold messages that have left the window into the rolling summary.
+        Runs only once every CHAT_SUMMARY_INTERVAL_TURNS turns; failures keep the previous summary.
+        The turn waits for it, so the call runs in the turn's own queue lane.
+        """
+        pending = self._pending_summary_messages(conversation)
+        if pending < self.summary_interval_messages:
+            return
+        
+        summarized = conversation.summarized_message_count or 0
+        new_messages = await self._load_range(db, conversation.conversation_id, summarized, pending)
+        if not new_messages:
+            return
+        
+        transcript = "\n".join(f"{msg.role.title()}: {msg.content}" for msg in new_messages)
+        prompt = f"Existing summary:\n{conversation.summary or '(none)'}\n\nNew messages:\n{transcript}"
+        
+        try:
+            response = await chat_completion(
+                self.client,
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.2,
+                max_tokens=self.summary_max_tokens
+            )
+            summary = response.choices[0].message.content.strip()
+        except Exception:
+            logger.exception("Failed to refresh summary for conversation %s", conversation.conversation_id)
+            return
+        
+        self._store_summary(conversation, summary, summarized + len(new_messages))
+    
+    def compose(self, summary: Optional[str], window: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Combine the summary and the window, dropping the oldest turns beyond the token budget"""
+        budget = self.history_token_budget
+        kept: List[Dict[str, str]] = []
+        for message in reversed(window):
+            cost = estimate_tokens(message["content"])
+            if kept and cost > budget:
+                break
+            kept.append(message)
+            budget -= cost
+        kept.reverse()
+        
+        if summary:
+            kept.insert(0, {
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{summary}"
+            })
+        return kept
+    
+    async def build_history(self, db: AsyncSession, conversation: ChatConversation) -> List[Dict[str, str]]:
+        """Return the bounded history for the next model call"""
+        await self.refresh_summary(db, conversation)
+        
+        conversation_id = conversation.conversation_id
+        # Messages still waiting in the write-behind queue are not counted in message_count yet
+        queued = chat_writer.pending_for(conversation_id)
+        keep = self._unsummarized_messages(conversation, len(queued))
+        stored = conversation.message_count or 0
+        window = await self.history_cache.get(conversation_id, stored)
+        # Messages between the window and the summary are kept verbatim until they are folded in
+        if window is None or len(window) < min(keep, stored):
+            recent = await self.load_window(db, conversation_id, keep)
+            # Re-read the queue after the query: a batch committed in between is then
+            # returned by both, so drop queued rows the query already saw
+            window = [{"role": msg.role, "content": msg.content} for msg in recent]
+            window += chat_writer.pending_for(conversation_id, exclude={msg.message_id for msg in recent})
+            await self.history_cache.set(conversation_id, window, stored + len(queued))
+        return self.compose(conversation.summary, window[-keep:])
+    
+    async def record_turn(self, conversation_id: str, user_message: str, ai_response: str) -> None:
+        """Append a stored turn to the cached history"""
+        await self.history_cache.append(conversation_id, [
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": ai_response}
+        ])
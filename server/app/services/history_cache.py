@@ -0,0 +1,200 @@
+"""
+Cache of recent conversation history keyed by conversation_id, per process or in Redis.
+Hot conversations skip the chat_messages query and ORM hydration entirely.
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+Message = Dict[str, str]
+
+
+class MemoryHistoryBackend:
+    """
+    LRU/TTL history store living in the worker process. With several workers,
+    entries are checked against the conversation's message count and reloaded
+    when another worker has stored turns since they were cached.
+    """
+    
+    name = "memory"
+    
+    def __init__(self, max_conversations: int, ttl_seconds: int):
+        self._cache = TTLCache(max_conversations, ttl_seconds)
+    
+    async def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get(conversation_id)
+        return {"count": entry["count"], "messages": list(entry["messages"])} if entry is not None else None
+    
+    async def set(self, conversation_id: str, entry: Dict[str, Any]) -> None:
+        self._cache.set(conversation_id, entry)
+    
+    async def append(self, conversation_id: str, messages: List[Message], max_messages: int) -> None:
+        # Only extend histories that are already cached; a miss is filled on the next read
+        cached = self._cache.peek(conversation_id)
+        if cached is not None:
+            self._cache.set(conversation_id, {
+                "count": cached["count"] + len(messages),
+                "messages": (cached["messages"] + list(messages))[-max_messages:]
+            })
+    
+    async def delete(self, conversation_id: str) -> None:
+        self._cache.pop(conversation_id)
+    
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+# Same as MemoryHistoryBackend.append, atomic in Redis.
+# ARGV: JSON list of messages, max messages, TTL in seconds.
+_APPEND_SCRIPT = """
+local raw = redis.call('GET', KEYS[1])
+if not raw then
+    return 0
+end
+local entry = cjson.decode(raw)
+local added = cjson.decode(ARGV[1])
+local messages = entry['messages']
+for _, message in ipairs(added) do
+    table.insert(messages, message)
+end
+local drop = #messages - tonumber(ARGV[2])
+local kept = {}
+for i = math.max(drop, 0) + 1, #messages do
+    table.insert(kept, messages[i])
+end
+entry['messages'] = kept
+entry['count'] = entry['count'] + #added
+redis.call('SET', KEYS[1], cjson.encode(entry), 'EX', tonumber(ARGV[3]))
+return 1
+"""
+
+
+class RedisHistoryBackend:
+    """History store in a local Redis-compatible server, shared by all workers"""
+    
+    name = "redis"
+    KEY_PREFIX = "carely:history:"
+    
+    def __init__(self, url: str, ttl_seconds: int):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError(
+                "HISTORY_CACHE_BACKEND=redis requires the 'redis' package (pip install redis)"
+            ) from e
+        self._redis = redis.Redis.from_url(url)
+        self._append_script = self._redis.register_script(_APPEND_SCRIPT)
+        self._ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+    
+    def _key(self, conversation_id: str) -> str:
+        return f"{self.KEY_PREFIX}{conversation_id}"
+    
+    async def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.get(self._key(conversation_id))
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+    
+    async def set(self, conversation_id: str, entry: Dict[str, Any]) -> None:
+        await self._redis.set(self._key(conversation_id), json.dumps(entry), ex=self._ttl_seconds)
+    
+    async def append(self, conversation_id: str, messages: List[Message], max_messages: int) -> None:
+        # One script call, so concurrent appends from other workers are not lost
+        await self._append_script(
+            keys=[self._key(conversation_id)],
+            args=[json.dumps(messages), max_messages, self._ttl_seconds]
+        )
+    
+    async def delete(self, conversation_id: str) -> None:
+        await self._redis.delete(self._key(conversation_id))
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "ttl_seconds": self._ttl_seconds
+        }
+
+
+class HistoryCache:
+    """Conversation history cache; a disabled cache always misses"""
+    
+    def __init__(
+        self,
+        backend=None,
+        # The window plus the messages that wait for the next summary refresh
+        max_messages: int = (settings.CHAT_HISTORY_WINDOW_TURNS + settings.CHAT_SUMMARY_INTERVAL_TURNS) * 2
+    ):
+        self.backend = backend
+        self.max_messages = max_messages
+        self.stale = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+    
+    async def get(self, conversation_id: str, message_count: int = 0) -> Optional[List[Message]]:
+        """
+        Return the cached recent messages (oldest first), or None on a miss.
+        An entry older than message_count, the stored count of the conversation,
+        misses turns written by another worker and is treated as a miss.
+        """
+        if not self.backend:
+            return None
+        entry = await self.backend.get(conversation_id)
+        if entry is None:
+            return None
+        if entry["count"] < message_count:
+            self.stale += 1
+            return None
+        return entry["messages"]
+    
+    async def set(self, conversation_id: str, messages: List[Message], message_count: int) -> None:
+        """Store the recent messages loaded from the database; message_count includes them all"""
+        if self.backend:
+            await self.backend.set(conversation_id, {
+                "count": message_count,
+                "messages": messages[-self.max_messages:]
+            })
+    
+    async def append(self, conversation_id: str, messages: List[Message]) -> None:
+        """Append newly written messages to a cached conversation"""
+        if self.backend:
+            await self.backend.append(conversation_id, messages, self.max_messages)
+    
+    async def invalidate(self, conversation_id: str) -> None:
+        """Drop a conversation, e.g. when it is deleted"""
+        if self.backend:
+            await self.backend.delete(conversation_id)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for tuning"""
+        if not self.backend:
+            return {"backend": "none"}
+        return {"backend": self.backend.name, **self.backend.stats(), "stale": self.stale}
+
+
+def create_history_cache() -> HistoryCache:
+    """Build the history cache configured in settings"""
+    backend_name = settings.HISTORY_CACHE_BACKEND.lower()
+    if backend_name == "memory":
+        backend = MemoryHistoryBackend(
+            settings.HISTORY_CACHE_MAX_CONVERSATIONS,
+            settings.HISTORY_CACHE_TTL_SECONDS
+        )
+    elif backend_name == "redis":
+        backend = RedisHistoryBackend(settings.REDIS_URL, settings.HISTORY_CACHE_TTL_SECONDS)
+    else:
+        backend = None
+    return HistoryCache(backend)
+
+
+history_cache = create_history_cache()
@@ -0,0 +1,48 @@
+"""
+Per-process cache of authenticated patient principals keyed by patient id.
+Endpoints that only need the caller's own profile read it from here instead of
+querying the patients table on every request. Entries are dropped whenever the
+patient is updated or deactivated, and expire after PRINCIPAL_CACHE_TTL_SECONDS so
+changes made by other worker processes are picked up.
+"""
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.patient import Patient
+from app.schemas.patient import PatientResponse
+
+
+class PrincipalCache:
+    """Patient id -> PatientResponse snapshot"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self._cache = TTLCache(max_entries, ttl_seconds)
+
+    def get(self, patient_id: int) -> Optional[PatientResponse]:
+        return self._cache.get(patient_id)
+
+    async def load(self, patient_id: int) -> Optional[PatientResponse]:
+        """Read the patient and cache it"""
+        async with AsyncSessionLocal() as db:
+            patient = await db.scalar(select(Patient).where(Patient.id == patient_id))
+            if patient is None:
+                return None
+            principal = PatientResponse.model_validate(patient)
+        self._cache.set(patient_id, principal)
+        return principal
+
+    def invalidate(self, patient_id: int) -> None:
+        self._cache.pop(patient_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+principal_cache = PrincipalCache(
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,192 @@
+"""
+Slot reservation for appointment booking.
+Slots shown to a patient are held for them for SLOT_HOLD_SECONDS, and bookings are
+confirmed with a single atomic insert guarded by the partial unique index on
+(doctor_name, scheduled_time), so concurrent chats can never double-book a slot.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import after_commit
+from app.models.appointment import Appointment
+from app.services.availability import AvailabilityIndex
+
+SlotKey = Tuple[str, datetime]
+
+
+class SlotConflictError(Exception):
+    """The requested slot is booked or held by another patient"""
+
+    def __init__(self, doctor_name: str, scheduled_time: datetime):
+        super().__init__(f"{doctor_name} is not available at {scheduled_time.isoformat()}")
+        self.doctor_name = doctor_name
+        self.scheduled_time = scheduled_time
+
+
+def _slot_key(doctor_name: str, scheduled_time: datetime) -> SlotKey:
+    return doctor_name, scheduled_time.replace(tzinfo=None, second=0, microsecond=0)
+
+
+class SlotHolds:
+    """
+    Short-lived, per-process holds on slots that were offered to a patient.
+    Holds only steer concurrent chats away from each other; the unique index is
+    what guarantees correctness across workers.
+    """
+
+    def __init__(self, ttl_seconds: float = settings.SLOT_HOLD_SECONDS, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._holds: Dict[SlotKey, Tuple[int, float]] = {}
+        self._by_patient: Dict[int, Set[SlotKey]] = {}
+        self._lock = threading.Lock()
+        self._last_purge = clock()
+
+    def _purge(self, now: float) -> None:
+        """Drop expired holds; runs at most once per second"""
+        if now - self._last_purge < 1:
+            return
+        self._last_purge = now
+        for key, (patient_id, expires_at) in list(self._holds.items()):
+            if expires_at <= now:
+                self._drop(key, patient_id)
+
+    def _drop(self, key: SlotKey, patient_id: int) -> None:
+        self._holds.pop(key, None)
+        keys = self._by_patient.get(patient_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_patient[patient_id]
+
+    def holder(self, doctor_name: str, scheduled_time: datetime) -> Optional[int]:
+        """Patient currently holding the slot, if any"""
+        key = _slot_key(doctor_name, scheduled_time)
+        with self._lock:
+            entry = self._holds.get(key)
+            if entry is None or entry[1] <= self._clock():
+                return None
+            return entry[0]
+
+    def is_held_by_other(self, patient_id: int, doctor_name: str, scheduled_time: datetime) -> bool:
+        holder = self.holder(doctor_name, scheduled_time)
+        return holder is not None and holder != patient_id
+
+    def hold_many(self, patient_id: int, slots: Iterable[SlotKey]) -> int:
+        """
+        Replace the patient's holds with the given (doctor_name, scheduled_time) slots.
+        Slots already held by someone else are skipped. Returns the number held.
+        """
+        now = self._clock()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._purge(now)
+            for key in list(self._by_patient.get(patient_id, ())):
+                self._drop(key, patient_id)
+
+            held = 0
+            for doctor_name, scheduled_time in slots:
+                key = _slot_key(doctor_name, scheduled_time)
+                entry = self._holds.get(key)
+                if entry is not None and entry[0] != patient_id and entry[1] > now:
+                    continue
+                self._holds[key] = (patient_id, expires_at)
+                self._by_patient.setdefault(patient_id, set()).add(key)
+                held += 1
+            return held
+
+    def release(self, doctor_name: str, scheduled_time: datetime) -> None:
+        key = _slot_key(doctor_name, scheduled_time)
+        with self._lock:
+            entry = self._holds.get(key)
+            if entry is not None:
+                self._drop(key, entry[0])
+
+    def release_patient(self, patient_id: int) -> None:
+        with self._lock:
+            for key in list(self._by_patient.get(patient_id, ())):
+                self._drop(key, patient_id)
+
+    def __len__(self) -> int:
+        return len(self._holds)
+
+
+def _is_slot_conflict(error: IntegrityError) -> bool:
+    message = str(error.orig).lower()
+    return "unique" in message or "duplicate" in message
+
+
+async def book_appointment(
+    db: AsyncSession,
+    appointment: Appointment,
+    holds: Optional[SlotHolds] = None,
+    index: Optional[AvailabilityIndex] = None,
+    max_retries: int = settings.BOOKING_MAX_RETRIES,
+    backoff_seconds: float = settings.BOOKING_RETRY_BACKOFF_SECONDS,
+    commit: bool = True
+) -> Appointment:
+    """
+    Confirm a booking atomically. Raises SlotConflictError if another patient holds
+    or has booked the slot, and retries with backoff when the database is busy.
+    With commit=False the insert is flushed inside a savepoint and left for the
+    caller's commit, so a conflict does not roll back the rest of the transaction;
+    the hold and the availability index are then updated once that commit succeeds.
+    """
+    doctor_name = appointment.doctor_name
+    scheduled_time = appointment.scheduled_time
+    duration = appointment.duration_minutes or 30
+
+    # Cheap in-process checks first; the unique index below is authoritative
+    if holds is not None and holds.is_held_by_other(appointment.patient_id, doctor_name, scheduled_time):
+        raise SlotConflictError(doctor_name, scheduled_time)
+    if index is not None and index.is_booked(doctor_name, scheduled_time, duration):
+        raise SlotConflictError(doctor_name, scheduled_time)
+
+    for attempt in range(max_retries + 1):
+        try:
+            if commit:
+                db.add(appointment)
+                await db.commit()
+            else:
+                async with db.begin_nested():
+                    db.add(appointment)
+            break
+        except IntegrityError as e:
+            if commit:
+                await db.rollback()
+            if not _is_slot_conflict(e):
+                raise
+            if index is not None:
+                # Another worker won the race; make sure this process stops offering it
+                index.mark_booked(doctor_name, scheduled_time, duration)
+            raise SlotConflictError(doctor_name, scheduled_time) from e
+        except OperationalError:
+            if commit:
+                await db.rollback()
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(backoff_seconds * (2 ** attempt))
+
+    def _booked() -> None:
+        if holds is not None:
+            holds.release(doctor_name, scheduled_time)
+        if index is not None:
+            index.mark_booked(doctor_name, scheduled_time, duration)
+
+    if commit:
+        await db.refresh(appointment)
+        _booked()
+    else:
+        # Only a committed booking may leave the hold and the index
+        after_commit(db, _booked)
+    return appointment
+
+
+slot_holds = SlotHolds()
@@ -0,0 +1,84 @@
+"""
+Opt-in cache of general-assistant answers for common, non-personalized questions
+(clinic hours, copays, refill policy, ...). Lookups match the normalized question
+exactly: near-identical medical questions ("with alcohol" / "without alcohol") can
+need opposite answers.
+"""
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+# Questions mentioning the patient, numbers or contact details are never cached
+_PERSONAL_MARKERS = re.compile(
+    r"\b(i|i'm|im|i've|ive|i'd|me|my|mine|myself|we|our|us)\b|\d|@",
+    re.IGNORECASE
+)
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = _NON_WORD.sub(" ", question.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class ResponseCache:
+    """LRU/TTL answer cache keyed by the normalized question"""
+    
+    def __init__(
+        self,
+        enabled: bool = settings.RESPONSE_CACHE_ENABLED,
+        max_entries: int = settings.RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = settings.RESPONSE_CACHE_TTL_SECONDS,
+        max_question_length: int = 300
+    ):
+        self.enabled = enabled
+        self.max_question_length = max_question_length
+        self._cache = TTLCache(max_entries, ttl_seconds)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def is_cacheable(self, question: str, conversation_history: Optional[list] = None) -> bool:
+        """Only standalone (first-turn), non-personalized questions are cached"""
+        return (
+            self.enabled
+            and not conversation_history
+            and len(question) <= self.max_question_length
+            and not _PERSONAL_MARKERS.search(question)
+        )
+    
+    def get(self, question: str) -> Optional[str]:
+        """Return the cached answer to the same question, if any"""
+        answer = self._cache.get(normalize_question(question))
+        self._count("hits" if answer is not None else "misses")
+        return answer
+    
+    def put(self, question: str, answer: str) -> None:
+        """Store the answer to a cacheable question"""
+        self._cache.set(normalize_question(question), answer)
+    
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for tuning"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self._cache.evictions,
+            "expirations": self._cache.expirations
+        }
+
+
+response_cache = ResponseCache()
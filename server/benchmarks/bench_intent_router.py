@@ -0,0 +1,91 @@
+"""
+Benchmark the compiled intent router against the previous keyword scans.
+
+Usage (from the server directory):
+    python -m benchmarks.bench_intent_router [--iterations 20000]
+"""
+import argparse
+import re
+import timeit
+
+from app.agents.intent_router import (
+    INTENT_KEYWORDS,
+    OPERATION_KEYWORDS,
+    IntentRouter,
+    _stem,
+)
+
+MESSAGES = [
+    "I want to book an appointment with a cardiologist next Monday morning",
+    "What are the clinic hours on weekends?",
+    "Please cancel appointment #12",
+    "Can you show my appointments for this month?",
+    "What is the copay for a refill of my blood pressure medication?",
+    "I have had a mild headache and a sore throat since yesterday, should I be worried?",
+    "Is Dr. Chen available for a follow-up visit on Friday afternoon?",
+    "hello",
+]
+
+
+def legacy_detect_operation(message: str):
+    """The former chain of any(keyword in message_lower ...) scans"""
+    message_lower = message.lower()
+    for operation, keywords in OPERATION_KEYWORDS:
+        if any(keyword in message_lower for keyword in keywords):
+            return operation
+    return None
+
+
+class LegacyScanner:
+    """The routing agent's scanner: stems every token and checks list membership"""
+    
+    def __init__(self):
+        self.sch = [_stem(word) for word in INTENT_KEYWORDS["Scheduling"]]
+        self.qna = [_stem(word) for word in INTENT_KEYWORDS["Q&A"]]
+    
+    def scan(self, text: str):
+        tokens = [t.lower() for t in re.findall(r"[A-Za-z]+(?:'[A-Za-z]+)?|[0-9]+", text)]
+        votes = {"Scheduling": 0, "Q&A": 0}
+        for token in tokens:
+            subword = _stem(token)
+            if subword in self.sch or token in INTENT_KEYWORDS["Scheduling"]:
+                votes["Scheduling"] += 1
+            elif subword in self.qna or token in INTENT_KEYWORDS["Q&A"]:
+                votes["Q&A"] += 1
+        return votes
+
+
+def _per_call_us(fn, iterations: int) -> float:
+    total = timeit.timeit(lambda: [fn(m) for m in MESSAGES], number=iterations)
+    return total / (iterations * len(MESSAGES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    
+    router = IntentRouter()
+    legacy = LegacyScanner()
+    
+    # Sanity check: the compiled matchers agree with the legacy scans
+    for message in MESSAGES:
+        assert router.detect_operation(message) == legacy_detect_operation(message), message
+        scan = router.scan(message)
+        votes = legacy.scan(message)
+        assert scan["counts"] == {"scheduling": votes["Scheduling"], "qna": votes["Q&A"]}, message
+    
+    rows = [
+        ("operation detect (legacy any-chains)", _per_call_us(legacy_detect_operation, args.iterations)),
+        ("operation detect (compiled regex)", _per_call_us(router.detect_operation, args.iterations)),
+        ("keyword scan (legacy stem per call)", _per_call_us(legacy.scan, args.iterations)),
+        ("keyword scan (memoized token table)", _per_call_us(router.scan, args.iterations)),
+    ]
+    
+    print(f"{'benchmark':<40} {'us/call':>10}")
+    for name, micros in rows:
+        print(f"{name:<40} {micros:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark statistical language detection one message at a time and in batches.
+
+Usage (from the server directory):
+    python -m benchmarks.bench_language_detection [--messages 20000] [--batch-size 1000]
+"""
+import argparse
+import random
+import time
+
+from app.agents.multilingual import default_detector
+
+MESSAGES = [
+    "I need to reschedule my appointment with Dr. Chen to next Tuesday",
+    "Hola, necesito ayuda con mi factura del mes pasado",
+    "Bonjour, je n'arrive pas à me connecter à mon compte patient",
+    "Ich habe eine Frage zu meiner Rechnung",
+    "Olá, preciso de ajuda para remarcar minha consulta",
+    "Xin chào, tôi cần hỗ trợ về đơn thuốc của tôi",
+    "Привет, я не могу войти в приложение",
+    "你好，我想预约下周的体检",
+    "こんにちは、予約を変更したいです",
+    "مرحبا، أحتاج إلى مساعدة في حسابي",
+    "thanks",
+    "hola",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    messages = [rng.choice(MESSAGES) for _ in range(args.messages)]
+    default_detector.detect(messages[:10])  # warm up
+
+    started = time.perf_counter()
+    for message in messages:
+        default_detector.detect([message])
+    single = time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = []
+    for i in range(0, len(messages), args.batch_size):
+        results.extend(default_detector.detect(messages[i:i + args.batch_size]))
+    batched = time.perf_counter() - started
+
+    uncertain = sum(result.confidence < 0.8 and result.method != "none" for result in results)
+    print(f"{len(messages)} messages")
+    print(f"one at a time:        {len(messages) / single:>10.0f} messages/s")
+    print(f"batches of {args.batch_size:<6}     {len(messages) / batched:>10.0f} messages/s "
+          f"({single / batched:.1f}x)")
+    print(f"below 0.8 confidence (LLM fallback): {uncertain} ({uncertain / len(messages):.1%})")
+
+
+if __name__ == "__main__":
+    main()
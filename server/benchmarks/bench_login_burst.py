@@ -0,0 +1,119 @@
+"""
+Measure how a burst of logins affects the latency of unrelated requests.
+
+Usage (from the server directory):
+    python -m benchmarks.bench_login_burst [--logins 16] [--rounds 12]
+
+Fires concurrent logins at the app in-process while a probe polls /api/v1/health/,
+once with bcrypt run inline on the event loop (the old behaviour) and once on the
+dedicated password hashing pool, and prints probe latency percentiles for each.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+import httpx  # noqa: E402
+
+from app.api.v1.endpoints import auth  # noqa: E402
+from app.core import security  # noqa: E402
+from app.db.session import async_engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+EMAIL = "burst@example.com"
+PASSWORD = "burst-password"
+
+
+class InlineHasher:
+    """The previous behaviour: bcrypt runs directly on the event loop"""
+
+    async def hash(self, password: str) -> str:
+        return security.get_password_hash(password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return security.verify_password(plain_password, hashed_password)
+
+
+def _percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _burst(client: httpx.AsyncClient, logins: int):
+    probe_ms = []
+    done = asyncio.Event()
+
+    async def probe():
+        # Latency is measured from when the probe was due, so event-loop stalls count
+        due = time.perf_counter()
+        while not done.is_set():
+            await client.get("/api/v1/health/")
+            probe_ms.append((time.perf_counter() - due) * 1000)
+            due = time.perf_counter() + 0.005
+            await asyncio.sleep(0.005)
+
+    async def login():
+        response = await client.post(
+            "/api/v1/auth/login", data={"username": EMAIL, "password": PASSWORD}
+        )
+        assert response.status_code == 200, response.text
+
+    started = time.perf_counter()
+    probe_task = asyncio.create_task(probe())
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe_task
+    return probe_ms, elapsed
+
+
+async def main_async(logins: int, rounds: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/api/v1/auth/register", json={
+            "email": EMAIL,
+            "password": PASSWORD,
+            "first_name": "Burst",
+            "last_name": "Bench",
+            "date_of_birth": "1990-01-01"
+        })
+        assert response.status_code == 201, response.text
+
+        print(f"bcrypt rounds={rounds}, {logins} concurrent logins\n")
+        print(f"{'mode':<22} {'logins/s':>9} {'probe p50':>10} {'p95':>8} {'p99':>8} {'max':>8}")
+        for label, hasher in (("inline (event loop)", InlineHasher()), ("hashing pool", security.password_hasher)):
+            auth.password_hasher = hasher
+            probe_ms, elapsed = await _burst(client, logins)
+            print(
+                f"{label:<22} {logins / elapsed:>9.1f} {statistics.median(probe_ms):>8.1f}ms "
+                f"{_percentile(probe_ms, 0.95):>6.1f}ms {_percentile(probe_ms, 0.99):>6.1f}ms "
+                f"{max(probe_ms):>6.1f}ms"
+            )
+
+    print("\n", security.login_metrics.stats(), security.password_hasher.stats())
+    # ASGITransport does not run the app lifespan, so dispose the pool here
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=security.settings.BCRYPT_ROUNDS)
+    args = parser.parse_args()
+
+    security.pwd_context.update(bcrypt__rounds=args.rounds)
+    try:
+        asyncio.run(main_async(args.logins, args.rounds))
+    finally:
+        security.password_hasher.shutdown()
+        shutil.rmtree(_tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
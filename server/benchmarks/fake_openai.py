@@ -0,0 +1,235 @@
+"""
+A local OpenAI-compatible chat completions server for offline benchmarks.
+
+Usage (from the server directory):
+    python -m benchmarks.fake_openai [--port 9999] [--latency-ms 300] [--tokens-per-second 80]
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:9999/v1 (any OPENAI_API_KEY).
+Replies are scripted from the request: the appointment agent gets show_slots and
+book_appointment tool calls, the intent judge gets JSON, summaries and general
+questions get text. Each reply waits --latency-ms before the first token and then
+produces tokens at --tokens-per-second, streamed or not. Usage includes simulated
+prompt caching (cached_tokens) for prompts sharing a prefix with earlier ones.
+GET /stats returns call and token counters.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+# Upstream caches prompts in 128-token blocks once they reach 1024 tokens
+CACHE_BLOCK_TOKENS = 128
+CACHE_MIN_TOKENS = 1024
+CHARS_PER_TOKEN = 4
+
+_ISO_TIME = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(?::\d{2})?")
+_DOCTOR = re.compile(r"Dr\. [A-Z][a-z]+ [A-Z][a-z]+")
+
+ANSWER = (
+    "That is a common concern. Rest, stay hydrated and keep an eye on your symptoms. "
+    "If they get worse or do not improve within a few days, please book an appointment "
+    "so one of our doctors can take a look. Seek emergency care right away if you have "
+    "trouble breathing, chest pain or confusion."
+)
+
+
+class FakeOpenAI:
+    """Scripted replies with configurable latency, token rate and prompt caching"""
+
+    def __init__(self, latency_ms: float = 300, tokens_per_second: float = 80, completion_tokens: int = 60):
+        self.latency = latency_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self._prefix_blocks = set()
+        self.counters: Counter = Counter()
+
+    # Reply selection
+
+    def reply(self, body: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Text content and optional tool call for a request"""
+        messages = body.get("messages") or []
+        system = messages[0].get("content", "") if messages else ""
+        last_user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            return json.dumps({"intent": "qna", "confidence": 0.9, "rationale": "fake"}), None
+        if system.startswith("You maintain a running summary"):
+            return "The patient asked general health questions and received self-care advice.", None
+        if body.get("tools"):
+            return self._agent_reply(last_user)
+        length = self.completion_tokens * CHARS_PER_TOKEN
+        return (ANSWER * (length // len(ANSWER) + 1))[:length].strip(), None
+
+    def _agent_reply(self, message: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        lowered = message.lower()
+        doctor = _DOCTOR.search(message)
+        when = _ISO_TIME.search(message)
+        if "confirm" in lowered and when:
+            return "", {
+                "name": "book_appointment",
+                "arguments": {
+                    "appointment_type": "consultation",
+                    "doctor_name": doctor.group(0) if doctor else "Dr. Sarah Johnson",
+                    "scheduled_time": when.group(0),
+                    "reason": "benchmark visit",
+                    "is_virtual": False,
+                    "duration_minutes": None
+                }
+            }
+        if "slot" in lowered or "available" in lowered:
+            return "", {
+                "name": "show_slots",
+                "arguments": {
+                    "date_range": None,
+                    "specialty": None,
+                    "doctor_name": doctor.group(0) if doctor else None
+                }
+            }
+        return "Of course. Which doctor would you like to see, and when would suit you?", None
+
+    # Usage
+
+    def usage(self, body: Dict[str, Any], completion_tokens: int) -> Dict[str, Any]:
+        prompt = json.dumps(body.get("tools") or []) + "".join(
+            f"{m.get('role')}:{m.get('content') or ''}" for m in body.get("messages") or []
+        )
+        prompt_tokens = max(1, len(prompt) // CHARS_PER_TOKEN)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": self._cached_tokens(prompt, prompt_tokens)}
+        }
+
+    def _cached_tokens(self, prompt: str, prompt_tokens: int) -> int:
+        """Leading blocks of this prompt already seen in an earlier prompt"""
+        block_chars = CACHE_BLOCK_TOKENS * CHARS_PER_TOKEN
+        digest = hashlib.sha256()
+        cached_blocks = 0
+        leading = True
+        for start in range(0, len(prompt) - block_chars + 1, block_chars):
+            digest.update(prompt[start:start + block_chars].encode())
+            key = digest.hexdigest()
+            if leading and key in self._prefix_blocks:
+                cached_blocks += 1
+            else:
+                leading = False
+                self._prefix_blocks.add(key)
+        if prompt_tokens < CACHE_MIN_TOKENS:
+            return 0
+        return cached_blocks * CACHE_BLOCK_TOKENS
+
+    # HTTP handlers
+
+    async def completions(self, request: Request):
+        body = await request.json()
+        content, tool = self.reply(body)
+        tool_arguments = json.dumps(tool["arguments"]) if tool else ""
+        completion_tokens = max(1, (len(content) + len(tool_arguments)) // CHARS_PER_TOKEN)
+        usage = self.usage(body, completion_tokens)
+        self.counters["calls"] += 1
+        self.counters["tool_calls"] += 1 if tool else 0
+        self.counters["prompt_tokens"] += usage["prompt_tokens"]
+        self.counters["cached_tokens"] += usage["prompt_tokens_details"]["cached_tokens"]
+        self.counters["completion_tokens"] += completion_tokens
+
+        model = body.get("model", "gpt-4o-mini")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            return StreamingResponse(
+                self._stream(completion_id, model, content, tool, tool_arguments, usage if include_usage else None),
+                media_type="text/event-stream"
+            )
+
+        await asyncio.sleep(self.latency + completion_tokens / self.tokens_per_second)
+        message: Dict[str, Any] = {"role": "assistant", "content": content or None}
+        if tool:
+            message["tool_calls"] = [{
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": tool["name"], "arguments": tool_arguments}
+            }]
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool else "stop"}],
+            "usage": usage
+        })
+
+    async def _stream(self, completion_id, model, content, tool, tool_arguments, usage):
+        def chunk(delta: Optional[Dict[str, Any]], finish_reason: Optional[str] = None, **extra) -> str:
+            choices = [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            return "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": choices,
+                **extra
+            }) + "\n\n"
+
+        await asyncio.sleep(self.latency)
+        yield chunk({"role": "assistant", "content": ""})
+        for piece in _pieces(content):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield chunk({"content": piece})
+        if tool:
+            yield chunk({"tool_calls": [{
+                "index": 0,
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": tool["name"], "arguments": ""}
+            }]})
+            for piece in _pieces(tool_arguments):
+                await asyncio.sleep(1 / self.tokens_per_second)
+                yield chunk({"tool_calls": [{"index": 0, "function": {"arguments": piece}}]})
+        yield chunk({}, "tool_calls" if tool else "stop")
+        if usage is not None:
+            yield chunk(None, usage=usage)
+        yield "data: [DONE]\n\n"
+
+    async def stats(self, request: Request):
+        return JSONResponse(dict(self.counters))
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/v1/chat/completions", self.completions, methods=["POST"]),
+            Route("/stats", self.stats, methods=["GET"]),
+        ])
+
+
+def _pieces(text: str) -> List[str]:
+    """Split text into roughly token-sized pieces"""
+    return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--latency-ms", type=float, default=300, help="time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=80)
+    parser.add_argument("--completion-tokens", type=int, default=60, help="length of general answers")
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(args.latency_ms, args.tokens_per_second, args.completion_tokens)
+    uvicorn.run(fake.app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+Load-test the chat, login and list endpoints against a fake OpenAI server.
+
+Usage (from the server directory):
+    python -m benchmarks.load_test [--scenarios faq,booking] [--users 16] [--iterations 10]
+    python -m benchmarks.load_test --latency-ms 800 --tokens-per-second 40 --baseline old.json
+
+Starts benchmarks.fake_openai in a subprocess (or uses --openai-base-url), points the
+app at it through OPENAI_BASE_URL and drives the app in-process with httpx against a
+scratch database. Each scenario runs --users concurrent virtual users for --iterations
+iterations and reports requests per second, latency percentiles, and SQL statements and
+LLM calls per request. Results are written as JSON; --baseline prints the change
+against an earlier result file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+SCENARIOS = ("login", "faq", "booking", "listing", "long_conversation")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+PASSWORD = "bench-password"
+
+QUESTIONS = [
+    "What are the symptoms of the flu?",
+    "How much water should I drink per day?",
+    "Is it normal to feel tired after a vaccine?",
+    "How can I lower my blood pressure naturally?",
+    "What should I do for a mild sprained ankle?",
+    "How long does a common cold usually last?",
+    "Can stress cause headaches?",
+    "What is a healthy resting heart rate?",
+]
+DOCTORS = ["Dr. Sarah Johnson", "Dr. Michael Chen", "Dr. Emily Rodriguez", "Dr. James Williams"]
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ScenarioStats:
+    """Latency samples and outcome counters of one scenario"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies_ms: List[float] = []
+        self.errors = 0
+        self.outcomes: Dict[str, int] = {}
+
+    def count(self, outcome: str) -> None:
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def summary(self, duration: float, db_queries: int, llm: Dict[str, int]) -> Dict[str, Any]:
+        requests = len(self.latencies_ms)
+        samples = self.latencies_ms or [0.0]
+        prompt_tokens = llm.get("prompt_tokens", 0)
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "duration_s": round(duration, 3),
+            "rps": round(requests / duration, 2) if duration else 0.0,
+            "latency_ms": {
+                "mean": round(statistics.fmean(samples), 2),
+                "p50": round(_percentile(samples, 0.50), 2),
+                "p95": round(_percentile(samples, 0.95), 2),
+                "p99": round(_percentile(samples, 0.99), 2),
+                "max": round(max(samples), 2)
+            },
+            "db_queries_per_request": round(db_queries / requests, 2) if requests else 0.0,
+            "llm_calls_per_request": round(llm.get("calls", 0) / requests, 2) if requests else 0.0,
+            "llm_cached_prompt_ratio": round(llm.get("cached_tokens", 0) / prompt_tokens, 3) if prompt_tokens else 0.0,
+            **({"outcomes": self.outcomes} if self.outcomes else {})
+        }
+
+
+class VirtualUser:
+    """One patient account making timed requests"""
+
+    def __init__(self, client: httpx.AsyncClient, stats: ScenarioStats, index: int, token: str):
+        self.client = client
+        self.stats = stats
+        self.index = index
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.random = random.Random(index)
+
+    async def request(self, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError:
+            self.stats.errors += 1
+            self.stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+            return None
+        self.stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            self.stats.errors += 1
+            return None
+        return response
+
+    async def chat(self, message: str, conversation_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        response = await self.request(
+            "POST", "/api/v1/chat/", json={"message": message, "conversation_id": conversation_id}
+        )
+        if response is None:
+            return None
+        data = response.json()
+        # The agent reports its own failures inside a 200 response
+        if (data.get("appointment_data") or {}).get("error") and "alternatives" not in data["appointment_data"]:
+            self.stats.errors += 1
+        return data
+
+
+# Scenarios: one iteration for one virtual user
+
+async def login(user: VirtualUser) -> None:
+    await user.request(
+        "POST", "/api/v1/auth/login", data={"username": _email(user.index), "password": PASSWORD}
+    )
+
+
+async def faq(user: VirtualUser) -> None:
+    await user.chat(user.random.choice(QUESTIONS))
+
+
+async def booking(user: VirtualUser) -> None:
+    doctor = user.random.choice(DOCTORS)
+    first = await user.chat(f"I'd like to book an appointment with {doctor}")
+    if first is None:
+        return
+    conversation_id = first["conversation_id"]
+    shown = await user.chat(f"Show me available slots with {doctor}", conversation_id)
+    slots = ((shown or {}).get("appointment_data") or {}).get("slots") or []
+    if not slots:
+        user.stats.count("no_slots")
+        return
+    slot = slots[0]
+    booked = await user.chat(
+        f"Please confirm booking with {slot['doctor_name']} at {slot['datetime']} for a checkup",
+        conversation_id
+    )
+    data = (booked or {}).get("appointment_data") or {}
+    user.stats.count("booked" if data.get("success") else "conflict" if "alternatives" in data else "failed")
+
+
+async def listing(user: VirtualUser) -> None:
+    await user.chat("Show my appointments")
+    await user.request("GET", "/api/v1/medical-records/", params={"limit": 20})
+    await user.request("GET", "/api/v1/support-tickets/", params={"limit": 20})
+
+
+def long_conversation(turns: int) -> Callable[[VirtualUser], Awaitable[None]]:
+    async def run(user: VirtualUser) -> None:
+        conversation_id = None
+        for _ in range(turns):
+            data = await user.chat(user.random.choice(QUESTIONS), conversation_id)
+            if data is None:
+                return
+            conversation_id = data["conversation_id"]
+    return run
+
+
+def _email(index: int) -> str:
+    return f"bench{index}@example.com"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_fake_openai(args) -> subprocess.Popen:
+    port = _free_port()
+    process = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_openai",
+        "--port", str(port),
+        "--latency-ms", str(args.latency_ms),
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--completion-tokens", str(args.completion_tokens)
+    ])
+    base_url = f"http://127.0.0.1:{port}/v1"
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats", timeout=0.5)
+            args.openai_base_url = base_url
+            return process
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("The fake OpenAI server did not start")
+
+
+async def _fake_stats(base_url: str) -> Dict[str, int]:
+    """Counters of the fake server; empty when pointed at another server"""
+    stats_url = base_url.rstrip("/").removesuffix("/v1") + "/stats"
+    try:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(stats_url, timeout=2)
+        return response.json() if response.status_code == 200 else {}
+    except (httpx.HTTPError, ValueError):
+        return {}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main_async(args) -> Dict[str, Any]:
+    # Imported here, after the environment points the app at the scratch database
+    from sqlalchemy import event
+
+    from app.db.session import async_engine
+    from app.main import app
+
+    queries = 0
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def _count(*_):
+        nonlocal queries
+        queries += 1
+
+    scenario_runs = {
+        "login": login,
+        "faq": faq,
+        "booking": booking,
+        "listing": listing,
+        "long_conversation": long_conversation(args.turns),
+    }
+    results: Dict[str, Any] = {}
+
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport does not run the lifespan, so run it around the whole benchmark
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            tokens = await asyncio.gather(*(_register(client, i) for i in range(args.users)))
+
+            print(f"{args.users} users x {args.iterations} iterations, fake LLM "
+                  f"{args.latency_ms:.0f}ms + {args.tokens_per_second:.0f} tok/s\n")
+            print(f"{'scenario':<18} {'reqs':>6} {'err':>4} {'rps':>8} {'p50':>9} {'p95':>9} "
+                  f"{'p99':>9} {'sql/req':>8} {'llm/req':>8}")
+            for name in args.scenarios:
+                stats = ScenarioStats(name)
+                users = [VirtualUser(client, stats, i, token) for i, token in enumerate(tokens)]
+                llm_before = await _fake_stats(args.openai_base_url)
+                queries_before = queries
+
+                async def run_user(user: VirtualUser):
+                    for _ in range(args.iterations):
+                        await scenario_runs[name](user)
+
+                started = time.perf_counter()
+                await asyncio.gather(*(run_user(user) for user in users))
+                duration = time.perf_counter() - started
+
+                llm_after = await _fake_stats(args.openai_base_url)
+                llm = {key: llm_after.get(key, 0) - llm_before.get(key, 0) for key in llm_after}
+                summary = stats.summary(duration, queries - queries_before, llm)
+                results[name] = summary
+                latency = summary["latency_ms"]
+                print(
+                    f"{name:<18} {summary['requests']:>6} {summary['errors']:>4} {summary['rps']:>8.1f} "
+                    f"{latency['p50']:>7.1f}ms {latency['p95']:>7.1f}ms {latency['p99']:>7.1f}ms "
+                    f"{summary['db_queries_per_request']:>8.1f} {summary['llm_calls_per_request']:>8.2f}"
+                    + (f"  {summary['outcomes']}" if "outcomes" in summary else "")
+                )
+
+    return results
+
+
+async def _register(client: httpx.AsyncClient, index: int) -> str:
+    response = await client.post("/api/v1/auth/register", json={
+        "email": _email(index),
+        "password": PASSWORD,
+        "first_name": "Bench",
+        "last_name": str(index),
+        "date_of_birth": "1990-01-01"
+    })
+    assert response.status_code == 201, response.text
+    response = await client.post("/api/v1/auth/login", data={"username": _email(index), "password": PASSWORD})
+    assert response.status_code == 200, response.text
+    return response.json()["access_token"]
+
+
+def _compare(results: Dict[str, Any], baseline_path: str) -> None:
+    """Print the change of each scenario against an earlier result file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["scenarios"]
+
+    def change(new: float, old: float) -> str:
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"\nAgainst {baseline_path}:")
+    print(f"{'scenario':<18} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'sql/req':>9}")
+    for name, current in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        print(
+            f"{name:<18} {change(current['rps'], old['rps']):>9} "
+            f"{change(current['latency_ms']['p50'], old['latency_ms']['p50']):>9} "
+            f"{change(current['latency_ms']['p95'], old['latency_ms']['p95']):>9} "
+            f"{change(current['latency_ms']['p99'], old['latency_ms']['p99']):>9} "
+            f"{current['db_queries_per_request'] - old['db_queries_per_request']:>+9.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--users", type=int, default=16, help="concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=10, help="iterations per user and scenario")
+    parser.add_argument("--turns", type=int, default=20, help="turns per long conversation")
+    parser.add_argument("--latency-ms", type=float, default=300, help="fake LLM time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=80, help="fake LLM token rate")
+    parser.add_argument("--completion-tokens", type=int, default=60, help="fake answer length")
+    parser.add_argument("--openai-base-url", help="use a running OpenAI-compatible server instead of the fake")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--rate-limit", action="store_true", help="keep chat rate limiting enabled")
+    parser.add_argument("--database-url", help="database to benchmark against (default: scratch SQLite)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/load_test-<time>.json)")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    tmpdir = tempfile.mkdtemp()
+    fake = None if args.openai_base_url else _start_fake_openai(args)
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ["OPENAI_BASE_URL"] = args.openai_base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    os.environ["RATE_LIMIT_ENABLED"] = str(args.rate_limit)
+
+    try:
+        results = asyncio.run(main_async(args))
+    finally:
+        if fake is not None:
+            fake.terminate()
+            fake.wait()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+            "users": args.users,
+            "iterations": args.iterations,
+            "turns": args.turns,
+            "latency_ms": args.latency_ms,
+            "tokens_per_second": args.tokens_per_second,
+            "completion_tokens": args.completion_tokens,
+            "bcrypt_rounds": args.bcrypt_rounds
+        },
+        "scenarios": results
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"load_test-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        _compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Stress concurrent appointment booking and check that no slot is ever double-booked.
+
+Usage (from the server directory):
+    python -m benchmarks.stress_booking [--workers 64] [--attempts 2000] [--slots 20]
+    python -m benchmarks.stress_booking --database-url postgresql+psycopg://...
+
+Runs twice against a scratch database: once relying on the unique index alone, and
+once with the in-process availability index and slot holds in front of it. Each
+worker is an asyncio task with its own AsyncSession, as in the API.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import app.db.base_all  # noqa: F401  (registers every model on Base.metadata)
+from app.db.base import Base
+from app.db.session import create_async_db_engine
+from app.models.appointment import Appointment
+from app.models.patient import Patient
+from app.services.availability import AvailabilityIndex
+from app.services.reservations import SlotConflictError, SlotHolds, book_appointment
+
+DOCTORS = [
+    {"name": "Dr. Sarah Johnson", "specialty": "General Practice"},
+    {"name": "Dr. Michael Chen", "specialty": "Cardiology"},
+]
+PATIENTS = 50
+
+
+async def _setup(database_url: str):
+    engine = create_async_db_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async with Session() as db:
+        for i in range(PATIENTS):
+            db.add(Patient(
+                email=f"stress{i}@example.com",
+                hashed_password="x",
+                first_name="Stress",
+                last_name=str(i),
+                date_of_birth=date(1990, 1, 1)
+            ))
+        await db.commit()
+    return engine, Session
+
+
+def _candidate_slots(count: int):
+    start = (datetime.now() + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
+    while start.weekday() >= 5:
+        start += timedelta(days=1)
+    return [
+        (DOCTORS[i % len(DOCTORS)]["name"], start + timedelta(minutes=30 * (i // len(DOCTORS))))
+        for i in range(count)
+    ]
+
+
+async def run(Session, slots, workers: int, attempts: int, holds=None, index=None):
+    outcomes = Counter()
+    gate = asyncio.Semaphore(workers)
+
+    async def attempt(n: int):
+        doctor_name, scheduled_time = random.choice(slots)
+        patient_id = n % PATIENTS + 1
+        async with gate, Session() as db:
+            try:
+                await book_appointment(
+                    db,
+                    Appointment(
+                        patient_id=patient_id,
+                        doctor_name=doctor_name,
+                        appointment_type="consultation",
+                        scheduled_time=scheduled_time,
+                        duration_minutes=30,
+                        status="scheduled"
+                    ),
+                    holds=holds,
+                    index=index,
+                    max_retries=10
+                )
+                return "booked"
+            except SlotConflictError:
+                return "conflict"
+            except Exception as e:
+                return f"error: {type(e).__name__}"
+
+    started = time.perf_counter()
+    for outcome in await asyncio.gather(*(attempt(n) for n in range(attempts))):
+        outcomes[outcome] += 1
+    elapsed = time.perf_counter() - started
+
+    async with Session() as db:
+        duplicates = select(
+            Appointment.doctor_name, Appointment.scheduled_time
+        ).where(
+            Appointment.status != "cancelled"
+        ).group_by(
+            Appointment.doctor_name, Appointment.scheduled_time
+        ).having(func.count(Appointment.id) > 1)
+        double_booked = len((await db.execute(duplicates)).all())
+    return outcomes, elapsed, double_booked
+
+
+async def main_async(database_url: str, args) -> bool:
+    slots = _candidate_slots(args.slots)
+    failed = False
+    for label, layered in (("unique index only", False), ("index + holds + availability", True)):
+        engine, Session = await _setup(database_url)
+        holds = index = None
+        if layered:
+            holds, index = SlotHolds(), AvailabilityIndex(refresh_seconds=3600)
+            async with Session() as db:
+                await index.load(db, DOCTORS)
+
+        outcomes, elapsed, double_booked = await run(Session, slots, args.workers, args.attempts, holds, index)
+        await engine.dispose()
+
+        print(f"\n{label}")
+        print(f"  attempts/s      {args.attempts / elapsed:>10.1f}")
+        for outcome, count in sorted(outcomes.items()):
+            print(f"  {outcome:<15} {count:>10}")
+        print(f"  double-booked   {double_booked:>10}")
+        failed = failed or double_booked > 0 or outcomes["booked"] > len(slots)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--attempts", type=int, default=2000)
+    parser.add_argument("--slots", type=int, default=20)
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    tmpdir = None
+    database_url = args.database_url
+    if database_url is None:
+        tmpdir = tempfile.mkdtemp()
+        database_url = f"sqlite:///{os.path.join(tmpdir, 'stress.db')}"
+
+    failed = asyncio.run(main_async(database_url, args))
+
+    if tmpdir:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    if failed:
+        raise SystemExit("double booking detected")
+
+
+if __name__ == "__main__":
+    main()